@@ -0,0 +1,141 @@
+"""RAG-Search-LAB - adaptive retrieval depth
+
+A fixed TOP_K puts too many chunks into the prompt when the answer is
+obvious and searches too shallowly when it is not.  `AdaptiveDepth.decide()`
+reads the score lists of the first retrieval pass and picks one of:
+
+* ``agree``    - at least `agreement` of the dense and sparse top k are the
+                 same chunks: keep `min_k` (fusion ranks shared chunks first).
+* ``widen``    - the weighted top score is below `min_confidence`, or the two
+                 legs share no chunk: retrieve again with `widen_factor` x k
+                 and hnsw.ef_search = `wide_ef_search`, keep up to `max_k`.
+* ``drop_off`` - the scores fall by more than `drop_off` x the top score
+                 between two neighbours: keep the chunks above the fall.
+* ``default``  - keep k, as without adaptive depth.
+
+Each leg is a list of (chunk_id, score) best first, with cosine similarity as
+the score (1 - distance for the sparse leg).  The legs are mixed with the
+(dense, sparse) weights of the query, so a keyword query is judged mostly on
+its sparse scores and a conceptual one on its dense scores.  A leg without
+scores (full-text matches) only counts for agreement.
+
+Thresholds depend on the embedding models; `stats()` reports the mean
+confidence and chunks kept per action to tune them against.
+"""
+import math
+import threading
+from dataclasses import dataclass
+from typing import Hashable, Optional, Sequence, Tuple
+
+ACTIONS = ("agree", "widen", "drop_off", "default")
+
+Leg = Sequence[Tuple[Optional[Hashable], Optional[float]]]
+
+
+@dataclass
+class DepthDecision:
+    action: str
+    keep: int
+    confidence: Optional[float] = None
+    agreement: Optional[float] = None
+
+
+def drop_off_cut(scores: Sequence[float], k: int, min_k: int, drop_off: float) -> int:
+    """Chunks above the first fall of more than `drop_off` x the top score (k when there is none)."""
+    top = scores[0] if scores else 0.0
+    if top <= 0:
+        return k
+    for i in range(max(min_k, 1) - 1, min(k, len(scores)) - 1):
+        if scores[i] - scores[i + 1] > drop_off * top:
+            return i + 1
+    return k
+
+
+class AdaptiveDepth:
+    def __init__(
+        self,
+        min_k: int = 2,
+        max_k: int = 8,
+        agreement: float = 0.6,
+        min_confidence: float = 0.55,
+        drop_off: float = 0.1,
+        widen_factor: int = 2,
+        wide_ef_search: int = 200,
+    ):
+        self.min_k = min_k
+        self.max_k = max_k
+        self.agreement = agreement
+        self.min_confidence = min_confidence
+        self.drop_off = drop_off
+        self.widen_factor = widen_factor
+        self.wide_ef_search = wide_ef_search
+        self.counts = {action: 0 for action in ACTIONS}
+        self._kept = {action: 0 for action in ACTIONS}
+        self._confidence = {action: [0.0, 0] for action in ACTIONS}
+        self.widen_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def decide(self, dense: Leg, sparse: Leg, weights: Tuple[float, float], k: int) -> DepthDecision:
+        """Depth for a query whose first pass returned `dense` and `sparse` with top-k `k`."""
+        legs = [
+            (weight, [score for _, score in leg[:k]])
+            for weight, leg in zip(weights, (dense, sparse))
+            if leg and all(score is not None for _, score in leg[:k])
+        ]
+        total = sum(weight for weight, _ in legs)
+        confidence = sum(weight * scores[0] for weight, scores in legs) / total if total else None
+
+        agreement = None
+        n = min(k, len(dense), len(sparse))
+        dense_ids, sparse_ids = [i for i, _ in dense[:n]], [i for i, _ in sparse[:n]]
+        if n and None not in dense_ids and None not in sparse_ids:
+            agreement = len(set(dense_ids) & set(sparse_ids)) / n
+
+        if agreement is not None and agreement >= self.agreement:
+            decision = DepthDecision("agree", min(self.min_k, k), confidence, agreement)
+        elif (confidence is not None and confidence < self.min_confidence) or agreement == 0:
+            decision = DepthDecision("widen", max(self.max_k, k), confidence, agreement)
+        elif legs:
+            cut = sum(weight * drop_off_cut(scores, k, self.min_k, self.drop_off) for weight, scores in legs) / total
+            keep = max(min(self.min_k, k), min(k, math.ceil(cut)))
+            decision = DepthDecision("drop_off" if keep < k else "default", keep, confidence, agreement)
+        else:
+            decision = DepthDecision("default", k, confidence, agreement)
+
+        with self._lock:
+            self.counts[decision.action] += 1
+            self._kept[decision.action] += decision.keep
+            if confidence is not None:
+                self._confidence[decision.action][0] += confidence
+                self._confidence[decision.action][1] += 1
+        return decision
+
+    def record_widen(self, seconds: float):
+        with self._lock:
+            self.widen_seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            widened = self.counts["widen"]
+            return {
+                "min_k": self.min_k,
+                "max_k": self.max_k,
+                "agreement": self.agreement,
+                "min_confidence": self.min_confidence,
+                "drop_off": self.drop_off,
+                "widen_factor": self.widen_factor,
+                "wide_ef_search": self.wide_ef_search,
+                "decisions": sum(self.counts.values()),
+                "actions": {
+                    action: dict(
+                        count=count,
+                        avg_kept=round(self._kept[action] / count, 2) if count else None,
+                        avg_confidence=(
+                            round(self._confidence[action][0] / self._confidence[action][1], 4)
+                            if self._confidence[action][1] else None
+                        ),
+                    )
+                    for action, count in self.counts.items()
+                },
+                "avg_widen_ms": round(1000 * self.widen_seconds / widened, 2) if widened else None,
+            }
@@ -0,0 +1,185 @@
+"""RAG-Search-LAB - sentence-level compression of the chat context
+
+Retrieved chunks are ~1000 characters each and most of their sentences do
+not bear on the question.  `ContextCompressor.compress()` splits the chunks
+into sentences, embeds those not seen before in one batched call, scores all
+of them against the query embedding with a single matrix product and keeps
+the best ones until `token_budget` is reached.
+
+* Kept sentences stay in their original order, grouped under the chunk they
+  came from (`[chunk <chunk_id>]`), so citations still map to chunk_id;
+  `CompressedContext.kept` lists the chunks that contributed.
+* Sentence embeddings are cached by text for `cache_ttl` seconds; chunks
+  retrieved again cost no embedding call.
+* A context already within the budget is returned as is, without embedding.
+
+Tokens are counted as whitespace-separated words, like `chat_logs`.
+"""
+import hashlib
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ttl_cache import TTLCache
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def split_sentences(text: str, min_chars: int = 20) -> List[str]:
+    """Sentences of `text`; fragments under `min_chars` join the previous one."""
+    sentences: List[str] = []
+    for part in SENTENCE_BREAK.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and len(part) < min_chars:
+            sentences[-1] += " " + part
+        else:
+            sentences.append(part)
+    return sentences
+
+
+@dataclass
+class CompressedContext:
+    text: str
+    kept: List[int]  # indexes of the chunks with at least one kept sentence
+    tokens_before: int
+    tokens_after: int
+    sentences_before: int = 0
+    sentences_after: int = 0
+    compressed: bool = False
+
+    @property
+    def ratio(self) -> float:
+        """Kept / original tokens (1.0 = nothing removed)."""
+        return self.tokens_after / self.tokens_before if self.tokens_before else 1.0
+
+
+def chunk_label(chunk_id: Optional[Hashable], index: int) -> str:
+    return f"[chunk {chunk_id if chunk_id is not None else f'#{index + 1}'}]"
+
+
+class ContextCompressor:
+    def __init__(
+        self,
+        embed: Callable[[List[str]], List[List[float]]],
+        token_budget: int = 300,
+        min_sentence_chars: int = 20,
+        embed_batch: int = 256,
+        cache_size: int = 5000,
+        cache_ttl: float = 3600.0,
+    ):
+        self.embed = embed
+        self.token_budget = token_budget
+        self.min_sentence_chars = min_sentence_chars
+        self.embed_batch = embed_batch
+        self.vectors = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._cache_lock = threading.Lock()
+        self.requests = 0
+        self.compressed = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.sentences_embedded = 0
+        self.embed_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def sentence_vectors(self, sentences: Sequence[str]) -> np.ndarray:
+        """Unit-length embedding per sentence, from the cache or one batched call per `embed_batch`."""
+        keys = [hashlib.blake2b(s.encode(), digest_size=16).digest() for s in sentences]
+        with self._cache_lock:
+            vectors = [self.vectors.get(key) for key in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            start = time.perf_counter()
+            fresh = []
+            for offset in range(0, len(missing), self.embed_batch):
+                batch = missing[offset:offset + self.embed_batch]
+                fresh.extend(self.embed([sentences[i] for i in batch]))
+            fresh = np.asarray(fresh, dtype=np.float32)
+            fresh /= np.maximum(np.linalg.norm(fresh, axis=1, keepdims=True), 1e-12)
+            with self._cache_lock:
+                for i, vector in zip(missing, fresh):
+                    vectors[i] = vector
+                    self.vectors.put(keys[i], vector)
+            with self._lock:
+                self.sentences_embedded += len(missing)
+                self.embed_seconds += time.perf_counter() - start
+        return np.stack(vectors)
+
+    def compress(self, query_embedding: Sequence[float], chunks: Sequence[Tuple[Optional[Hashable], str]]) -> CompressedContext:
+        """Best sentences of `chunks` ((chunk_id, text) in prompt order) within `token_budget`."""
+        tokens_before = sum(count_tokens(text) for _, text in chunks)
+        if tokens_before <= self.token_budget:
+            result = CompressedContext(
+                text="\n\n".join(f"{chunk_label(chunk_id, i)} {text}" for i, (chunk_id, text) in enumerate(chunks)),
+                kept=list(range(len(chunks))),
+                tokens_before=tokens_before,
+                tokens_after=tokens_before,
+            )
+            self._record(result)
+            return result
+
+        sentences: List[Tuple[int, str]] = [
+            (i, sentence)
+            for i, (_, text) in enumerate(chunks)
+            for sentence in split_sentences(text, self.min_sentence_chars)
+        ]
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = self.sentence_vectors([s for _, s in sentences]) @ query
+
+        selected, used = [], 0
+        for j in np.argsort(-scores):
+            tokens = count_tokens(sentences[j][1])
+            # the best sentence always goes in, even past the budget
+            if selected and used + tokens > self.token_budget:
+                continue
+            selected.append(int(j))
+            used += tokens
+        selected.sort()
+
+        groups: dict = {}
+        for j in selected:
+            groups.setdefault(sentences[j][0], []).append(sentences[j][1])
+        result = CompressedContext(
+            text="\n\n".join(f"{chunk_label(chunks[i][0], i)} {' '.join(kept)}" for i, kept in groups.items()),
+            kept=list(groups),
+            tokens_before=tokens_before,
+            tokens_after=used,
+            sentences_before=len(sentences),
+            sentences_after=len(selected),
+            compressed=True,
+        )
+        self._record(result)
+        return result
+
+    def _record(self, result: CompressedContext):
+        with self._lock:
+            self.requests += 1
+            self.compressed += result.compressed
+            self.tokens_before += result.tokens_before
+            self.tokens_after += result.tokens_after
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "requests": self.requests,
+                "compressed": self.compressed,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "ratio": round(self.tokens_after / self.tokens_before, 4) if self.tokens_before else None,
+                "sentences_embedded": self.sentences_embedded,
+                "ms_per_sentence": (
+                    round(1000 * self.embed_seconds / self.sentences_embedded, 3) if self.sentences_embedded else None
+                ),
+                "embedding_cache": self.vectors.stats(),
+            }
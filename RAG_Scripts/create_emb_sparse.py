@@ -1,45 +1,301 @@
-import os, psycopg2, openai, torch
-from transformers import AutoTokenizer, AutoModelForMaskedLM
-from pgvector.psycopg2 import register_vector
+#!/usr/bin/env python3
+"""RAG-Search-LAB - SPLADE sparse encoder (and dense helper)
 
-# Config
-DATABASE_URL = os.getenv("DATABASE_URL")
-openai.api_key = os.getenv("OPENAI_API_KEY")
-MODEL_NAME = "naver/splade-cocondenser-ensembledistil"
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+Importing this module does no work: the tokenizer and SPLADE model are
+loaded by `SparseEmbedder.load()`, which runs on first use or when a process
+calls `warm_up()` explicitly (the FastAPI backend does this at startup,
+controlled by `SPARSE_WARMUP`).  Load time, first-call latency and import
+time are recorded and returned by `stats()`.
+
+Library use
+-----------
+```python
+from create_emb_sparse import SparseEmbedder, get_sparse, get_dense
+
+embedder = SparseEmbedder()           # nothing loaded yet
+weights = embedder.encode(["reset my password"])[0]   # {token_id: weight}
+literal = embedder.to_sparsevec(weights)              # '{2054:0.81,...}/30522'
+```
+
+Backfill CLI
+------------
+Re-embed `kb_chunks` (dense + sparse) in batches:
+```bash
+python create_emb_sparse.py backfill --batch 32 [--only-missing]
+```
+Measure import, model-load and first-call latency:
+```bash
+python create_emb_sparse.py startup-bench
+```
+
+Environment: `DATABASE_URL` (backfill), `OPENAI_API_KEY` (dense),
+`EMBEDDING_STORAGE` (vector | halfvec, the kb_chunks.embedding type),
+`SPARSE_MODEL_NAME` (default naver/splade-cocondenser-ensembledistil),
+`SPARSE_DEVICE` (default cuda when available, else cpu).
+"""
+import time
+
+_IMPORT_START = time.perf_counter()
+
+import os
+import threading
+from typing import Dict, List, Optional
+
+MODEL_NAME = os.getenv("SPARSE_MODEL_NAME", "naver/splade-cocondenser-ensembledistil")
+DENSE_MODEL = os.getenv("OPENAI_MODEL", "text-embedding-ada-002")
+# kb_chunks.embedding column type: vector, or halfvec after
+# database_AI_agent/migrations/store_embeddings_halfvec.sql
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector")
+MAX_LENGTH = 512
+
+
+class SparseEmbedder:
+    """SPLADE encoder producing {token_id: weight} maps.
+
+    Construction is free; the model is loaded on first use, by `load()` or
+    by `warm_up()`.  Safe to share between threads.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, device: Optional[str] = None, max_length: int = MAX_LENGTH):
+        self.model_name = model_name
+        self.device = device or os.getenv("SPARSE_DEVICE")
+        self.max_length = max_length
+        self._tokenizer = None
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.first_call_seconds: Optional[float] = None
+
+    # -- loading -----------------------------------------------------------
+
+    def load(self) -> "SparseEmbedder":
+        if self._model is not None:
+            return self
+        with self._lock:
+            if self._model is not None:
+                return self
+            start = time.perf_counter()
+            import torch
+            from transformers import AutoModelForMaskedLM, AutoTokenizer
+
+            if self.device is None:
+                self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForMaskedLM.from_pretrained(self.model_name).to(self.device).eval()
+            self._tokenizer = tokenizer
+            self._model = model
+            self.load_seconds = time.perf_counter() - start
+            print(f"Loaded sparse model {self.model_name} on {self.device} in {self.load_seconds:.2f}s")
+        return self
+
+    def warm_up(self) -> "SparseEmbedder":
+        """Load the model and run one encode so the first request is not slow."""
+        self.load()
+        self.encode(["warm-up"])
+        return self
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def tokenizer(self):
+        return self.load()._tokenizer
+
+    @property
+    def model(self):
+        return self.load()._model
+
+    @model.setter
+    def model(self, value):
+        # e.g. a quantized copy (see ingest_bench.quantize_sparse_model)
+        self.load()
+        self._model = value
+
+    @property
+    def vocab_size(self) -> int:
+        return self.tokenizer.vocab_size
+
+    # -- encoding ----------------------------------------------------------
+
+    def encode(self, texts: List[str]) -> List[Dict[int, float]]:
+        """Return one {token_id: weight} map per text."""
+        import torch
+
+        start = time.perf_counter()
+        tokenizer, model = self.tokenizer, self.model
+        tokens = tokenizer(
+            list(texts), return_tensors="pt", padding=True, truncation=True, max_length=self.max_length
+        )
+        tokens = {k: v.to(self.device) for k, v in tokens.items()}
+        with torch.no_grad():
+            logits = model(**tokens).logits
+        # SPLADE: max over the sequence of log(1 + relu(logit)), padding masked out
+        activations = torch.log1p(torch.relu(logits)) * tokens["attention_mask"].unsqueeze(-1)
+        weights = torch.max(activations, dim=1).values.cpu()
+        out = []
+        for row in weights:
+            indices = row.nonzero().squeeze(-1).tolist()
+            out.append(dict(zip(indices, row[indices].tolist())))
+        if self.first_call_seconds is None:
+            self.first_call_seconds = time.perf_counter() - start
+        return out
+
+    def embed(self, texts: List[str]):
+        """Vocabulary-sized numpy arrays, for callers that want dense rows."""
+        import numpy as np
+
+        out = []
+        for weights in self.encode(texts):
+            vec = np.zeros(self.vocab_size, dtype=np.float32)
+            if weights:
+                vec[list(weights)] = list(weights.values())
+            out.append(vec)
+        return out
+
+    def to_sparsevec(self, weights: Dict[int, float]) -> str:
+        """pgvector `sparsevec` literal; pgvector indices are 1-based."""
+        pairs = ",".join(f"{i + 1}:{v:.6f}" for i, v in sorted(weights.items()))
+        return f"{{{pairs}}}/{self.vocab_size}"
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "device": self.device,
+            "loaded": self.loaded,
+            "import_seconds": round(IMPORT_SECONDS, 4),
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+            "first_call_seconds": None if self.first_call_seconds is None else round(self.first_call_seconds, 3),
+        }
+
+
+_default: Optional[SparseEmbedder] = None
+_default_lock = threading.Lock()
+_openai_client = None
+
+
+def default_embedder() -> SparseEmbedder:
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = SparseEmbedder()
+    return _default
+
+
+def warm_up() -> SparseEmbedder:
+    return default_embedder().warm_up()
+
+
+def get_sparse(text: str) -> str:
+    """sparsevec literal for one text, using the shared embedder."""
+    embedder = default_embedder()
+    return embedder.to_sparsevec(embedder.encode([text])[0])
 
-# Init
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForMaskedLM.from_pretrained(MODEL_NAME).to(DEVICE).eval()
 
 def get_dense(text):
-    resp = openai.embeddings.create(input=text, model="text-embedding-ada-002")
-    return resp.data[0].embedding  # 1536-dim list
-
-def get_sparse(text):
-    tokens = tokenizer([text], return_tensors="pt", padding=True, truncation=True, max_length=512)
-    tokens = {k: v.to(DEVICE) for k,v in tokens.items()}
-    with torch.no_grad():
-        logits = model(**tokens).logits
-    weights = torch.max(torch.log1p(torch.relu(logits)), dim=1).values[0]
-    # build sparsevec string '{idx:val,...}/vocab_size'
-    indices = weights.nonzero().squeeze().cpu().tolist()
-    values = weights[indices].cpu().tolist()
-    pairs = ",".join(f"{i}:{v:.6f}" for i,v in zip(indices,values))
-    return f"{{{pairs}}}/{tokenizer.vocab_size}"
-
-# Write to DB
-conn = psycopg2.connect(DATABASE_URL)
-register_vector(conn)
-cur = conn.cursor()
-cur.execute("SELECT chunk_id, chunk_text FROM kb_chunks;")
-for cid, text in cur.fetchall():
-    d = get_dense(text)
-    s = get_sparse(text)
-    cur.execute(
-        "UPDATE kb_chunks SET embedding = %s, sparse_embedding = %s WHERE chunk_id = %s",
-        (d, s, cid)
-    )
-conn.commit()
-cur.close()
-conn.close()
+    """OpenAI embedding(s) for a text or a list of texts."""
+    global _openai_client
+    if _openai_client is None:
+        from openai import OpenAI
+
+        _openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    resp = _openai_client.embeddings.create(input=text, model=DENSE_MODEL)
+    if isinstance(text, str):
+        return resp.data[0].embedding  # 1536-dim list
+    return [item.embedding for item in resp.data]
+
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
+
+
+###########################################
+# CLI: backfill kb_chunks / startup bench
+###########################################
+
+def backfill(batch: int = 32, only_missing: bool = False):
+    """Re-embed kb_chunks in keyset-paginated batches, one commit per batch.
+
+    With an active reduced-dimension projection (dense_projection.py) the
+    projected vector is rewritten too.
+    """
+    import psycopg2
+    from pgvector.psycopg2 import register_vector
+    from dense_projection import load_projection
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("✖ DATABASE_URL not set")
+    embedder = default_embedder()
+    where = "AND sparse_embedding IS NULL" if only_missing else ""
+    done, last_id = 0, 0
+    with psycopg2.connect(database_url) as conn:
+        register_vector(conn)
+        with conn.cursor() as cur:
+            projection = load_projection(cur)
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"SELECT chunk_id, chunk_text FROM kb_chunks WHERE chunk_id > %s {where} "
+                    "ORDER BY chunk_id LIMIT %s",
+                    (last_id, batch),
+                )
+                rows = cur.fetchall()
+            if not rows:
+                break
+            ids = [r[0] for r in rows]
+            texts = [r[1] for r in rows]
+            dense = get_dense(texts)
+            sparse = [embedder.to_sparsevec(w) for w in embedder.encode(texts)]
+            with conn.cursor() as cur:
+                cur.executemany(
+                    f"UPDATE kb_chunks SET embedding = %s::{EMBEDDING_STORAGE}, sparse_embedding = %s::sparsevec "
+                    "WHERE chunk_id = %s",
+                    list(zip(dense, sparse, ids)),
+                )
+                if projection is not None:
+                    cur.executemany(
+                        f"UPDATE kb_chunks SET embedding_reduced = %s::vector({projection.dim}), "
+                        "embedding_reduced_version = %s WHERE chunk_id = %s",
+                        [(vec, projection.version, i) for vec, i in zip(projection.project(dense), ids)],
+                    )
+            conn.commit()
+            done += len(rows)
+            last_id = ids[-1]
+            print(f"✔ Embedded {done} chunks (last chunk_id {last_id})")
+    print("✓ Backfill complete")
+
+
+def startup_bench():
+    """Print import, model-load and first/second call latency as JSON."""
+    import json
+
+    embedder = SparseEmbedder()
+    embedder.load()
+    embedder.encode(["How do I reset a user's password?"])
+    start = time.perf_counter()
+    embedder.encode(["PostgreSQL backup failed with error"])
+    stats = embedder.stats()
+    stats["second_call_seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(stats, indent=2))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SPLADE sparse encoder utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_backfill = sub.add_parser("backfill", help="Re-embed kb_chunks (dense + sparse)")
+    p_backfill.add_argument("--batch", type=int, default=int(os.getenv("BATCH_SIZE", 32)))
+    p_backfill.add_argument("--only-missing", action="store_true", help="Only rows without a sparse embedding")
+    sub.add_parser("startup-bench", help="Measure import, load and first-call latency")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        backfill(args.batch, args.only_missing)
+    else:
+        startup_bench()
+
+
+if __name__ == "__main__":
+    main()
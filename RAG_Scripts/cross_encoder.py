@@ -0,0 +1,159 @@
+"""RAG-Search-LAB - cross-encoder reranking of fused retrieval candidates
+
+A small local cross-encoder (default `cross-encoder/ms-marco-MiniLM-L-6-v2`,
+~22M parameters, fine on CPU) scores every (query, chunk) pair jointly,
+which is far more precise than the fused dense/sparse distances, so fewer
+chunks need to go into the prompt.
+
+* Candidates are sorted by length and batched, and every batch is padded
+  only to its own longest pair (dynamic padding), so short chunks do not
+  pay for long ones.
+* Scores are cached per (query, chunk) for `cache_ttl` seconds, so a
+  repeated query only scores chunks it has not seen yet.
+* `rerank()` stops starting new batches once its deadline has passed and
+  returns None; callers then keep the fusion order.  The FastAPI backend
+  additionally bounds the wait with `asyncio.wait_for`, so a slow batch
+  never holds up the request (batches that finish are still cached).
+
+Like `create_emb_sparse`, importing this module loads nothing; the model is
+loaded by `load()`, `warm_up()` or the first `rerank()`.
+"""
+import hashlib
+import threading
+import time
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+from ttl_cache import TTLCache
+
+DEFAULT_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        device: str = "cpu",
+        max_length: int = 256,
+        batch_size: int = 16,
+        threads: int = 0,
+        cache_size: int = 20000,
+        cache_ttl: float = 3600.0,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.threads = threads
+        self.scores = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._cache_lock = threading.Lock()
+        self._tokenizer = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        # one forward pass at a time: torch already uses every core per batch
+        self._score_lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.calls = 0
+        self.deadline_misses = 0
+        self.pairs_scored = 0
+        self.score_seconds = 0.0
+
+    def load(self) -> "CrossEncoderReranker":
+        if self._model is not None:
+            return self
+        with self._load_lock:
+            if self._model is not None:
+                return self
+            start = time.perf_counter()
+            import torch
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForSequenceClassification.from_pretrained(self.model_name).to(self.device).eval()
+            self._tokenizer = tokenizer
+            self._model = model
+            self.load_seconds = time.perf_counter() - start
+            print(f"Loaded cross-encoder {self.model_name} on {self.device} in {self.load_seconds:.2f}s")
+        return self
+
+    def warm_up(self) -> "CrossEncoderReranker":
+        self.load()
+        self.score_pairs("warm-up", ["warm-up"])
+        return self
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def score_pairs(self, query: str, passages: Sequence[str], deadline: Optional[float] = None) -> List[Optional[float]]:
+        """Relevance logit per passage; None for those not reached before `deadline` (perf_counter)."""
+        import torch
+
+        self.load()
+        order = sorted(range(len(passages)), key=lambda i: len(passages[i]))
+        out: List[Optional[float]] = [None] * len(passages)
+        with self._score_lock:
+            for start in range(0, len(order), self.batch_size):
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+                batch = order[start:start + self.batch_size]
+                began = time.perf_counter()
+                tokens = self._tokenizer(
+                    [query] * len(batch),
+                    [passages[i] for i in batch],
+                    padding="longest",
+                    truncation="only_second",
+                    max_length=self.max_length,
+                    return_tensors="pt",
+                )
+                tokens = {k: v.to(self.device) for k, v in tokens.items()}
+                with torch.inference_mode():
+                    logits = self._model(**tokens).logits
+                # single-logit models (ms-marco) score in column 0; two-class
+                # models put "relevant" last
+                for i, value in zip(batch, logits[:, -1].float().cpu().tolist()):
+                    out[i] = value
+                self.pairs_scored += len(batch)
+                self.score_seconds += time.perf_counter() - began
+        return out
+
+    def rerank(
+        self, query: str, candidates: Sequence[Tuple[Hashable, str]], budget_seconds: Optional[float] = None
+    ) -> Optional[List[Tuple[int, float]]]:
+        """(candidate index, score) best first, or None when the budget ran out.
+
+        `candidates` are (chunk key, text) pairs; the key identifies the
+        chunk for the score cache (chunk_id where known).
+        """
+        self.calls += 1
+        deadline = None if budget_seconds is None else time.perf_counter() + budget_seconds
+        query_key = hashlib.sha1(query.encode()).hexdigest()
+        with self._cache_lock:
+            scores: List[Optional[float]] = [self.scores.get((query_key, key)) for key, _ in candidates]
+        missing = [i for i, s in enumerate(scores) if s is None]
+        if missing:
+            fresh = self.score_pairs(query, [candidates[i][1] for i in missing], deadline)
+            with self._cache_lock:
+                for i, score in zip(missing, fresh):
+                    if score is not None:
+                        scores[i] = score
+                        self.scores.put((query_key, candidates[i][0]), score)
+            if any(score is None for score in fresh):
+                self.deadline_misses += 1
+                return None
+        return sorted(enumerate(scores), key=lambda item: -item[1])
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "device": self.device,
+            "loaded": self.loaded,
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+            "batch_size": self.batch_size,
+            "calls": self.calls,
+            "deadline_misses": self.deadline_misses,
+            "pairs_scored": self.pairs_scored,
+            "ms_per_pair": round(1000 * self.score_seconds / self.pairs_scored, 3) if self.pairs_scored else None,
+            "score_cache": self.scores.stats(),
+        }
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""RAG-Search-LAB - reduced-dimension projections of kb_chunks.embedding
+
+Dense search can run its first pass over `kb_chunks.embedding_reduced`, a
+projection of the 1536-dim embedding to a few hundred dimensions, and rerank
+the shortlist against the full vector (`DENSE_FIRST_PASS=reduced`, see
+`quantized_search.py`).  Two projections are supported:
+
+* `pca`        - mean-centred principal components fitted on a sample of
+                 the corpus; works for any model
+* `matryoshka` - the first `dim` coordinates, renormalised; only meaningful
+                 for models trained that way (text-embedding-3-*), not for
+                 text-embedding-ada-002
+
+Projections are versioned in `kb_embedding_projections`; exactly one is
+active.  Every row records the version it was projected with
+(`embedding_reduced_version`) and the first pass only considers rows of the
+active version, so switching versions never mixes projections: rows drop
+out of the first pass until `backfill` has rewritten them.
+
+CLI
+---
+```bash
+python dense_projection.py evaluate --method pca --dims 64,128,256,512
+python dense_projection.py fit --method pca --dim 256 --sample 50000
+python dense_projection.py activate 3      # resize column, backfill, index
+python dense_projection.py backfill        # rows inserted since
+python dense_projection.py list
+```
+The DSN defaults to `DATABASE_URL` (an SQLAlchemy URL is accepted).  The
+schema is created by `database_AI_agent/migrations/reduced_embedding_projection.sql`.
+"""
+import json
+import os
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from dense_replica import as_array, libpq_dsn, normalize
+
+PROJECTION_METHODS = ("pca", "matryoshka")
+INDEX_NAME = "kb_chunks_embedding_reduced_hnsw_idx"
+
+
+class Projection:
+    """A linear map from `source_dim` to `dim`, L2-normalised after projecting."""
+
+    def __init__(
+        self,
+        method: str,
+        source_dim: int,
+        dim: int,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None,
+        version: Optional[int] = None,
+        explained_variance: Optional[float] = None,
+        sample_rows: int = 0,
+    ):
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"unknown projection method: {method}")
+        if not 0 < dim <= source_dim:
+            raise ValueError(f"dim must be in 1..{source_dim}, got {dim}")
+        self.method = method
+        self.source_dim = source_dim
+        self.dim = dim
+        self.mean = mean
+        self.components = components  # (dim, source_dim), pca only
+        self.version = version
+        self.explained_variance = explained_variance
+        self.sample_rows = sample_rows
+
+    def project(self, vectors) -> np.ndarray:
+        """Project one vector or a (n, source_dim) matrix."""
+        vectors = normalize(vectors)
+        if self.method == "matryoshka":
+            return normalize(vectors[..., :self.dim])
+        return normalize((vectors - self.mean) @ self.components.T)
+
+    @classmethod
+    def from_row(cls, row) -> "Projection":
+        """Build from a `kb_embedding_projections` row (mapping or named tuple)."""
+        get = row.get if hasattr(row, "get") else lambda key: getattr(row, key)
+        mean = components = None
+        if get("components") is not None:
+            mean = np.frombuffer(bytes(get("mean")), dtype=np.float32)
+            components = np.frombuffer(bytes(get("components")), dtype=np.float32).reshape(get("dim"), -1)
+        return cls(
+            get("method"),
+            get("source_dim"),
+            get("dim"),
+            mean=mean,
+            components=components,
+            version=get("version"),
+            explained_variance=get("explained_variance"),
+            sample_rows=get("sample_rows"),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "method": self.method,
+            "source_dim": self.source_dim,
+            "dim": self.dim,
+            "explained_variance": self.explained_variance,
+            "sample_rows": self.sample_rows,
+        }
+
+
+def fit_pca(vectors: np.ndarray, dim: int) -> Projection:
+    """Principal components of the normalised sample (eigendecomposition of the covariance)."""
+    data = normalize(vectors).astype(np.float64)
+    mean = data.mean(axis=0)
+    centred = data - mean
+    eigvals, eigvecs = np.linalg.eigh(centred.T @ centred / max(len(data) - 1, 1))
+    top = np.argsort(eigvals)[::-1][:dim]
+    explained = float(eigvals[top].sum() / eigvals.sum()) if eigvals.sum() > 0 else 0.0
+    return Projection(
+        "pca",
+        data.shape[1],
+        dim,
+        mean=mean.astype(np.float32),
+        components=eigvecs[:, top].T.astype(np.float32),
+        explained_variance=round(explained, 4),
+        sample_rows=len(data),
+    )
+
+
+def matryoshka(source_dim: int, dim: int) -> Projection:
+    return Projection("matryoshka", source_dim, dim)
+
+
+def build(method: str, vectors: np.ndarray, dim: int) -> Projection:
+    if method == "pca":
+        return fit_pca(vectors, dim)
+    return matryoshka(vectors.shape[1], dim)
+
+
+def recall_report(projection: Projection, vectors: np.ndarray, queries: np.ndarray, k: int, candidates: Sequence[int]) -> dict:
+    """recall@k of first pass + full-dimension rerank against exact search, in memory."""
+    docs, queries = normalize(vectors), normalize(queries)
+    exact = np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+    reduced_sims = projection.project(queries) @ projection.project(docs).T
+    report = {}
+    for cand in candidates:
+        cand = min(max(cand, k), len(docs))
+        shortlist = np.argpartition(-reduced_sims, cand - 1, axis=1)[:, :cand]
+        hits = 0
+        for q, rows in enumerate(shortlist):
+            reranked = rows[np.argsort(-(docs[rows] @ queries[q]))[:k]]
+            hits += len(set(reranked.tolist()) & set(exact[q].tolist()))
+        report[f"candidates={cand}"] = round(hits / (len(queries) * k), 4)
+    return report
+
+
+########################################
+# Database side
+########################################
+
+
+def load_projection(cur, version: Optional[int] = None) -> Optional[Projection]:
+    """The active projection (or `version`); None if there is none or no table."""
+    cur.execute("SELECT to_regclass('kb_embedding_projections') IS NOT NULL AS present")
+    if not _as_dict(cur, cur.fetchone())["present"]:
+        return None
+    where = "version = %s" if version is not None else "active"
+    cur.execute(
+        "SELECT version, method, source_dim, dim, mean, components, explained_variance, sample_rows "
+        f"FROM kb_embedding_projections WHERE {where}",
+        (version,) if version is not None else None,
+    )
+    row = cur.fetchone()
+    return Projection.from_row(_as_dict(cur, row)) if row is not None else None
+
+
+def _as_dict(cur, row) -> dict:
+    """Plain and RealDictCursor rows alike."""
+    if isinstance(row, dict):
+        return dict(row)
+    return dict(zip((col[0] for col in cur.description), row))
+
+
+def sample_embeddings(cur, n: int, table: str = "kb_chunks") -> np.ndarray:
+    cur.execute(f"SELECT embedding FROM {table} ORDER BY random() LIMIT %s", (n,))
+    rows = cur.fetchall()
+    if not rows:
+        raise SystemExit(f"✖ {table} is empty")
+    return np.stack([as_array(r[0]) for r in rows])
+
+
+def save_projection(cur, projection: Projection) -> int:
+    cur.execute(
+        """
+        INSERT INTO kb_embedding_projections
+            (method, source_dim, dim, mean, components, explained_variance, sample_rows)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        RETURNING version
+        """,
+        (
+            projection.method,
+            projection.source_dim,
+            projection.dim,
+            projection.mean.tobytes() if projection.mean is not None else None,
+            projection.components.tobytes() if projection.components is not None else None,
+            projection.explained_variance,
+            projection.sample_rows,
+        ),
+    )
+    projection.version = cur.fetchone()[0]
+    return projection.version
+
+
+def backfill(dsn: str, batch: int = 2000, projection: Optional[Projection] = None) -> dict:
+    """Project every row not yet at the active version, keyset-paginated, one commit per batch."""
+    import psycopg2
+    from pgvector.psycopg2 import register_vector
+    from psycopg2.extras import execute_values
+
+    start = time.perf_counter()
+    conn = psycopg2.connect(libpq_dsn(dsn))
+    try:
+        register_vector(conn)
+        with conn.cursor() as cur:
+            projection = projection or load_projection(cur)
+        if projection is None:
+            raise SystemExit("✖ No active projection")
+        done, last_id = 0, 0
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT chunk_id, embedding FROM kb_chunks "
+                    "WHERE chunk_id > %s AND embedding_reduced_version IS DISTINCT FROM %s "
+                    "ORDER BY chunk_id LIMIT %s",
+                    (last_id, projection.version, batch),
+                )
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                reduced = projection.project(np.stack([as_array(r[1]) for r in rows]))
+                execute_values(
+                    cur,
+                    f"""
+                    UPDATE kb_chunks c
+                    SET embedding_reduced = v.e::vector({projection.dim}), embedding_reduced_version = %s
+                    FROM (VALUES %s) AS v(chunk_id, e)
+                    WHERE c.chunk_id = v.chunk_id
+                    """,
+                    [(r[0], vec) for r, vec in zip(rows, reduced)],
+                    template="(%s, %s)",
+                )
+            conn.commit()
+            done += len(rows)
+            last_id = rows[-1][0]
+            print(f"✔ Projected {done} chunks (last chunk_id {last_id})")
+        return {"version": projection.version, "projected": done, "seconds": round(time.perf_counter() - start, 1)}
+    finally:
+        conn.close()
+
+
+def activate(dsn: str, version: int, batch: int = 2000) -> dict:
+    """Make `version` active, resize the column if needed, backfill and (re)build the index."""
+    import psycopg2
+
+    conn = psycopg2.connect(libpq_dsn(dsn))
+    try:
+        with conn.cursor() as cur:
+            projection = load_projection(cur, version)
+            if projection is None:
+                raise SystemExit(f"✖ Unknown projection version {version}")
+            cur.execute(
+                "SELECT atttypmod FROM pg_attribute "
+                "WHERE attrelid = 'kb_chunks'::regclass AND attname = 'embedding_reduced'"
+            )
+            resized = cur.fetchone()[0] != projection.dim
+            if resized:
+                # The index and the stored vectors are tied to the old dimension
+                cur.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+                cur.execute(
+                    f"ALTER TABLE kb_chunks ALTER COLUMN embedding_reduced TYPE vector({projection.dim}) USING NULL"
+                )
+                cur.execute("UPDATE kb_chunks SET embedding_reduced_version = NULL")
+            cur.execute("UPDATE kb_embedding_projections SET active = (version = %s)", (version,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    result = backfill(dsn, batch, projection)
+    conn = psycopg2.connect(libpq_dsn(dsn))
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} "
+                "ON kb_chunks USING hnsw (embedding_reduced vector_cosine_ops)"
+            )
+            cur.execute("ANALYZE kb_chunks")
+    finally:
+        conn.close()
+    return dict(result, resized=resized, dim=projection.dim)
+
+
+def list_projections(cur) -> list:
+    cur.execute(
+        "SELECT version, method, source_dim, dim, explained_variance, sample_rows, active, created_at "
+        "FROM kb_embedding_projections ORDER BY version"
+    )
+    rows = [_as_dict(cur, row) for row in cur.fetchall()]
+    return [dict(row, created_at=row["created_at"].isoformat()) for row in rows]
+
+
+def main():
+    import argparse
+
+    import psycopg2
+    from pgvector.psycopg2 import register_vector
+
+    parser = argparse.ArgumentParser(description="Fit, version and apply reduced-dimension embedding projections")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Postgres URL (DATABASE_URL)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_fit = sub.add_parser("fit", help="Fit a projection on a corpus sample and store it (inactive)")
+    p_fit.add_argument("--method", choices=PROJECTION_METHODS, default="pca")
+    p_fit.add_argument("--dim", type=int, default=256)
+    p_fit.add_argument("--sample", type=int, default=50000)
+    p_eval = sub.add_parser("evaluate", help="recall@k of each target dimension on a corpus sample")
+    p_eval.add_argument("--method", choices=PROJECTION_METHODS, default="pca")
+    p_eval.add_argument("--dims", default="64,128,256,512")
+    p_eval.add_argument("--sample", type=int, default=20000)
+    p_eval.add_argument("--queries", type=int, default=200, help="Held-out rows used as queries")
+    p_eval.add_argument("--k", type=int, default=10)
+    p_eval.add_argument("--candidates", default="50,100,200")
+    p_act = sub.add_parser("activate", help="Switch to a stored version, backfill and index")
+    p_act.add_argument("version", type=int)
+    p_act.add_argument("--batch", type=int, default=2000)
+    p_back = sub.add_parser("backfill", help="Project rows missing the active version")
+    p_back.add_argument("--batch", type=int, default=2000)
+    sub.add_parser("list", help="Stored projections")
+    args = parser.parse_args()
+    if not args.dsn:
+        raise SystemExit("✖ --dsn or DATABASE_URL is required")
+
+    if args.command == "activate":
+        print(json.dumps(activate(args.dsn, args.version, args.batch), indent=2))
+        return
+    if args.command == "backfill":
+        print(json.dumps(backfill(args.dsn, args.batch), indent=2))
+        return
+
+    with psycopg2.connect(libpq_dsn(args.dsn)) as conn:
+        register_vector(conn)
+        with conn.cursor() as cur:
+            if args.command == "list":
+                print(json.dumps(list_projections(cur), indent=2))
+            elif args.command == "fit":
+                projection = build(args.method, sample_embeddings(cur, args.sample), args.dim)
+                save_projection(cur, projection)
+                print(json.dumps(projection.stats(), indent=2))
+            else:
+                data = sample_embeddings(cur, args.sample + args.queries)
+                queries, vectors = data[:args.queries], data[args.queries:]
+                candidates = [int(c) for c in args.candidates.split(",") if c]
+                report = []
+                for dim in (int(d) for d in args.dims.split(",") if d):
+                    projection = build(args.method, vectors, dim)
+                    start = time.perf_counter()
+                    recall = recall_report(projection, vectors, queries, args.k, candidates)
+                    report.append(dict(
+                        projection.stats(),
+                        **{f"recall@{args.k}": recall},
+                        bytes_per_row=4 * dim + 8,
+                        eval_seconds=round(time.perf_counter() - start, 2),
+                    ))
+                print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""RAG-Search-LAB - in-process dense ANN replica of kb_chunks
+
+An optional hot tier in front of pgvector: `kb_chunks.embedding` copied into
+memory-mapped files that every uvicorn worker maps read-only (the page cache
+holds a single copy).  `search()` returns `(chunk_id, cosine similarity)`
+pairs in-process; callers hydrate the chunk rows from Postgres by primary
+key.
+
+Files under the replica directory
+---------------------------------
+```
+manifest.json             generation, rows, watermark, refreshed_at, ...
+gen-000004/vectors.f32    (capacity, dim) float32, L2-normalised
+gen-000004/ids.i64        chunk_id of every row
+gen-000004/lists.i32      IVF list of every row (-1 without IVF)
+gen-000004/centroids.f32  (nlist, dim) IVF centroids
+```
+Below `MIN_IVF_ROWS` rows the replica is scanned exactly; above, rows are
+bucketed by spherical k-means centroids (IVF-flat) and a query scans the
+`nprobe` closest lists.
+
+Refresh
+-------
+`refresh()` appends rows whose `inserted_at` is newer than the manifest
+watermark (minus `overlap_seconds`, to catch transactions that committed
+late; duplicates are skipped), then atomically replaces the manifest.  One
+process refreshes at a time (`flock` on `.lock`); readers pick up the new
+manifest within `reload_interval` seconds.  Growing past the capacity or 4x
+past the size the centroids were trained on writes a new generation.
+Updated or deleted chunks are not seen by the watermark: `check()` reports
+them and `rebuild()` starts over from a full scan.
+
+CLI
+---
+```bash
+python dense_replica.py rebuild --dir /var/lib/raglab/dense-replica
+python dense_replica.py refresh --loop 30
+python dense_replica.py check --sample 500
+```
+The DSN defaults to `DATABASE_URL` (an SQLAlchemy URL is accepted).
+"""
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+MIN_IVF_ROWS = 4096
+RETRAIN_GROWTH = 4
+ASSIGN_CHUNK = 65536
+
+
+def libpq_dsn(url: str) -> str:
+    """`postgresql+asyncpg://...` -> `postgresql://...` for psycopg2."""
+    scheme, sep, rest = url.partition("://")
+    return scheme.split("+")[0] + sep + rest
+
+
+def normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def as_array(value) -> np.ndarray:
+    """Embedding column value as float32 (halfvec comes back as HalfVector)."""
+    if hasattr(value, "to_numpy"):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iters: int = 10, sample: int = 50000, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of normalised rows."""
+    rng = np.random.default_rng(seed)
+    idx = np.sort(rng.choice(len(vectors), size=min(len(vectors), sample), replace=False))
+    data = np.asarray(vectors[idx])
+    centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        sums[empty] = data[rng.integers(len(data), size=int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: Optional[np.ndarray]) -> np.ndarray:
+    if centroids is None:
+        return np.full(len(vectors), -1, dtype=np.int32)
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        block = np.asarray(vectors[start:start + ASSIGN_CHUNK])
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+@dataclass
+class _Snapshot:
+    """Read-only view of one generation, shared by searches in a worker."""
+    manifest: dict
+    rows: int
+    vectors: np.ndarray
+    ids: np.ndarray
+    centroids: Optional[np.ndarray]
+    order: Optional[np.ndarray]   # row numbers sorted by IVF list
+    bounds: Optional[np.ndarray]  # list c owns order[bounds[c]:bounds[c + 1]]
+
+
+class _Generation:
+    """Writable arrays of one generation (refresh side only)."""
+
+    def __init__(self, replica: "DenseReplica", manifest: dict, create: bool = False):
+        self.replica = replica
+        self.manifest = manifest
+        directory = replica.gen_dir(manifest["generation"])
+        if create:
+            os.makedirs(directory, exist_ok=True)
+        mode = "w+" if create else "r+"
+        capacity, dim = manifest["capacity"], manifest["dim"]
+        self.vectors = np.memmap(os.path.join(directory, "vectors.f32"), dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self.ids = np.memmap(os.path.join(directory, "ids.i64"), dtype=np.int64, mode=mode, shape=(capacity,))
+        self.lists = np.memmap(os.path.join(directory, "lists.i32"), dtype=np.int32, mode=mode, shape=(capacity,))
+        self.centroids = None if create else replica.read_centroids(manifest)
+
+    @property
+    def rows(self) -> int:
+        return self.manifest["rows"]
+
+    def _successor(self, capacity: int, centroids: Optional[np.ndarray], retrained: bool = False) -> "_Generation":
+        manifest = dict(
+            self.manifest,
+            generation=self.manifest["generation"] + 1,
+            capacity=capacity,
+            nlist=0 if centroids is None else len(centroids),
+        )
+        if retrained:
+            manifest["trained_rows"] = self.rows
+        nxt = _Generation(self.replica, manifest, create=True)
+        if centroids is not None:
+            centroids.astype(np.float32).tofile(os.path.join(self.replica.gen_dir(manifest["generation"]), "centroids.f32"))
+            nxt.centroids = centroids
+        for start in range(0, self.rows, ASSIGN_CHUNK):
+            end = min(start + ASSIGN_CHUNK, self.rows)
+            nxt.vectors[start:end] = self.vectors[start:end]
+            nxt.ids[start:end] = self.ids[start:end]
+        nxt.lists[: self.rows] = (
+            assign_lists(nxt.vectors[: self.rows], centroids) if retrained else self.lists[: self.rows]
+        )
+        return nxt
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray) -> "_Generation":
+        gen = self
+        rows, n = self.rows, len(ids)
+        if rows + n > self.manifest["capacity"]:
+            gen = self._successor(max(1024, 2 * (rows + n)), self.centroids)
+        gen.vectors[rows:rows + n] = vectors
+        gen.ids[rows:rows + n] = ids
+        gen.lists[rows:rows + n] = assign_lists(vectors, gen.centroids)
+        gen.manifest["rows"] = rows + n
+        return gen
+
+    def maybe_train(self, nlist: int = 0) -> "_Generation":
+        """Train or retrain IVF centroids once the corpus is big enough."""
+        rows = self.rows
+        trained = self.manifest.get("trained_rows") or 0
+        if rows < MIN_IVF_ROWS or (self.centroids is not None and rows < RETRAIN_GROWTH * trained):
+            return self
+        nlist = min(nlist or int(np.sqrt(rows)), rows)
+        centroids = train_centroids(self.vectors[:rows], nlist)
+        return self._successor(self.manifest["capacity"], centroids, retrained=True)
+
+    def flush(self):
+        for arr in (self.vectors, self.ids, self.lists):
+            arr.flush()
+
+
+class DenseReplica:
+    def __init__(
+        self,
+        path: str,
+        dim: int = 1536,
+        nprobe: int = 16,
+        nlist: int = 0,
+        table: str = "kb_chunks",
+        overlap_seconds: float = 300.0,
+        reload_interval: float = 1.0,
+    ):
+        self.path = path
+        self.dim = dim
+        self.nprobe = nprobe
+        self.nlist = nlist  # 0 = sqrt(rows)
+        self.table = table
+        self.overlap_seconds = overlap_seconds
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked = 0.0
+        self.searches = 0
+
+    # -- files -------------------------------------------------------------
+
+    def gen_dir(self, generation: int) -> str:
+        return os.path.join(self.path, f"gen-{generation:06d}")
+
+    def read_manifest(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.path, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def read_centroids(self, manifest: dict) -> Optional[np.ndarray]:
+        if not manifest.get("nlist"):
+            return None
+        path = os.path.join(self.gen_dir(manifest["generation"]), "centroids.f32")
+        return np.fromfile(path, dtype=np.float32).reshape(-1, manifest["dim"])
+
+    def _write_manifest(self, manifest: dict):
+        path = os.path.join(self.path, MANIFEST)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        # keep the previous generation for readers that are switching over
+        keep = {os.path.basename(self.gen_dir(g)) for g in (manifest["generation"], manifest["generation"] - 1)}
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name not in keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    # -- serving -----------------------------------------------------------
+
+    def _view(self, force: bool = False) -> Optional[_Snapshot]:
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_interval:
+            return self._snapshot
+        with self._lock:
+            self._checked = now
+            manifest = self.read_manifest()
+            if manifest is None or manifest.get("dim") != self.dim or not manifest.get("rows"):
+                self._snapshot = None
+                return None
+            snap = self._snapshot
+            if snap is not None and (snap.manifest["generation"], snap.rows) == (manifest["generation"], manifest["rows"]):
+                snap.manifest = manifest  # only refreshed_at / watermark moved
+                return snap
+            try:
+                self._snapshot = self._open_snapshot(manifest)
+            except (FileNotFoundError, ValueError) as exc:
+                # generation replaced between reading the manifest and mapping it
+                print(f"Dense replica not loaded: {exc}")
+            return self._snapshot
+
+    def _open_snapshot(self, manifest: dict) -> _Snapshot:
+        directory = self.gen_dir(manifest["generation"])
+        rows, capacity = manifest["rows"], manifest["capacity"]
+        vectors = np.memmap(os.path.join(directory, "vectors.f32"), dtype=np.float32, mode="r", shape=(capacity, self.dim))
+        ids = np.memmap(os.path.join(directory, "ids.i64"), dtype=np.int64, mode="r", shape=(capacity,))
+        centroids = self.read_centroids(manifest)
+        order = bounds = None
+        if centroids is not None:
+            lists = np.memmap(os.path.join(directory, "lists.i32"), dtype=np.int32, mode="r", shape=(capacity,))
+            lists = np.asarray(lists[:rows])
+            order = np.argsort(lists, kind="stable")
+            bounds = np.searchsorted(lists[order], np.arange(len(centroids) + 1))
+        return _Snapshot(manifest, rows, vectors, ids, centroids, order, bounds)
+
+    def ready(self, max_lag: Optional[float] = None) -> bool:
+        """Loaded, and refreshed within `max_lag` seconds if given."""
+        snap = self._view()
+        if snap is None:
+            return False
+        return max_lag is None or time.time() - snap.manifest.get("refreshed_at", 0) <= max_lag
+
+    def search(self, embedding: Sequence[float], k: int, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Top-k `(chunk_id, cosine similarity)`, best first."""
+        snap = self._view()
+        if snap is None or k <= 0:
+            return []
+        self.searches += 1
+        query = normalize(embedding)
+        if snap.centroids is None:
+            candidates = None
+            scores = snap.vectors[: snap.rows] @ query
+        else:
+            probe = max(1, min(nprobe or self.nprobe, len(snap.centroids)))
+            closest = np.argpartition(-(snap.centroids @ query), probe - 1)[:probe]
+            candidates = np.sort(np.concatenate([snap.order[snap.bounds[c]:snap.bounds[c + 1]] for c in closest]))
+            if not len(candidates):
+                return []
+            scores = snap.vectors[candidates] @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = top if candidates is None else candidates[top]
+        return list(zip(snap.ids[rows].tolist(), scores[top].tolist()))
+
+    def stats(self) -> dict:
+        snap = self._view()
+        if snap is None:
+            return {"ready": False, "path": self.path}
+        manifest = snap.manifest
+        return {
+            "ready": True,
+            "path": self.path,
+            "generation": manifest["generation"],
+            "rows": snap.rows,
+            "capacity": manifest["capacity"],
+            "nlist": manifest.get("nlist", 0),
+            "nprobe": self.nprobe,
+            "watermark": manifest.get("watermark"),
+            "lag_seconds": round(time.time() - manifest.get("refreshed_at", 0), 1),
+            "searches": self.searches,
+        }
+
+    # -- refresh -----------------------------------------------------------
+
+    def _locked(self, dsn: str, blocking: bool, work):
+        import psycopg2
+        from pgvector.psycopg2 import register_vector
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return None  # another worker is refreshing
+            conn = psycopg2.connect(libpq_dsn(dsn))
+            try:
+                register_vector(conn)
+                return work(conn)
+            finally:
+                conn.close()
+
+    def refresh(self, dsn: str, batch: int = 5000, blocking: bool = True) -> Optional[dict]:
+        """Append chunks inserted since the watermark; rebuild if there is no replica yet."""
+        return self._locked(dsn, blocking, lambda conn: self._refresh(conn, batch))
+
+    def rebuild(self, dsn: str, batch: int = 5000) -> dict:
+        return self._locked(dsn, True, lambda conn: self._refresh(conn, batch, full=True))
+
+    def _refresh(self, conn, batch: int, full: bool = False) -> dict:
+        start = time.perf_counter()
+        manifest = self.read_manifest()
+        if full or manifest is None or manifest.get("dim") != self.dim:
+            previous = manifest["generation"] if manifest else 0
+            manifest = {
+                "generation": previous + 1,
+                "dim": self.dim,
+                "rows": 0,
+                "capacity": 1024,
+                "nlist": 0,
+                "trained_rows": 0,
+                "watermark": None,
+                "table": self.table,
+            }
+            gen = _Generation(self, manifest, create=True)
+            since = None
+        else:
+            gen = _Generation(self, manifest)
+            since = manifest.get("watermark")
+            if since is not None:
+                since = datetime.fromisoformat(since) - timedelta(seconds=self.overlap_seconds)
+
+        added, watermark = 0, manifest.get("watermark")
+        after = (since, -1) if since is not None else None
+        with conn.cursor() as cur:
+            while True:
+                if after is None:
+                    cur.execute(
+                        f"SELECT chunk_id, embedding, inserted_at FROM {self.table} "
+                        "WHERE inserted_at IS NOT NULL ORDER BY inserted_at, chunk_id LIMIT %s",
+                        (batch,),
+                    )
+                else:
+                    cur.execute(
+                        f"SELECT chunk_id, embedding, inserted_at FROM {self.table} "
+                        "WHERE (inserted_at, chunk_id) > (%s, %s) ORDER BY inserted_at, chunk_id LIMIT %s",
+                        (after[0], after[1], batch),
+                    )
+                fetched = cur.fetchall()
+                if not fetched:
+                    break
+                after = (fetched[-1][2], fetched[-1][0])
+                ids = np.fromiter((r[0] for r in fetched), dtype=np.int64, count=len(fetched))
+                fresh = ~np.isin(ids, gen.ids[: gen.rows]) if gen.rows else np.ones(len(ids), bool)
+                if fresh.any():
+                    vectors = normalize(np.stack([as_array(r[1]) for r, keep in zip(fetched, fresh) if keep]))
+                    gen = gen.append(ids[fresh], vectors)
+                    added += int(fresh.sum())
+                last = fetched[-1][2].isoformat()
+                if watermark is None or datetime.fromisoformat(last) > datetime.fromisoformat(watermark):
+                    watermark = last
+                if len(fetched) < batch:
+                    break
+
+        gen = gen.maybe_train(self.nlist)
+        gen.flush()
+        gen.manifest.update(watermark=watermark, refreshed_at=time.time())
+        self._write_manifest(gen.manifest)
+        return {
+            "added": added,
+            "rows": gen.rows,
+            "generation": gen.manifest["generation"],
+            "nlist": gen.manifest.get("nlist", 0),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    # -- consistency -------------------------------------------------------
+
+    def check(self, dsn: str, sample: int = 200, tolerance: float = 1e-4, seed: int = 0) -> dict:
+        """Compare the replica with the table: row counts, sampled vectors, self-recall."""
+        import psycopg2
+        from pgvector.psycopg2 import register_vector
+
+        snap = self._view(force=True)
+        if snap is None:
+            return {"consistent": False, "reason": "replica not built"}
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(snap.rows, size=min(sample, snap.rows), replace=False))
+        ids = snap.ids[rows]
+        conn = psycopg2.connect(libpq_dsn(dsn))
+        try:
+            register_vector(conn)
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT count(*), max(inserted_at) FROM {self.table}")
+                db_rows, db_watermark = cur.fetchone()
+                cur.execute(f"SELECT chunk_id, embedding FROM {self.table} WHERE chunk_id = ANY(%s)", (ids.tolist(),))
+                db_vectors = {r[0]: r[1] for r in cur.fetchall()}
+        finally:
+            conn.close()
+
+        missing = stale = recalled = 0
+        for row, chunk_id in zip(rows, ids.tolist()):
+            vec = db_vectors.get(chunk_id)
+            if vec is None:
+                missing += 1
+                continue
+            if np.max(np.abs(normalize(as_array(vec)) - snap.vectors[row])) > tolerance:
+                stale += 1
+            if chunk_id in (hit for hit, _ in self.search(snap.vectors[row], 10)):
+                recalled += 1
+        checked = len(rows) - missing
+        report = {
+            "replica_rows": snap.rows,
+            "db_rows": db_rows,
+            "row_gap": db_rows - snap.rows,
+            "watermark": snap.manifest.get("watermark"),
+            "db_max_inserted_at": db_watermark.isoformat() if db_watermark else None,
+            "sampled": len(rows),
+            "missing_in_db": missing,
+            "stale_vectors": stale,
+            "self_recall@10": round(recalled / checked, 4) if checked else None,
+        }
+        report["consistent"] = report["row_gap"] == 0 and missing == 0 and stale == 0
+        return report
+
+
+def from_env(path: Optional[str] = None) -> Optional[DenseReplica]:
+    """Replica configured by DENSE_REPLICA_* variables, or None when disabled."""
+    path = path or os.getenv("DENSE_REPLICA_DIR")
+    if not path:
+        return None
+    return DenseReplica(
+        path,
+        dim=int(os.getenv("DENSE_REPLICA_DIM", "1536")),
+        nprobe=int(os.getenv("DENSE_REPLICA_NPROBE", "16")),
+        nlist=int(os.getenv("DENSE_REPLICA_NLIST", "0")),
+        overlap_seconds=float(os.getenv("DENSE_REPLICA_OVERLAP_SECONDS", "300")),
+    )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build, refresh and check the dense kb_chunks replica")
+    parser.add_argument("command", choices=["rebuild", "refresh", "check", "stats"])
+    parser.add_argument("--dir", default=os.getenv("DENSE_REPLICA_DIR"), help="Replica directory (DENSE_REPLICA_DIR)")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Postgres URL (DATABASE_URL)")
+    parser.add_argument("--table", default="kb_chunks")
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--loop", type=float, default=0, help="refresh: repeat every N seconds")
+    parser.add_argument("--sample", type=int, default=200, help="check: rows compared with the table")
+    args = parser.parse_args()
+    if not args.dir:
+        raise SystemExit("✖ --dir or DENSE_REPLICA_DIR is required")
+    if args.command != "stats" and not args.dsn:
+        raise SystemExit("✖ --dsn or DATABASE_URL is required")
+
+    replica = from_env(args.dir)
+    replica.table = args.table
+    if args.command == "rebuild":
+        print(json.dumps(replica.rebuild(args.dsn, args.batch), indent=2))
+    elif args.command == "refresh":
+        while True:
+            print(json.dumps(replica.refresh(args.dsn, args.batch)))
+            if not args.loop:
+                break
+            time.sleep(args.loop)
+    elif args.command == "check":
+        report = replica.check(args.dsn, args.sample)
+        print(json.dumps(report, indent=2))
+        if not report["consistent"]:
+            raise SystemExit(1)
+    else:
+        print(json.dumps(replica.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -36,12 +36,26 @@ export OPENAI_API_KEY="sk‑…"
 export DATABASE_URL="postgresql://postgres@localhost/mydb"
 python embed_dense_sparse.py --table documents --id id --text body
 ```
+
+Benchmark
+---------
+`--benchmark` measures the same pipeline on a generated corpus: files are
+parsed and split, dense vectors come from a deterministic stub (no OpenAI
+key needed), sparse vectors from the real SPLADE model (`--quantize-sparse`
+for int8), and the UPDATE path runs against a TEMP table when
+`DATABASE_URL` is set.  Output is a JSON report with chunks/sec, the time
+split per stage and peak RSS; see `ingest_bench.py`.
+```bash
+python embed__update_dense_sparse.py --benchmark --bench-docs 500 --bench-output update_baseline.json
+```
 """
 
 import os
 import sys
 import argparse
+import tempfile
 import time
+from pathlib import Path
 from typing import List, Tuple
 
 import numpy as np
@@ -49,6 +63,8 @@ import psycopg2
 from pgvector.psycopg2 import register_vector
 from openai import OpenAI
 
+import ingest_bench
+
 try:
     # Local sparse embedder that ships with the repo
     from create_emb_sparse import SparseEmbedder  # type: ignore
@@ -63,11 +79,28 @@ except ImportError as err:
 # ---------------------------------------------------------------------------
 DENSE_MODEL = os.getenv("OPENAI_MODEL", "text-embedding-ada-002")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", 32))
+# Type of the dense column: vector (fp32) or halfvec (fp16)
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector")
 MAX_RETRIES = 5
 RETRY_BASE_DELAY = 0.25  # seconds
 
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-embedder = SparseEmbedder()  # uses MiniLM‑L6 by default
+# Created on first use so --benchmark runs without an OpenAI key
+_client = None
+_embedder = None
+
+
+def get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    return _client
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = SparseEmbedder()  # uses MiniLM‑L6 by default
+    return _embedder
 
 # ---------------------------------------------------------------------------
 # Dense embeddings with exponential‑backoff retry
@@ -78,7 +111,7 @@ def get_dense_embeddings(texts: List[str]) -> List[List[float]]:
     delay = RETRY_BASE_DELAY
     for _ in range(MAX_RETRIES):
         try:
-            resp = client.embeddings.create(input=texts, model=DENSE_MODEL)
+            resp = get_client().embeddings.create(input=texts, model=DENSE_MODEL)
             return [item.embedding for item in resp.data]
         except Exception as exc:  # pragma: no cover – OpenAI specific
             err = str(exc)
@@ -100,6 +133,20 @@ def batched(iterable: List[Tuple], size: int):
         yield iterable[i : i + size]
 
 
+def write_embeddings(conn, table: str, id_col: str, batch_ids, dense_vecs, sparse_vecs):
+    with conn.cursor() as cur:
+        for rid, dvec, svec in zip(batch_ids, dense_vecs, sparse_vecs):
+            cur.execute(
+                f"""
+                UPDATE {table}
+                   SET dense_embedding  = %s::{EMBEDDING_STORAGE},
+                       sparse_embedding = %s::vector
+                 WHERE {id_col} = %s;""",
+                (dvec, svec.tolist(), rid),
+            )
+    conn.commit()
+
+
 def update_embeddings(
     conn: psycopg2.extensions.connection,
     table: str,
@@ -123,20 +170,74 @@ def update_embeddings(
         batch_texts = [row[1] or "" for row in batch]
 
         dense_vecs = get_dense_embeddings(batch_texts)
-        sparse_vecs = embedder.embed(batch_texts)
+        sparse_vecs = get_embedder().embed(batch_texts)
+
+        write_embeddings(conn, table, id_col, batch_ids, dense_vecs, sparse_vecs)
+        print(f"✔ Updated IDs {batch_ids[0]}…{batch_ids[-1]}")
 
+# ---------------------------------------------------------------------------
+# Benchmark mode
+# ---------------------------------------------------------------------------
+
+def run_benchmark(args) -> None:
+    """Time parse → chunk → dense → sparse → UPDATE on a generated corpus."""
+    lo, hi = ingest_bench.parse_size_range(args.bench_doc_chars)
+    stub = ingest_bench.StubDenseEncoder(latency_ms=args.stub_latency_ms)
+    embedder = get_embedder()
+    if args.quantize_sparse:
+        ingest_bench.quantize_sparse_model(embedder)
+    embedder.embed(["warm-up"])  # keep model load/first-call cost out of the numbers
+    timer = ingest_bench.StageTimer()
+
+    with tempfile.TemporaryDirectory(prefix="raglab_update_") as tmp:
+        paths = ingest_bench.generate_corpus(Path(tmp), args.bench_docs, lo, hi, args.bench_seed)
+        texts: List[str] = []
+        for path in paths:
+            with timer.stage("parsing"):
+                raw_text = path.read_text(encoding="utf-8", errors="ignore")
+            with timer.stage("chunking"):
+                texts.extend(ingest_bench.chunk_fixed(raw_text))
+
+    db_url = os.getenv("DATABASE_URL")
+    conn = None
+    if db_url:
+        # Rows exist up front, as they do when the script runs for real
+        conn = psycopg2.connect(db_url)
+        register_vector(conn)
         with conn.cursor() as cur:
-            for rid, dvec, svec in zip(batch_ids, dense_vecs, sparse_vecs):
-                cur.execute(
-                    f"""
-                    UPDATE {table}
-                       SET dense_embedding  = %s::vector,
-                           sparse_embedding = %s::vector
-                     WHERE {id_col} = %s;""",
-                    (dvec, svec.tolist(), rid),
-                )
+            cur.execute(
+                "CREATE TEMP TABLE ingest_bench_rows ("
+                " id bigint PRIMARY KEY, content text,"
+                " dense_embedding vector, sparse_embedding vector);"
+            )
+            cur.executemany(
+                "INSERT INTO ingest_bench_rows (id, content) VALUES (%s, %s);",
+                list(enumerate(texts)),
+            )
         conn.commit()
-        print(f"✔ Updated IDs {batch_ids[0]}…{batch_ids[-1]}")
+    else:
+        timer.skip("db_write")
+        print("ℹ DATABASE_URL not set – skipping the DB write stage", file=sys.stderr)
+
+    try:
+        for batch in batched(list(enumerate(texts)), BATCH_SIZE):
+            batch_ids = [row[0] for row in batch]
+            batch_texts = [row[1] for row in batch]
+            with timer.stage("dense_embedding"):
+                dense_vecs = stub.embed(batch_texts)
+            with timer.stage("sparse_embedding"):
+                sparse_vecs = embedder.embed(batch_texts)
+            if conn is not None:
+                with timer.stage("db_write"):
+                    write_embeddings(conn, "ingest_bench_rows", "id", batch_ids, dense_vecs, sparse_vecs)
+    finally:
+        if conn is not None:
+            conn.close()
+
+    params = ingest_bench.benchmark_params(args)
+    params["batch"] = BATCH_SIZE
+    report = timer.report("embed__update_dense_sparse", len(paths), len(texts), params)
+    ingest_bench.emit_report(report, args.bench_output)
 
 # ---------------------------------------------------------------------------
 # Main
@@ -144,11 +245,18 @@ def update_embeddings(
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Create dense + sparse embeddings")
-    parser.add_argument("--table", required=True, help="Target DB table")
+    parser.add_argument("--table", help="Target DB table")
     parser.add_argument("--id", dest="id_col", default="id", help="Primary‑key column")
     parser.add_argument("--text", dest="text_col", default="content", help="Text column")
 
+    ingest_bench.add_benchmark_args(parser)
+
     args = parser.parse_args()
+    if args.benchmark:
+        run_benchmark(args)
+        return
+    if not args.table:
+        parser.error("the following arguments are required: --table")
 
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
@@ -19,6 +19,20 @@ If no arguments are given, the script falls back to environment variables:
 * `OPENAI_API_KEY` - used for dense embeddings
 * `OPENAI_MODEL` - dense model name (default text‑embedding‑ada‑002)
 * `BATCH_SIZE`    - batch size (default 32)
+* `EMBEDDING_STORAGE` - `vector` (fp32, default) or `halfvec` (fp16) for
+  `dense_embedding` in newly created tables
+
+Benchmark mode
+--------------
+`--benchmark` ingests a generated corpus instead (see `ingest_bench.py`):
+dense vectors come from a deterministic stub, sparse vectors from the real
+SPLADE model (`--quantize-sparse` for int8), and rows are written to a
+scratch table that is dropped afterwards (only when `--db` is given).
+Reports chunks/sec, the time split per stage and peak RSS as JSON.
+```bash
+python embed_docs.py --benchmark --bench-docs 500 --bench-doc-chars 2000:12000 \
+       --db $POSTGRES_URL_DOCUMENTS --bench-output ingest_baseline.json
+```
 
 Schema (auto-created if missing)
 --------------------------------
@@ -40,6 +54,7 @@ from __future__ import annotations
 import argparse
 import os
 import sys
+import tempfile
 import time
 from itertools import islice
 from pathlib import Path
@@ -49,6 +64,8 @@ import psycopg2
 from pgvector.psycopg2 import register_vector
 from openai import OpenAI
 
+import ingest_bench
+
 try:
     # Local helper from create_emb_sparse.py
     from create_emb_sparse import SparseEmbedder  # type: ignore
@@ -68,6 +85,7 @@ except ImportError:
 DENSE_MODEL = os.getenv("OPENAI_MODEL", "text-embedding-ada-002")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", 32))
 SPARSE_MODEL = os.getenv("SPARSE_MODEL", "splade_en_semble_distil")
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector")
 
 #########################
 # Helper: batch an iterable
@@ -83,50 +101,69 @@ def batched(it: Iterable, size: int):
 # Document loading & simple text splitter
 ###########################################
 
-def load_documents(paths: List[Path]) -> List[tuple[str, str]]:
-    """Return list of (doc_id, text) where *doc_id* is path + ::chunk_index."""
-    docs: List[tuple[str, str]] = []
-    splitter = None
+def make_splitter():
     if RecursiveCharacterTextSplitter:
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    return None
 
-    for p in paths:
-        if p.suffix.lower() == ".pdf":
-            try:
-                from pypdf import PdfReader  # lazy import; optional
-            except ImportError:
-                sys.exit("Install pypdf to read PDFs or convert them beforehand")
-            reader = PdfReader(str(p))
-            raw_text = "\n".join(page.extract_text() or "" for page in reader.pages)
-        else:
-            raw_text = p.read_text(encoding="utf-8", errors="ignore")
 
-        # choose splitting strategy
-        if splitter:
-            chunks = [c.page_content for c in splitter.create_documents([raw_text])]
-        else:
-            # naive fixed‑width split
-            chunks = [raw_text[i : i + 1000] for i in range(0, len(raw_text), 1000)]
+def read_document(p: Path) -> str:
+    if p.suffix.lower() == ".pdf":
+        try:
+            from pypdf import PdfReader  # lazy import; optional
+        except ImportError:
+            sys.exit("Install pypdf to read PDFs or convert them beforehand")
+        reader = PdfReader(str(p))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    return p.read_text(encoding="utf-8", errors="ignore")
+
+
+def split_text(raw_text: str, splitter) -> List[str]:
+    # choose splitting strategy
+    if splitter:
+        return [c.page_content for c in splitter.create_documents([raw_text])]
+    # naive fixed‑width split
+    return ingest_bench.chunk_fixed(raw_text, 1000)
+
 
-        for idx, chunk in enumerate(chunks):
+def load_documents(paths: List[Path]) -> List[tuple[str, str]]:
+    """Return list of (doc_id, text) where *doc_id* is path + ::chunk_index."""
+    docs: List[tuple[str, str]] = []
+    splitter = make_splitter()
+    for p in paths:
+        for idx, chunk in enumerate(split_text(read_document(p), splitter)):
             docs.append((f"{p}::${idx}", chunk))
     return docs
 
 ##########################################
 # Embedding utilities
 ##########################################
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-if client.api_key is None:
-    sys.exit("✖ OPENAI_API_KEY not set")
+# Created on first use so --benchmark runs without an OpenAI key
+_client = None
+_sparse = None
 
-sparse = SparseEmbedder(model_name=SPARSE_MODEL)  # splade mini by default
+
+def get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        if not os.environ.get("OPENAI_API_KEY"):
+            sys.exit("✖ OPENAI_API_KEY not set")
+        _client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    return _client
+
+
+def get_sparse():
+    global _sparse
+    if _sparse is None:
+        _sparse = SparseEmbedder(model_name=SPARSE_MODEL)  # splade mini by default
+    return _sparse
 
 
 def dense_embed(texts: List[str]) -> List[List[float]]:
     delay = 0.3
     for attempt in range(5):
         try:
-            resp = client.embeddings.create(input=texts, model=DENSE_MODEL)
+            resp = get_client().embeddings.create(input=texts, model=DENSE_MODEL)
             return [item.embedding for item in resp.data]
         except Exception as err:  # pragma: no cover
             if "429" in str(err) or "insufficient_quota" in str(err):
@@ -149,7 +186,7 @@ def ensure_schema(cur, table: str):
             path             text UNIQUE,
             chunk_index      integer,
             content          text,
-            dense_embedding  vector(1536),
+            dense_embedding  {EMBEDDING_STORAGE}(1536),
             sparse_embedding vector(768)
         );
         """
@@ -163,7 +200,7 @@ def ensure_schema(cur, table: str):
                                       AND tablename = '{table}'
                                       AND indexname = '{table}_dense_hnsw') THEN
                 CREATE INDEX {table}_dense_hnsw ON {table}
-                    USING hnsw (dense_embedding vector_cosine_ops);
+                    USING hnsw (dense_embedding {EMBEDDING_STORAGE}_cosine_ops);
             END IF;
         END $$;
         """
@@ -196,18 +233,96 @@ def upsert_batch(cur, table: str, records: List[tuple]):
         records,
     )
 
+def to_records(doc_ids, texts, dense_vecs, sparse_vecs) -> List[tuple]:
+    records = []
+    for full_id, text, dvec, svec in zip(doc_ids, texts, dense_vecs, sparse_vecs):
+        path, _, idx = full_id.partition("::$")
+        records.append((path, int(idx) if idx else 0, text, dvec, svec.tolist()))
+    return records
+
+########################################
+# Benchmark mode
+########################################
+
+def run_benchmark(args):
+    """Ingest a generated corpus stage by stage and emit a JSON report."""
+    lo, hi = ingest_bench.parse_size_range(args.bench_doc_chars)
+    stub = ingest_bench.StubDenseEncoder(latency_ms=args.stub_latency_ms)
+    sparse = get_sparse()
+    if args.quantize_sparse:
+        ingest_bench.quantize_sparse_model(sparse)
+    sparse.embed(["warm-up"])  # keep model load/first-call cost out of the numbers
+    timer = ingest_bench.StageTimer()
+
+    with tempfile.TemporaryDirectory(prefix="raglab_ingest_") as tmp:
+        paths = ingest_bench.generate_corpus(Path(tmp), args.bench_docs, lo, hi, args.bench_seed)
+
+        docs: List[tuple[str, str]] = []
+        splitter = make_splitter()
+        for p in paths:
+            with timer.stage("parsing"):
+                raw_text = read_document(p)
+            with timer.stage("chunking"):
+                chunks = split_text(raw_text, splitter)
+            docs.extend((f"{p}::${idx}", chunk) for idx, chunk in enumerate(chunks))
+
+    conn = None
+    table = args.bench_table
+    if args.db:
+        conn = psycopg2.connect(args.db)
+        register_vector(conn)
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {table};")
+            ensure_schema(cur, table)
+        conn.commit()
+    else:
+        timer.skip("db_write")
+        print("ℹ No --db given – skipping the DB write stage", file=sys.stderr)
+
+    try:
+        for chunk in batched(docs, args.batch):
+            doc_ids, texts = zip(*chunk)
+            with timer.stage("dense_embedding"):
+                dense_vecs = stub.embed(list(texts))
+            with timer.stage("sparse_embedding"):
+                sparse_vecs = sparse.embed(list(texts))
+            records = to_records(doc_ids, texts, dense_vecs, sparse_vecs)
+            if conn is not None:
+                with timer.stage("db_write"):
+                    with conn.cursor() as cur:
+                        upsert_batch(cur, table, records)
+                    conn.commit()
+    finally:
+        if conn is not None:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {table};")
+            conn.commit()
+            conn.close()
+
+    params = ingest_bench.benchmark_params(args)
+    params.update(sparse_model=SPARSE_MODEL, splitter="langchain" if splitter else "fixed")
+    report = timer.report("embed_docs", len(paths), len(docs), params)
+    ingest_bench.emit_report(report, args.bench_output)
+
 ########################################
 # Main logic
 ########################################
 
 def main():
     parser = argparse.ArgumentParser(description="Embed a folder of documents")
-    parser.add_argument("inputs", nargs="+", help="Files or directories to ingest")
+    parser.add_argument("inputs", nargs="*", help="Files or directories to ingest")
     parser.add_argument("--db", default=os.getenv("DATABASE_URL", os.getenv("POSTGRES_URL_DOCUMENTS")), help="Postgres URI")
     parser.add_argument("--table", default="documents", help="Target table name")
     parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="Batch size for embedding calls")
+    parser.add_argument("--bench-table", default="documents_ingest_bench", help="Scratch table for --benchmark (dropped afterwards)")
+    ingest_bench.add_benchmark_args(parser)
 
     args = parser.parse_args()
+    if args.benchmark:
+        run_benchmark(args)
+        return
+    if not args.inputs:
+        parser.error("the following arguments are required: inputs")
 
     uri = args.db
     if not uri:
@@ -239,12 +354,8 @@ def main():
         for chunk in batched(docs, args.batch):
             doc_ids, texts = zip(*chunk)
             dense_vecs = dense_embed(list(texts))
-            sparse_vecs = sparse.embed(list(texts))
-
-            records = []
-            for full_id, text, dvec, svec in zip(doc_ids, texts, dense_vecs, sparse_vecs):
-                path, _, idx = full_id.partition("::$")
-                records.append((path, int(idx) if idx else 0, text, dvec, svec.tolist()))
+            sparse_vecs = get_sparse().embed(list(texts))
+            records = to_records(doc_ids, texts, dense_vecs, sparse_vecs)
 
             with conn.cursor() as cur:
                 upsert_batch(cur, args.table, records)
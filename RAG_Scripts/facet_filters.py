@@ -0,0 +1,192 @@
+"""Facet filters for hybrid retrieval (`ChatStreamRequest.filters`).
+
+A filter is `{facet: [value, ...]}`: values of one facet are OR-ed, facets
+are AND-ed, empty lists are ignored.  Facets map to
+
+* `category` (also `categories`, the `/metadata` group name) -
+  `documents.category`
+* anything else - `kb_chunks.metadata`, matching a scalar value or an array
+  containing it (`metadata @> {"facet": "value"}`), which the GIN index on
+  `metadata` serves
+
+Two plans, chosen per request from the number of matching chunks (counted up
+to a cap and cached, so the estimate itself stays cheap):
+
+* `prefilter_exact` - few matches: materialise the matching chunks and rank
+  them by exact distance.  Cost grows with the match count, not the table.
+* `iterative_ann` - many matches: walk the ANN index with the filter applied
+  and let pgvector's iterative scan (`hnsw.iterative_scan`, pgvector >= 0.8)
+  keep going until `k` rows pass it.  Cost grows with 1/selectivity, which
+  is small for broad filters.
+
+`documents.category` is copied from documents_db (`categories.name` of the
+document whose `file_path` is the agent row's `source_path`); until that has
+run, category filters match nothing:
+
+```bash
+python facet_filters.py backfill-categories   # DATABASE_URL, DOCUMENT_DB_URL
+```
+"""
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+PLANS = ("prefilter_exact", "iterative_ann")
+FACET_ALIASES = {
+    "categories": "category",
+    "doc_formats": "format",
+    "sop_statuses": "status",
+    "ticket_types": "ticket_type",
+    "ticket_statuses": "ticket_status",
+    "ticket_priorities": "ticket_priority",
+}
+DOCUMENT_COLUMNS = {"category": "d.category"}
+
+
+def normalize_filters(filters: Optional[Dict[str, List[str]]]) -> Dict[str, List[str]]:
+    """Canonical facet names, sorted unique values, empty facets dropped."""
+    out: Dict[str, List[str]] = {}
+    for facet, values in (filters or {}).items():
+        values = sorted({str(v) for v in values or [] if v is not None and str(v) != ""})
+        if values:
+            facet = FACET_ALIASES.get(facet, facet)
+            out[facet] = sorted(set(out.get(facet, [])) | set(values))
+    return dict(sorted(out.items()))
+
+
+def filter_clause(filters: Dict[str, List[str]]) -> Tuple[str, dict]:
+    """SQL condition over `kb_chunks c JOIN documents d` and its bind parameters.
+
+    Facet names and values only ever reach the query as parameters.
+    """
+    conditions, params = [], {}
+    for i, (facet, values) in enumerate(filters.items()):
+        column = DOCUMENT_COLUMNS.get(facet)
+        if column is not None:
+            params[f"facet_{i}"] = values
+            conditions.append(f"{column} = ANY(:facet_{i})")
+            continue
+        matches = []
+        for j, value in enumerate(values):
+            params[f"facet_{i}_{j}"] = json.dumps({facet: value})
+            params[f"facet_{i}_{j}_in"] = json.dumps({facet: [value]})
+            matches.append(
+                f"c.metadata @> CAST(:facet_{i}_{j} AS jsonb) OR c.metadata @> CAST(:facet_{i}_{j}_in AS jsonb)"
+            )
+        conditions.append("(" + " OR ".join(matches) + ")")
+    return " AND ".join(conditions) or "TRUE", params
+
+
+def count_sql(clause: str, table: str = "kb_chunks", documents: str = "documents") -> str:
+    """Matching chunks, counted up to `:cap` so broad filters stop early."""
+    return f"""
+        SELECT count(*) AS matches FROM (
+            SELECT 1
+            FROM {table} c
+            JOIN {documents} d ON c.document_id = d.document_id
+            WHERE {clause}
+            LIMIT :cap
+        ) m
+    """
+
+
+def choose_plan(matches: int, cap: int) -> str:
+    return "prefilter_exact" if matches < cap else "iterative_ann"
+
+
+def filtered_search_sql(plan: str, clause: str, distance: str, table: str = "kb_chunks", documents: str = "documents") -> str:
+    """Top `:k` filtered chunks by `distance` (an expression over `c`).
+
+    Returns chunk_id, chunk_text, document_id, title and `distance`.  The
+    `prefilter_exact` CTE is materialised so the planner cannot turn it back
+    into an index scan; the `iterative_ann` one because relaxed-order
+    iterative scans may return rows slightly out of order, so they are
+    re-sorted outside.
+    """
+    if plan not in PLANS:
+        raise ValueError(f"unknown filter plan: {plan}")
+    ranked = f"""
+        SELECT c.chunk_id, {distance} AS distance
+        FROM {table} c
+        JOIN {documents} d ON c.document_id = d.document_id
+        WHERE {clause}
+    """
+    if plan == "prefilter_exact":
+        ranked = f"""
+            WITH matching AS MATERIALIZED ({ranked})
+            SELECT chunk_id, distance FROM matching ORDER BY distance LIMIT :k
+        """
+    else:
+        ranked += " ORDER BY distance LIMIT :k"
+    return f"""
+        WITH ranked AS MATERIALIZED ({ranked})
+        SELECT r.chunk_id, c.chunk_text, c.document_id, d.title, r.distance
+        FROM ranked r
+        JOIN {table} c USING (chunk_id)
+        JOIN {documents} d ON c.document_id = d.document_id
+        ORDER BY r.distance
+    """
+
+
+# Current version of every documents_db document, with its category name
+SOURCE_CATEGORIES_SQL = """
+    SELECT DISTINCT ON (d.file_path) d.file_path, c.name
+    FROM document d
+    JOIN categories c ON d.category_id = c.category_id
+    ORDER BY d.file_path, d.archived_date DESC
+"""
+
+
+def backfill_categories(agent_dsn: str, documents_dsn: str) -> dict:
+    """Set `documents.category` in the agent database from documents_db; rows already right are left alone."""
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    from dense_replica import libpq_dsn
+
+    source = psycopg2.connect(libpq_dsn(documents_dsn))
+    try:
+        with source.cursor() as cur:
+            cur.execute(SOURCE_CATEGORIES_SQL)
+            categories = cur.fetchall()
+    finally:
+        source.close()
+    conn = psycopg2.connect(libpq_dsn(agent_dsn))
+    updated = 0
+    try:
+        with conn.cursor() as cur:
+            if categories:
+                execute_values(
+                    cur,
+                    "UPDATE documents a SET category = v.category, updated_at = now() "
+                    "FROM (VALUES %s) AS v (source_path, category) "
+                    "WHERE a.source_path = v.source_path AND a.category IS DISTINCT FROM v.category",
+                    categories,
+                    page_size=len(categories),
+                )
+                updated = cur.rowcount
+            cur.execute("SELECT count(*) FROM documents WHERE category IS NULL")
+            uncategorized = cur.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+    return {"source_documents": len(categories), "updated": updated, "uncategorized": uncategorized}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the columns behind chat facet filters")
+    parser.add_argument("command", choices=["backfill-categories"])
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Agent database URL (DATABASE_URL)")
+    parser.add_argument("--documents-dsn", default=os.getenv("DOCUMENT_DB_URL"), help="documents_db URL (DOCUMENT_DB_URL)")
+    args = parser.parse_args()
+    if not args.dsn:
+        raise SystemExit("✖ --dsn or DATABASE_URL is required")
+    if not args.documents_dsn:
+        raise SystemExit("✖ --documents-dsn or DOCUMENT_DB_URL is required")
+    print(json.dumps(backfill_categories(args.dsn, args.documents_dsn), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""RAG-Search-LAB - Ingestion benchmark helpers
+
+Shared by the `--benchmark` mode of `embed_docs.py` and
+`embed__update_dense_sparse.py`: a generated corpus with configurable
+document sizes, a deterministic stub for the OpenAI dense encoder, optional
+int8 dynamic quantization of the SPLADE model, per-stage timers and a
+peak-RSS probe.  The report is plain JSON so runs can be diffed against a
+stored baseline.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import platform
+import random
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+STAGES = ("parsing", "chunking", "dense_embedding", "sparse_embedding", "db_write")
+
+WORDS = (
+    "database backup restore replication index vacuum checkpoint listener "
+    "tablespace archive log service restart password ticket incident "
+    "network latency timeout configuration patch upgrade cluster failover "
+    "monitoring alert disk memory cpu query performance lock session user"
+).split()
+
+
+def generate_corpus(out_dir: Path, n_docs: int, min_chars: int, max_chars: int, seed: int = 13) -> List[Path]:
+    """Write `n_docs` text files of `min_chars`..`max_chars` characters."""
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(n_docs):
+        target = rng.randint(min_chars, max_chars)
+        parts, size = [], 0
+        while size < target:
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + ". "
+            parts.append(sentence)
+            size += len(sentence)
+            if rng.random() < 0.1:
+                parts.append("\n\n")
+        path = out_dir / f"doc_{i:05d}.txt"
+        path.write_text("".join(parts)[:target], encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def parse_size_range(value: str) -> tuple[int, int]:
+    """Parse `2000` or `1000:8000` into a (min, max) character range."""
+    lo, _, hi = value.partition(":")
+    return int(lo), int(hi or lo)
+
+
+def chunk_fixed(text: str, size: int = 1000) -> List[str]:
+    """Same fixed-width split `embed_docs.py` falls back to without LangChain."""
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+class StubDenseEncoder:
+    """Deterministic stand-in for the OpenAI embeddings call.
+
+    Vectors are derived from a hash of the text so runs are reproducible;
+    `latency_ms` optionally simulates the API round-trip per batch.
+    """
+
+    def __init__(self, dim: int = 1536, latency_ms: float = 0.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        out = []
+        for text in texts:
+            rng = random.Random(hashlib.blake2b(text.encode(), digest_size=8).digest())
+            out.append([rng.uniform(-1, 1) for _ in range(self.dim)])
+        return out
+
+
+def quantize_sparse_model(embedder) -> None:
+    """Apply int8 dynamic quantization to the SPLADE model's Linear layers."""
+    import torch
+
+    embedder.model = torch.quantization.quantize_dynamic(
+        embedder.model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds: Dict[str, float] = {name: 0.0 for name in STAGES}
+        self.skipped: set = set()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def skip(self, name: str):
+        self.skipped.add(name)
+
+    def report(self, script: str, n_docs: int, n_chunks: int, params: dict) -> dict:
+        total = sum(s for name, s in self.seconds.items() if name not in self.skipped)
+        stages = {}
+        for name, secs in self.seconds.items():
+            if name in self.skipped:
+                stages[name] = None
+                continue
+            stages[name] = {
+                "seconds": round(secs, 4),
+                "share": round(secs / total, 4) if total else 0.0,
+            }
+        return {
+            "script": script,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "params": params,
+            "documents": n_docs,
+            "chunks": n_chunks,
+            "total_seconds": round(total, 4),
+            "chunks_per_sec": round(n_chunks / total, 2) if total else 0.0,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "stages": stages,
+        }
+
+
+def emit_report(report: dict, output: Optional[str]) -> None:
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text)
+        print(f"✓ Benchmark report written to {output}")
+    else:
+        print(text)
+
+
+
+def add_benchmark_args(parser) -> None:
+    group = parser.add_argument_group("benchmark mode")
+    group.add_argument("--benchmark", action="store_true", help="Ingest a generated corpus and report throughput instead of embedding real data")
+    group.add_argument("--bench-docs", type=int, default=200, help="Generated documents")
+    group.add_argument("--bench-doc-chars", default="1000:8000", help="Document size in characters, N or MIN:MAX")
+    group.add_argument("--bench-seed", type=int, default=13)
+    group.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated OpenAI latency per dense batch")
+    group.add_argument("--quantize-sparse", action="store_true", help="int8 dynamic quantization of the SPLADE model")
+    group.add_argument("--bench-output", help="Write the JSON report here (default: stdout)")
+
+
+def benchmark_params(args) -> dict:
+    return {
+        "docs": args.bench_docs,
+        "doc_chars": args.bench_doc_chars,
+        "batch": getattr(args, "batch", None),
+        "stub_latency_ms": args.stub_latency_ms,
+        "quantize_sparse": args.quantize_sparse,
+        "seed": args.bench_seed,
+    }
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""RAG-Search-LAB - kb_chunks split across several Postgres nodes
+
+With `KB_SHARD_URLS` set, dense and sparse retrieval stop reading
+`kb_chunks` on the agent database and fan out to every shard instead: each
+shard holds the chunks (and `documents` rows) of the documents routed to it,
+with its own ANN indexes, so no single node has to keep the whole HNSW graph
+in memory.
+
+Routing is per document, so a document's chunks always live together:
+
+* `hash`     - crc32(document_id) modulo the shard count
+* `category` - `documents.category` through `KB_SHARD_CATEGORIES`
+               (`"PostgreSQL DBA=0,Oracle DBA=1"`); unlisted categories and
+               documents without one fall back to the hash
+
+Retrieval sends the same top-k query to every shard concurrently and merges
+the per-shard lists (each already sorted) with a heap (`merge_top_k`).
+Shards that have not answered when the deadline (`KB_SHARD_DEADLINE_MS`)
+passes are dropped from that request and the merge uses what arrived;
+`ScatterGather.stats()` counts calls, timeouts and errors per shard.
+
+The agent database stays the system of record: ingestion, citations, the
+dense replica and projections keep using its `kb_chunks`, and `sync` routes
+its rows to the shards.  Its ANN indexes are not needed once the shards
+serve retrieval.  The reduced-dimension first pass (`embedding_reduced`) is
+not copied; shards use the other first passes or plain HNSW.
+
+CLI
+---
+```bash
+python kb_shards.py sync             # rows added since the last sync (plus --overlap ids)
+python kb_shards.py sync --full      # everything (after re-embedding)
+python kb_shards.py prune            # rows deleted or re-routed since
+python kb_shards.py counts
+python kb_shards.py check --queries 50 --k 10
+```
+The source defaults to `DATABASE_URL`, the shards to `KB_SHARD_URLS` (SQLAlchemy
+URLs are accepted).  Each shard is created with
+`database_AI_agent/migrations/kb_shard_schema.sql`.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import wait as wait_futures
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from dense_replica import libpq_dsn
+
+STRATEGIES = ("hash", "category")
+DOCUMENT_COLUMNS = ("document_id", "title", "source_path", "category")
+CHUNK_COLUMNS = ("chunk_id", "document_id", "chunk_text", "embedding", "sparse_embedding", "metadata", "inserted_at")
+
+
+def shard_label(url: str) -> str:
+    """host:port/database, without credentials, for stats and logs."""
+    parts = urlsplit(url)
+    return f"{parts.hostname or 'localhost'}:{parts.port or 5432}{parts.path}"
+
+
+def parse_categories(spec: str) -> Dict[str, int]:
+    """`"PostgreSQL DBA=0,Oracle DBA=1"` -> {category: shard index}."""
+    out = {}
+    for item in (spec or "").split(","):
+        if item.strip():
+            category, _, shard = item.rpartition("=")
+            out[category.strip()] = int(shard)
+    return out
+
+
+class ShardMap:
+    """Which shard owns a document."""
+
+    def __init__(self, urls: Sequence[str], strategy: str = "hash", categories: Optional[Dict[str, int]] = None):
+        if not urls:
+            raise ValueError("at least one shard URL is required")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown shard strategy: {strategy}")
+        categories = dict(categories or {})
+        for category, shard in categories.items():
+            if not 0 <= shard < len(urls):
+                raise ValueError(f"category {category!r} maps to shard {shard}, only {len(urls)} configured")
+        self.urls = list(urls)
+        self.strategy = strategy
+        self.categories = categories if strategy == "category" else {}
+        self.labels = [shard_label(url) for url in self.urls]
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def shard_for(self, document_id: int, category: Optional[str] = None) -> int:
+        if category is not None and category in self.categories:
+            return self.categories[category]
+        # not hash(): that is salted per process
+        return zlib.crc32(str(document_id).encode()) % len(self.urls)
+
+    def route(self, rows: Iterable[dict]) -> Dict[int, List[dict]]:
+        """Rows carrying `document_id` (and `category`) grouped by owning shard."""
+        routed: Dict[int, List[dict]] = {}
+        for row in rows:
+            routed.setdefault(self.shard_for(row["document_id"], row.get("category")), []).append(row)
+        return routed
+
+    def stats(self) -> dict:
+        return {"shards": self.labels, "strategy": self.strategy, "categories": self.categories}
+
+
+def from_env() -> Optional[ShardMap]:
+    """Shard map configured by KB_SHARD_* variables, or None when kb_chunks is not sharded."""
+    urls = [url.strip() for url in os.getenv("KB_SHARD_URLS", "").split(",") if url.strip()]
+    if not urls:
+        return None
+    return ShardMap(
+        urls,
+        strategy=os.getenv("KB_SHARD_STRATEGY", "hash"),
+        categories=parse_categories(os.getenv("KB_SHARD_CATEGORIES", "")),
+    )
+
+
+def merge_top_k(lists: Sequence[list], k: int, key: Optional[Callable] = None) -> list:
+    """First k rows of several lists that are each sorted by `key`; concatenated when key is None."""
+    if key is None:
+        return list(itertools.islice(itertools.chain(*lists), k))
+    return list(itertools.islice(heapq.merge(*lists, key=key), k))
+
+
+class ScatterGather:
+    """Run one call per shard and keep the results that arrive before the deadline."""
+
+    def __init__(self, labels: Sequence[str], deadline_seconds: float):
+        self.deadline = deadline_seconds
+        self.shards = [
+            {"shard": label, "calls": 0, "completed": 0, "timeouts": 0, "errors": 0, "seconds": 0.0}
+            for label in labels
+        ]
+        self.gathers = 0
+        self.partial = 0
+        self.empty = 0
+        self._lock = threading.Lock()
+
+    def _completed(self, shard: int, began: float, error: Optional[Exception] = None):
+        with self._lock:
+            entry = self.shards[shard]
+            entry["completed"] += 1
+            entry["seconds"] += time.perf_counter() - began
+            if error is not None:
+                entry["errors"] += 1
+        if error is not None:
+            print(f"Shard {self.shards[shard]['shard']} failed: {error}")
+
+    def _collect(self, results: Dict[int, Any]) -> list:
+        answered = [result for result in results.values() if result is not None]
+        with self._lock:
+            self.gathers += 1
+            for shard, entry in enumerate(self.shards):
+                entry["calls"] += 1
+                if shard not in results:
+                    entry["timeouts"] += 1
+            if len(answered) < len(self.shards):
+                self.partial += 1
+            if not answered:
+                self.empty += 1
+        return answered
+
+    async def gather(self, calls: Sequence[Callable[[], Awaitable[Any]]]) -> list:
+        """Results of `calls[i]()` (one per shard) that finished in time; the rest are cancelled."""
+
+        async def timed(shard, call):
+            began = time.perf_counter()
+            try:
+                result = await call()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._completed(shard, began, exc)
+                return None
+            self._completed(shard, began)
+            return result
+
+        tasks = {asyncio.ensure_future(timed(shard, call)): shard for shard, call in enumerate(calls)}
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+        return self._collect({tasks[task]: task.result() for task in done})
+
+    def gather_threads(self, executor, calls: Sequence[Callable[[], Any]]) -> list:
+        """Thread-pool variant for synchronous callers.
+
+        Calls still running at the deadline cannot be cancelled; they finish
+        in the background and their results are discarded.
+        """
+
+        def timed(shard, call):
+            began = time.perf_counter()
+            try:
+                result = call()
+            except Exception as exc:
+                self._completed(shard, began, exc)
+                return None
+            self._completed(shard, began)
+            return result
+
+        futures = {executor.submit(timed, shard, call): shard for shard, call in enumerate(calls)}
+        done, _ = wait_futures(futures, timeout=self.deadline)
+        return self._collect({futures[future]: future.result() for future in done})
+
+    def stats(self) -> dict:
+        with self._lock:
+            shards = [
+                dict(
+                    {name: value for name, value in entry.items() if name != "seconds"},
+                    avg_ms=round(1000 * entry["seconds"] / entry["completed"], 2) if entry["completed"] else None,
+                )
+                for entry in self.shards
+            ]
+            return {
+                "deadline_ms": round(1000 * self.deadline, 1),
+                "gathers": self.gathers,
+                "partial": self.partial,
+                "empty": self.empty,
+                "shards": shards,
+            }
+
+
+# ---------------------------------------------------------------------------
+# Routing rows from the agent database to the shards
+# ---------------------------------------------------------------------------
+
+SOURCE_SQL = """
+    SELECT c.chunk_id, c.document_id, c.chunk_text, c.embedding::text AS embedding,
+           c.sparse_embedding::text AS sparse_embedding, c.metadata::text AS metadata, c.inserted_at,
+           d.title, d.source_path, d.category
+    FROM kb_chunks c
+    JOIN documents d ON c.document_id = d.document_id
+    WHERE c.chunk_id > %s
+    ORDER BY c.chunk_id
+    LIMIT %s
+"""
+
+
+def write_rows(shard_map: ShardMap, conns: Sequence, rows: Sequence[dict]) -> Dict[int, int]:
+    """Upsert chunk rows (joined with their document) on the owning shards; rows written per shard.
+
+    Embeddings and metadata are passed as text literals, which Postgres casts
+    to the shard's column types.
+    """
+    from psycopg2.extras import execute_values
+
+    written = {}
+    for shard, part in shard_map.route(rows).items():
+        documents = {row["document_id"]: tuple(row[c] for c in DOCUMENT_COLUMNS) for row in part}
+        with conns[shard].cursor() as cur:
+            execute_values(
+                cur,
+                f"INSERT INTO documents ({', '.join(DOCUMENT_COLUMNS)}) VALUES %s "
+                "ON CONFLICT (document_id) DO UPDATE SET title = EXCLUDED.title, "
+                "source_path = EXCLUDED.source_path, category = EXCLUDED.category",
+                list(documents.values()),
+            )
+            execute_values(
+                cur,
+                f"INSERT INTO kb_chunks ({', '.join(CHUNK_COLUMNS)}) VALUES %s "
+                "ON CONFLICT (chunk_id) DO UPDATE SET document_id = EXCLUDED.document_id, "
+                "chunk_text = EXCLUDED.chunk_text, embedding = EXCLUDED.embedding, "
+                "sparse_embedding = EXCLUDED.sparse_embedding, metadata = EXCLUDED.metadata",
+                [tuple(row[c] for c in CHUNK_COLUMNS) for row in part],
+            )
+        conns[shard].commit()
+        written[shard] = len(part)
+    return written
+
+
+def connect_shards(shard_map: ShardMap) -> list:
+    import psycopg2
+
+    return [psycopg2.connect(libpq_dsn(url)) for url in shard_map.urls]
+
+
+def sync(source_dsn: str, shard_map: ShardMap, batch: int = 1000, full: bool = False, overlap: int = 1000) -> dict:
+    """Copy chunks to their shards, keyset-paginated, one commit per batch and shard.
+
+    Each shard keeps the last source chunk_id sync has passed in
+    `kb_shard_sync`, advanced after every batch whether or not the batch had
+    rows for it.  Incremental runs start `overlap` ids before the lowest of
+    these and rewrite that window (upserts are idempotent): chunk_ids are
+    taken when a row is inserted but become visible at commit, so an
+    ingestion transaction still open during the last sync can commit ids
+    below the watermark.  Rows committed more than `overlap` ids behind it
+    are only picked up by `full`, so size the window to the largest
+    ingestion transaction that can overlap a sync, or do not sync while
+    ingesting.  Updated rows need `full`; deleted or re-routed ones `prune`.
+    """
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    start = time.perf_counter()
+    conns = connect_shards(shard_map)
+    source = psycopg2.connect(libpq_dsn(source_dsn))
+    try:
+        last_id = 0
+        if not full:
+            watermarks = []
+            for conn in conns:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT coalesce(max(last_chunk_id), 0) FROM kb_shard_sync")
+                    watermarks.append(cur.fetchone()[0])
+                conn.rollback()
+            last_id = max(min(watermarks) - overlap, 0)
+        since = last_id
+        written = [0] * len(conns)
+        while True:
+            with source.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(SOURCE_SQL, (last_id, batch))
+                rows = cur.fetchall()
+            source.rollback()
+            if not rows:
+                break
+            for shard, count in write_rows(shard_map, conns, rows).items():
+                written[shard] += count
+            last_id = rows[-1]["chunk_id"]
+            for conn in conns:
+                with conn.cursor() as cur:
+                    cur.execute("UPDATE kb_shard_sync SET last_chunk_id = %s, synced_at = now()", (last_id,))
+                conn.commit()
+        return {
+            "since_chunk_id": since,
+            "last_chunk_id": last_id,
+            "written": dict(zip(shard_map.labels, written)),
+            "seconds": round(time.perf_counter() - start, 2),
+        }
+    finally:
+        source.close()
+        for conn in conns:
+            conn.close()
+
+
+def prune(source_dsn: str, shard_map: ShardMap, batch: int = 5000) -> dict:
+    """Delete shard rows that are gone from the source or now belong to another shard."""
+    import psycopg2
+
+    conns = connect_shards(shard_map)
+    source = psycopg2.connect(libpq_dsn(source_dsn))
+    deleted = {}
+    try:
+        for shard, conn in enumerate(conns):
+            removed, last_id = 0, 0
+            while True:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT chunk_id FROM kb_chunks WHERE chunk_id > %s ORDER BY chunk_id LIMIT %s",
+                        (last_id, batch),
+                    )
+                    ids = [r[0] for r in cur.fetchall()]
+                if not ids:
+                    break
+                last_id = ids[-1]
+                with source.cursor() as cur:
+                    cur.execute(
+                        "SELECT c.chunk_id, c.document_id, d.category FROM kb_chunks c "
+                        "JOIN documents d ON c.document_id = d.document_id WHERE c.chunk_id = ANY(%s)",
+                        (ids,),
+                    )
+                    owner = {r[0]: shard_map.shard_for(r[1], r[2]) for r in cur.fetchall()}
+                source.rollback()
+                stale = [chunk_id for chunk_id in ids if owner.get(chunk_id) != shard]
+                if stale:
+                    with conn.cursor() as cur:
+                        cur.execute("DELETE FROM kb_chunks WHERE chunk_id = ANY(%s)", (stale,))
+                        removed += cur.rowcount
+                conn.commit()
+            with conn.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM documents d WHERE NOT EXISTS "
+                    "(SELECT 1 FROM kb_chunks c WHERE c.document_id = d.document_id)"
+                )
+            conn.commit()
+            deleted[shard_map.labels[shard]] = removed
+        return {"deleted": deleted}
+    finally:
+        source.close()
+        for conn in conns:
+            conn.close()
+
+
+def counts(source_dsn: str, shard_map: ShardMap) -> dict:
+    import psycopg2
+
+    def count(dsn):
+        with psycopg2.connect(libpq_dsn(dsn)) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT count(*), count(DISTINCT document_id) FROM kb_chunks")
+                rows, documents = cur.fetchone()
+        return {"rows": rows, "documents": documents}
+
+    shards = {label: count(url) for label, url in zip(shard_map.labels, shard_map.urls)}
+    return {
+        "source": count(source_dsn),
+        "shards": shards,
+        "sharded_rows": sum(entry["rows"] for entry in shards.values()),
+    }
+
+
+def check(source_dsn: str, shard_map: ShardMap, queries: int = 50, k: int = 10, deadline_seconds: float = 0.25) -> dict:
+    """recall@k of the scatter-gather dense search against exact search on the source, plus latency.
+
+    Query vectors are embeddings sampled from the source, so no model is needed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+    import psycopg2
+
+    source = psycopg2.connect(libpq_dsn(source_dsn))
+    conns = connect_shards(shard_map)
+    locks = [threading.Lock() for _ in conns]
+    scatter = ScatterGather(shard_map.labels, deadline_seconds)
+    distance = f"embedding <=> %(q)s::{os.getenv('EMBEDDING_STORAGE', 'vector')}"
+    sql = f"SELECT chunk_id, {distance} AS distance FROM kb_chunks ORDER BY {distance} LIMIT %(k)s"
+
+    def shard_call(shard, q):
+        def call():
+            # a call left running past the deadline still owns the connection
+            if not locks[shard].acquire(timeout=deadline_seconds):
+                raise RuntimeError("still busy with an earlier query")
+            try:
+                with conns[shard].cursor() as cur:
+                    cur.execute(sql, {"q": q, "k": k})
+                    rows = cur.fetchall()
+                conns[shard].rollback()
+            finally:
+                locks[shard].release()
+            return rows
+        return call
+
+    try:
+        with source.cursor() as cur:
+            cur.execute("SELECT embedding::text FROM kb_chunks ORDER BY random() LIMIT %s", (queries,))
+            samples = [r[0] for r in cur.fetchall()]
+            recalls, latencies = [], []
+            with ThreadPoolExecutor(max_workers=len(conns)) as executor:
+                for q in samples:
+                    cur.execute("SET LOCAL enable_indexscan = off")
+                    cur.execute(sql, {"q": q, "k": k})
+                    exact = {r[0] for r in cur.fetchall()}
+                    began = time.perf_counter()
+                    answered = scatter.gather_threads(executor, [shard_call(shard, q) for shard in range(len(conns))])
+                    merged = merge_top_k(answered, k, key=lambda r: r[1])
+                    latencies.append(1000 * (time.perf_counter() - began))
+                    recalls.append(len(exact & {r[0] for r in merged}) / max(len(exact), 1))
+        source.rollback()
+    finally:
+        source.close()
+        for conn in conns:
+            conn.close()
+    return {
+        "queries": len(samples),
+        f"recall@{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+        "scatter": scatter.stats(),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Route kb_chunks to shards and check sharded retrieval")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Source Postgres URL (DATABASE_URL)")
+    parser.add_argument("--shards", default=os.getenv("KB_SHARD_URLS"), help="Comma-separated shard URLs (KB_SHARD_URLS)")
+    parser.add_argument("--strategy", choices=STRATEGIES, default=os.getenv("KB_SHARD_STRATEGY", "hash"))
+    parser.add_argument("--categories", default=os.getenv("KB_SHARD_CATEGORIES", ""), help="KB_SHARD_CATEGORIES")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_sync = sub.add_parser("sync", help="Copy new (or, with --full, all) chunks to their shards")
+    p_sync.add_argument("--full", action="store_true")
+    p_sync.add_argument("--batch", type=int, default=1000)
+    p_sync.add_argument(
+        "--overlap", type=int, default=int(os.getenv("KB_SHARD_SYNC_OVERLAP", "1000")),
+        help="chunk_ids before the watermark copied again (KB_SHARD_SYNC_OVERLAP)",
+    )
+    p_prune = sub.add_parser("prune", help="Delete shard rows deleted or re-routed in the source")
+    p_prune.add_argument("--batch", type=int, default=5000)
+    sub.add_parser("counts", help="Rows and documents per shard")
+    p_check = sub.add_parser("check", help="Sharded dense recall@k and latency against the source")
+    p_check.add_argument("--queries", type=int, default=50)
+    p_check.add_argument("--k", type=int, default=10)
+    p_check.add_argument("--deadline-ms", type=float, default=float(os.getenv("KB_SHARD_DEADLINE_MS", "250")))
+    args = parser.parse_args()
+    if not args.dsn:
+        raise SystemExit("✖ --dsn or DATABASE_URL is required")
+    if not args.shards:
+        raise SystemExit("✖ --shards or KB_SHARD_URLS is required")
+    shard_map = ShardMap(
+        [url.strip() for url in args.shards.split(",") if url.strip()],
+        strategy=args.strategy,
+        categories=parse_categories(args.categories),
+    )
+
+    if args.command == "sync":
+        result = sync(args.dsn, shard_map, args.batch, args.full, args.overlap)
+    elif args.command == "prune":
+        result = prune(args.dsn, shard_map, args.batch)
+    elif args.command == "counts":
+        result = counts(args.dsn, shard_map)
+    else:
+        result = check(args.dsn, shard_map, args.queries, args.k, args.deadline_ms / 1000)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
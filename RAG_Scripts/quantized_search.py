@@ -0,0 +1,95 @@
+"""Dense retrieval over reduced-precision embeddings with exact rescoring.
+
+`kb_chunks.embedding` is stored as `vector` (fp32, 6 KB per 1536-dim chunk)
+or, after `database_AI_agent/migrations/store_embeddings_halfvec.sql`, as
+`halfvec` (fp16, 3 KB).  The first pass walks a smaller HNSW index for many
+candidates:
+
+* `halfvec` - `embedding::halfvec` cosine distance (half the index size)
+* `binary`  - `binary_quantize(embedding)::bit` Hamming distance (1/32)
+* `reduced` - `embedding_reduced`, a PCA or Matryoshka projection to a few
+  hundred dimensions (`dense_projection.py`), queried with the projected
+  query vector
+* `vector`  - the full-precision column itself
+
+and the shortlist is reranked exactly against the stored column (or, with
+`precision="halfvec"`, against fp16 copies).  The expression indexes are
+created by `database_AI_agent/migrations/quantized_embedding_indexes.sql`;
+the expressions below must stay identical to them or the planner will not
+use the indexes.
+"""
+
+STORAGE_TYPES = ("vector", "halfvec")
+FIRST_PASS_TYPES = ("vector", "halfvec", "binary", "reduced")
+
+
+def first_pass_expression(first_pass: str, storage: str = "vector", dim: int = 1536) -> str:
+    """Indexed expression the first pass orders by."""
+    if first_pass == "binary":
+        return f"(binary_quantize(embedding)::bit({dim}))"
+    if first_pass == "reduced":
+        return "embedding_reduced"
+    if first_pass == "halfvec" and storage != "halfvec":
+        return f"(embedding::halfvec({dim}))"
+    return "embedding"
+
+
+def first_pass_order(first_pass: str, storage: str, dim: int, q: str, reduced_dim: int = None, q_reduced: str = None) -> str:
+    expr = first_pass_expression(first_pass, storage, dim)
+    if first_pass == "reduced":
+        return f"{expr} <=> CAST({q_reduced} AS vector({reduced_dim}))"
+    if first_pass == "binary":
+        return f"{expr} <~> binary_quantize(CAST({q} AS {storage}({dim})))"
+    query_type = "halfvec" if first_pass == "halfvec" else storage
+    return f"{expr} <=> CAST({q} AS {query_type}({dim}))"
+
+
+def rescoring_sql(
+    first_pass: str,
+    storage: str = "vector",
+    precision: str = None,
+    dim: int = 1536,
+    table: str = "kb_chunks",
+    columns: str = "c.chunk_id",
+    joins: str = "",
+    q: str = ":q",
+    candidates: str = ":candidates",
+    k: str = ":k",
+    reduced_dim: int = None,
+    q_reduced: str = ":q_reduced",
+    where: str = None,
+) -> str:
+    """Two-phase query: `candidates` rows by the first pass, top `k` by exact distance.
+
+    `q`, `candidates` and `k` are placeholders in the caller's paramstyle
+    (`:q` for SQLAlchemy `text()`, `%(q)s` for psycopg2).  The result has the
+    requested `columns` plus `distance` (cosine distance at `precision`).
+    The `reduced` first pass also needs `reduced_dim` and the projected query
+    `q_reduced`; `where` restricts the first pass (unqualified columns).
+    """
+    if storage not in STORAGE_TYPES or first_pass not in FIRST_PASS_TYPES:
+        raise ValueError(f"unsupported storage/first pass: {storage}/{first_pass}")
+    if first_pass == "reduced" and not reduced_dim:
+        raise ValueError("the reduced first pass needs reduced_dim")
+    precision = precision or storage
+    rescore_column = "c.embedding" if precision == storage else f"c.embedding::{precision}({dim})"
+    return f"""
+        WITH candidates AS (
+            SELECT chunk_id
+            FROM {table}
+            {f"WHERE {where}" if where else ""}
+            ORDER BY {first_pass_order(first_pass, storage, dim, q, reduced_dim, q_reduced)}
+            LIMIT {candidates}
+        )
+        SELECT {columns}, {rescore_column} <=> CAST({q} AS {precision}({dim})) AS distance
+        FROM candidates
+        JOIN {table} c USING (chunk_id)
+        {joins}
+        ORDER BY distance
+        LIMIT {k}
+    """
+
+
+def vector_literal(embedding) -> str:
+    """pgvector text form, castable to vector and halfvec."""
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
@@ -0,0 +1,145 @@
+"""RAG-Search-LAB - routing read-only work to streaming replicas
+
+Each database (agentdb, documentdb, sddb) can list read replicas next to its
+primary.  Endpoints that only read - retrieval, `/metadata`, `/analytics/*`,
+dashboards - take their session from `ReplicaRouter.route()`, which picks a
+healthy replica round-robin; everything else, and every read that must see
+its own writes, stays on the primary.
+
+A replica is healthy while its last lag check succeeded, is no older than
+`stale_after` seconds and measured at most `max_lag` seconds of replay lag.
+Otherwise the read falls back to the primary and the reason is counted.  Lag
+is `now() - pg_last_xact_replay_timestamp()`, except that a replica that has
+replayed everything it received counts as 0 (an idle primary would otherwise
+look like lag).  That shortcut only holds while WAL is coming in: a
+standby without a WAL receiver has nothing left to replay yet falls further
+behind, so it counts as unavailable.  Only the existence of the receiver is
+checked; its `status` column is NULL for roles without `pg_read_all_stats`.
+
+`stats()` reports every replica's lag and, per route, how many sessions and
+queries went to the primary or to each replica.
+"""
+import threading
+import time
+from typing import Dict, Optional, Sequence
+from urllib.parse import urlsplit
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END AS lag_seconds,
+    NOT pg_is_in_recovery()
+        OR EXISTS (SELECT 1 FROM pg_stat_wal_receiver) AS streaming
+"""
+
+
+class ReplicaNotStreaming(Exception):
+    pass
+
+
+def lag_seconds(lag: Optional[float], streaming: bool) -> Optional[float]:
+    """Lag from a `LAG_SQL` row; raises ReplicaNotStreaming when there is no WAL receiver."""
+    if not streaming:
+        raise ReplicaNotStreaming("no WAL receiver running")
+    return lag
+
+
+def replica_urls(spec: Optional[str]) -> list:
+    """Comma-separated URLs (or libpq DSNs without commas) -> list."""
+    return [url.strip() for url in (spec or "").split(",") if url.strip()]
+
+
+def url_label(url: str) -> str:
+    """host:port/database without credentials, from a URL or a libpq keyword DSN."""
+    if "://" in url:
+        parts = urlsplit(url)
+        return f"{parts.hostname or 'localhost'}:{parts.port or 5432}{parts.path}"
+    fields = dict(item.split("=", 1) for item in url.split() if "=" in item)
+    return f"{fields.get('host', 'localhost')}:{fields.get('port', 5432)}/{fields.get('dbname', '')}"
+
+
+class ReplicaRouter:
+    """Replica health and per-route routing counts for one database."""
+
+    def __init__(self, database: str, labels: Sequence[str], max_lag: float = 10.0, stale_after: float = 30.0):
+        self.database = database
+        self.max_lag = max_lag
+        self.stale_after = stale_after
+        self.replicas = [
+            {"target": f"replica{i}", "replica": label, "lag_seconds": None, "checked_at": None, "error": None}
+            for i, label in enumerate(labels)
+        ]
+        self.routes: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.fallbacks = {"lagging": 0, "unavailable": 0}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def record_lag(self, replica: int, lag_seconds: Optional[float], error: Optional[Exception] = None):
+        with self._lock:
+            entry = self.replicas[replica]
+            entry["checked_at"] = time.monotonic()
+            entry["lag_seconds"] = None if lag_seconds is None else float(lag_seconds)
+            entry["error"] = None if error is None else (str(error) or type(error).__name__)
+
+    def _state(self, replica: int) -> str:
+        entry = self.replicas[replica]
+        if entry["error"] is not None or entry["checked_at"] is None or entry["lag_seconds"] is None:
+            return "unavailable"
+        if time.monotonic() - entry["checked_at"] > self.stale_after:
+            return "unavailable"
+        if entry["lag_seconds"] > self.max_lag:
+            return "lagging"
+        return "healthy"
+
+    def route(self, route: str) -> Optional[int]:
+        """Replica index for a read-only session on `route`, or None for the primary."""
+        chosen = None
+        with self._lock:
+            if self.replicas:
+                states = [self._state(i) for i in range(len(self.replicas))]
+                healthy = [i for i, state in enumerate(states) if state == "healthy"]
+                if healthy:
+                    chosen = healthy[self._next % len(healthy)]
+                    self._next += 1
+                else:
+                    self.fallbacks["lagging" if "lagging" in states else "unavailable"] += 1
+            self._count(route, self.target(chosen), "sessions")
+        return chosen
+
+    def target(self, replica: Optional[int]) -> str:
+        return "primary" if replica is None else self.replicas[replica]["target"]
+
+    def _count(self, route: str, target: str, kind: str, n: int = 1):
+        counts = self.routes.setdefault(route, {}).setdefault(target, {"sessions": 0, "queries": 0})
+        counts[kind] += n
+
+    def count_query(self, route: str, target: str, n: int = 1):
+        with self._lock:
+            self._count(route, target, "queries", n)
+
+    def stats(self) -> dict:
+        with self._lock:
+            replicas = []
+            for i, entry in enumerate(self.replicas):
+                checked = entry["checked_at"]
+                replicas.append(dict(
+                    target=entry["target"],
+                    replica=entry["replica"],
+                    state=self._state(i),
+                    lag_seconds=None if entry["lag_seconds"] is None else round(entry["lag_seconds"], 3),
+                    checked_seconds_ago=None if checked is None else round(time.monotonic() - checked, 1),
+                    error=entry["error"],
+                ))
+            return {
+                "database": self.database,
+                "max_lag_seconds": self.max_lag,
+                "replicas": replicas,
+                "fallbacks": dict(self.fallbacks),
+                "routes": {route: {t: dict(c) for t, c in targets.items()} for route, targets in self.routes.items()},
+            }
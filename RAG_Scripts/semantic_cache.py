@@ -0,0 +1,162 @@
+"""In-process semantic answer cache for chat queries.
+
+Answers are stored under the query's dense embedding.  A new query reuses an
+answer when
+
+* its cosine similarity to the stored query is at least `threshold`,
+* retrieval returned the same chunk set (`chunk_key`), so the answer is
+  grounded in the same context and keeps the same citations,
+* the entry is younger than `ttl` seconds, and
+* the knowledge base has not changed since the entry was written
+  (`set_kb_version()`; any change drops every entry).  While the version
+  cannot be read (`set_kb_version_unknown()`) nothing is stored.
+
+The index is a fixed-size float32 matrix searched by brute force, which is
+well under a millisecond for a few thousand 1536-dim entries.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    chunk_key: Hashable
+    citations: List[Any]
+    cost_seconds: float  # what producing the answer took; saved on every hit
+    expires_at: float
+    similarity: float = 1.0
+
+
+class SemanticCache:
+    def __init__(self, maxsize: int = 2000, ttl: float = 3600.0, threshold: float = 0.95, dim: int = 1536):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.dim = dim
+        self._vectors = np.zeros((max(maxsize, 0), dim), dtype=np.float32)
+        self._entries: List[Optional[CachedAnswer]] = [None] * max(maxsize, 0)
+        # slot -> None, least recently used first
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free = list(range(max(maxsize, 0) - 1, -1, -1))
+        self.kb_version = None
+        self.kb_version_known = False
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def _normalize(self, embedding: Sequence[float]) -> Optional[np.ndarray]:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        if vec.shape != (self.dim,) or norm == 0.0:
+            return None
+        return vec / norm
+
+    def _drop(self, slot: int):
+        self._entries[slot] = None
+        self._lru.pop(slot, None)
+        self._free.append(slot)
+
+    def set_kb_version(self, version):
+        """Record the current knowledge-base version; a change clears the cache."""
+        if version != self.kb_version:
+            if self.kb_version is not None:
+                self.clear()
+            self.kb_version = version
+        self.kb_version_known = True
+
+    def set_kb_version_unknown(self):
+        """The version could not be read: drop every entry and store none until it can."""
+        self.clear()
+        self.kb_version = None
+        self.kb_version_known = False
+
+    def lookup(self, embedding: Sequence[float], chunk_key: Hashable) -> Optional[CachedAnswer]:
+        """Best live entry above the threshold with the same chunk set, if any."""
+        if not self.enabled or not self._lru:
+            self.misses += 1
+            return None
+        vec = self._normalize(embedding)
+        if vec is None:
+            self.misses += 1
+            return None
+        slots = np.fromiter(self._lru, dtype=np.int64, count=len(self._lru))
+        sims = self._vectors[slots] @ vec
+        now = time.monotonic()
+        for i in np.argsort(-sims):
+            similarity = float(sims[i])
+            if similarity < self.threshold:
+                break
+            slot = int(slots[i])
+            entry = self._entries[slot]
+            if entry.expires_at < now:
+                self._drop(slot)
+                continue
+            if entry.chunk_key != chunk_key:
+                continue
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            self.seconds_saved += entry.cost_seconds
+            entry.similarity = similarity
+            return entry
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        embedding: Sequence[float],
+        query: str,
+        answer: str,
+        chunk_key: Hashable,
+        citations: List[Any],
+        cost_seconds: float,
+        kb_version=None,
+    ):
+        """Store an answer; ignored if the KB changed since `kb_version` was read, or is unknown."""
+        if not self.enabled or not self.kb_version_known or kb_version != self.kb_version:
+            return
+        vec = self._normalize(embedding)
+        if vec is None:
+            return
+        if not self._free:
+            self._drop(next(iter(self._lru)))
+        slot = self._free.pop()
+        self._vectors[slot] = vec
+        self._entries[slot] = CachedAnswer(
+            query=query,
+            answer=answer,
+            chunk_key=chunk_key,
+            citations=list(citations),
+            cost_seconds=cost_seconds,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._lru[slot] = None
+
+    def clear(self):
+        for slot in list(self._lru):
+            self._drop(slot)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._lru),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+            "kb_version": self.kb_version,
+            "kb_version_known": self.kb_version_known,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "seconds_saved": round(self.seconds_saved, 3),
+        }
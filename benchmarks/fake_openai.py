@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""RAG-Search-LAB - Local OpenAI stand-in for load tests
+
+Serves the subset of the OpenAI REST API used by the backend and the MCP
+server (`/v1/embeddings`, `/v1/completions`, `/v1/chat/completions`, with
+and without `stream`) with configurable latency and token rate, so load
+tests exercise our own code paths without paying for, or being throttled
+by, the real API.
+
+Usage
+-----
+```bash
+python benchmarks/fake_openai.py --port 8900 --embed-latency-ms 30 \
+       --ttft-ms 300 --tokens-per-sec 40 --completion-tokens 120
+
+# point the apps at it
+export OPENAI_BASE_URL=http://localhost:8900/v1 OPENAI_API_BASE=http://localhost:8900/v1
+export OPENAI_API_KEY=sk-fake
+```
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import List
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="fake-openai")
+
+CONFIG = {
+    "dim": 1536,
+    "embed_latency_ms": 30.0,
+    "ttft_ms": 300.0,
+    "tokens_per_sec": 40.0,
+    "completion_tokens": 120,
+}
+
+WORDS = (
+    "restart the service check the logs verify the configuration and confirm "
+    "the ticket is resolved escalate to tier two if the issue persists"
+).split()
+
+
+def _embedding(item) -> List[float]:
+    # LangChain sends pre-tokenized inputs (lists of ints) as well as strings
+    key = item if isinstance(item, str) else json.dumps(item)
+    seed = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+    vec = np.random.default_rng(seed).standard_normal(CONFIG["dim"]).astype(np.float32)
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+def _tokens(n: int) -> List[str]:
+    return [WORDS[i % len(WORDS)] for i in range(n)]
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input")
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    await asyncio.sleep(CONFIG["embed_latency_ms"] / 1000)
+    data = [
+        {"object": "embedding", "index": i, "embedding": _embedding(item)}
+        for i, item in enumerate(inputs)
+    ]
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-ada-002"),
+        "usage": {"prompt_tokens": 8 * len(inputs), "total_tokens": 8 * len(inputs)},
+    }
+
+
+async def _generate(n_tokens: int):
+    await asyncio.sleep(CONFIG["ttft_ms"] / 1000)
+    interval = 1.0 / CONFIG["tokens_per_sec"] if CONFIG["tokens_per_sec"] > 0 else 0
+    for i, token in enumerate(_tokens(n_tokens)):
+        if i and interval:
+            await asyncio.sleep(interval)
+        yield token + " "
+
+
+def _sse(payload: dict) -> bytes:
+    return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+
+@app.post("/v1/completions")
+async def completions(request: Request):
+    body = await request.json()
+    n_tokens = min(int(body.get("max_tokens") or CONFIG["completion_tokens"]), CONFIG["completion_tokens"])
+    completion_id = f"cmpl-{uuid.uuid4().hex}"
+    model = body.get("model", "gpt-3.5-turbo-instruct")
+    if body.get("stream"):
+        async def stream():
+            async for token in _generate(n_tokens):
+                yield _sse({
+                    "id": completion_id, "object": "text_completion", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"text": token, "index": 0, "logprobs": None, "finish_reason": None}],
+                })
+            yield b"data: [DONE]\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    text = "".join([t async for t in _generate(n_tokens)])
+    return {
+        "id": completion_id, "object": "text_completion", "created": int(time.time()), "model": model,
+        "choices": [{"text": text, "index": 0, "logprobs": None, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": n_tokens, "total_tokens": 100 + n_tokens},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    n_tokens = min(int(body.get("max_tokens") or CONFIG["completion_tokens"]), CONFIG["completion_tokens"])
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = body.get("model", "gpt-3.5-turbo")
+    if body.get("stream"):
+        async def stream():
+            async for token in _generate(n_tokens):
+                yield _sse({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                })
+            yield b"data: [DONE]\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    text = "".join([t async for t in _generate(n_tokens)])
+    return {
+        "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": n_tokens, "total_tokens": 100 + n_tokens},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI stand-in with configurable latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--dim", type=int, default=CONFIG["dim"], help="Embedding dimension")
+    parser.add_argument("--embed-latency-ms", type=float, default=CONFIG["embed_latency_ms"])
+    parser.add_argument("--ttft-ms", type=float, default=CONFIG["ttft_ms"], help="Delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=CONFIG["tokens_per_sec"])
+    parser.add_argument("--completion-tokens", type=int, default=CONFIG["completion_tokens"])
+    args = parser.parse_args()
+    CONFIG.update(
+        dim=args.dim,
+        embed_latency_ms=args.embed_latency_ms,
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
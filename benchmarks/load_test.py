@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""RAG-Search-LAB - Load generator for /chat/stream and the MCP /search tool
+
+Drives the FastAPI backend's `POST /chat/stream` and/or the MCP server's
+`GET /search` either closed-loop (`--concurrency` workers issuing requests
+back to back) or open-loop (`--rate` Poisson arrivals per second, bounded
+by `--concurrency` in-flight requests).  Run the apps against
+`fake_openai.py` and a local Postgres to measure our own overhead.
+
+While the test runs, `pg_stat_activity` is sampled for each `--pg` URI to
+show how close the connection pools get to saturation.
+
+Reported per target: time-to-first-byte and full-response latency
+percentiles, throughput, error rate and error breakdown, plus peak and
+mean connections per database vs `max_connections`.
+
+Usage
+-----
+```bash
+python benchmarks/load_test.py --backend http://localhost:8000 \
+       --mcp http://localhost:8001 --duration 60 --concurrency 32 \
+       --pg postgresql://localhost/agentdb --output load_report.json
+```
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import psycopg2
+
+DEFAULT_QUERIES = [
+    "How do I reset a user's password?",
+    "reset my password",
+    "PostgreSQL backup failed with error",
+    "why is the VPN connection dropping",
+    "explain the difference between RMAN full and incremental backups",
+    "open tickets for network incidents",
+    "how to restart the application service",
+    "Oracle listener not starting after patch",
+    "compare pg_dump and pg_basebackup",
+    "disk full on database server, what to do",
+]
+
+
+@dataclass
+class Sample:
+    target: str
+    ok: bool
+    ttfb: Optional[float]
+    total: float
+    error: Optional[str] = None
+    queue_wait: Optional[float] = None  # open loop: arrival until a slot was free
+
+
+@dataclass
+class PoolSampler:
+    """Poll pg_stat_activity in a background thread."""
+
+    uris: List[str]
+    interval: float = 0.5
+    samples: Dict[str, List[int]] = field(default_factory=dict)
+    max_connections: Dict[str, int] = field(default_factory=dict)
+    _stop: threading.Event = field(default_factory=threading.Event)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        conns = {}
+        for uri in self.uris:
+            conn = psycopg2.connect(uri)
+            conn.autocommit = True
+            conns[uri] = conn
+            with conn.cursor() as cur:
+                cur.execute("SHOW max_connections")
+                self.max_connections[uri] = int(cur.fetchone()[0])
+        try:
+            while not self._stop.is_set():
+                for uri, conn in conns.items():
+                    with conn.cursor() as cur:
+                        cur.execute(
+                            "SELECT count(*) FROM pg_stat_activity "
+                            "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                        )
+                        self.samples.setdefault(uri, []).append(cur.fetchone()[0])
+                self._stop.wait(self.interval)
+        finally:
+            for conn in conns.values():
+                conn.close()
+
+    def report(self) -> Dict[str, dict]:
+        out = {}
+        for uri, values in self.samples.items():
+            limit = self.max_connections.get(uri, 0)
+            peak = max(values) if values else 0
+            out[uri.rsplit("@", 1)[-1]] = {
+                "peak_connections": peak,
+                "mean_connections": round(statistics.fmean(values), 1) if values else 0,
+                "max_connections": limit,
+                "peak_saturation": round(peak / limit, 3) if limit else None,
+            }
+        return out
+
+
+async def chat_stream(client: httpx.AsyncClient, base: str, query: str, start: Optional[float] = None) -> Sample:
+    """`start` (perf_counter) is the scheduled arrival; latencies are measured from it."""
+    start = time.perf_counter() if start is None else start
+    ttfb = None
+    try:
+        async with client.stream("POST", f"{base}/chat/stream", json={"query": query}) as resp:
+            async for chunk in resp.aiter_bytes():
+                if ttfb is None and chunk:
+                    ttfb = time.perf_counter() - start
+            ok = resp.status_code < 400
+            error = None if ok else f"HTTP {resp.status_code}"
+    except httpx.HTTPError as exc:
+        ok, error = False, type(exc).__name__
+    return Sample("chat_stream", ok, ttfb, time.perf_counter() - start, error)
+
+
+async def mcp_search(client: httpx.AsyncClient, base: str, query: str, start: Optional[float] = None) -> Sample:
+    start = time.perf_counter() if start is None else start
+    ttfb = None
+    try:
+        async with client.stream("GET", f"{base}/search", params={"query": query}) as resp:
+            async for chunk in resp.aiter_bytes():
+                if ttfb is None and chunk:
+                    ttfb = time.perf_counter() - start
+            ok = resp.status_code < 400
+            error = None if ok else f"HTTP {resp.status_code}"
+    except httpx.HTTPError as exc:
+        ok, error = False, type(exc).__name__
+    return Sample("mcp_search", ok, ttfb, time.perf_counter() - start, error)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50_ms": 0.0, "p90_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    ms = sorted(v * 1000 for v in values)
+    q = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {"p50_ms": round(q[49], 1), "p90_ms": round(q[89], 1), "p95_ms": round(q[94], 1), "p99_ms": round(q[98], 1)}
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, dict]:
+    report = {}
+    for target in sorted({s.target for s in samples}):
+        group = [s for s in samples if s.target == target]
+        ok = [s for s in group if s.ok]
+        report[target] = {
+            "requests": len(group),
+            "errors": len(group) - len(ok),
+            "error_rate": round((len(group) - len(ok)) / len(group), 4),
+            "error_kinds": dict(Counter(s.error for s in group if s.error)),
+            "throughput_rps": round(len(ok) / elapsed, 2),
+            "ttfb": percentiles([s.ttfb for s in ok if s.ttfb is not None]),
+            "latency": percentiles([s.total for s in ok]),
+        }
+        waits = [s.queue_wait for s in group if s.queue_wait is not None]
+        if waits:
+            report[target]["queue_wait"] = percentiles(waits)
+    return report
+
+
+async def run_load(args, queries: List[str]) -> List[Sample]:
+    calls = []
+    if args.backend:
+        calls.append(lambda c, q, start=None: chat_stream(c, args.backend.rstrip("/"), q, start))
+    if args.mcp:
+        calls.append(lambda c, q, start=None: mcp_search(c, args.mcp.rstrip("/"), q, start))
+    if not calls:
+        raise SystemExit("✖ Provide --backend and/or --mcp")
+
+    samples: List[Sample] = []
+    deadline = time.perf_counter() + args.duration
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    rng = random.Random(args.seed)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        if args.rate > 0:
+            # Open loop: arrivals do not wait for earlier responses.  Latency
+            # counts from the scheduled arrival, so time queued for a free
+            # slot is included (no coordinated omission) and also reported.
+            in_flight = asyncio.Semaphore(args.concurrency)
+            tasks = set()
+
+            async def one(arrival: float):
+                async with in_flight:
+                    queue_wait = time.perf_counter() - arrival
+                    sample = await rng.choice(calls)(client, rng.choice(queries), arrival)
+                sample.queue_wait = queue_wait
+                samples.append(sample)
+
+            next_arrival = time.perf_counter()
+            while next_arrival < deadline:
+                task = asyncio.create_task(one(next_arrival))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                next_arrival += rng.expovariate(args.rate)
+                await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            if tasks:
+                await asyncio.gather(*tasks)
+        else:
+            async def worker(i: int):
+                call = calls[i % len(calls)]
+                while time.perf_counter() < deadline:
+                    samples.append(await call(client, rng.choice(queries)))
+
+            await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    return samples
+
+
+def print_report(report: dict):
+    print(f"{'target':<12} {'req':>6} {'err%':>6} {'rps':>7} {'ttfb p50':>9} {'ttfb p95':>9} {'lat p50':>9} {'lat p95':>9} {'lat p99':>9}")
+    for target, r in report["targets"].items():
+        print(
+            f"{target:<12} {r['requests']:>6} {r['error_rate'] * 100:>5.1f}% {r['throughput_rps']:>7.2f} "
+            f"{r['ttfb']['p50_ms']:>9.1f} {r['ttfb']['p95_ms']:>9.1f} "
+            f"{r['latency']['p50_ms']:>9.1f} {r['latency']['p95_ms']:>9.1f} {r['latency']['p99_ms']:>9.1f}"
+        )
+    for target, r in report["targets"].items():
+        if "queue_wait" in r:
+            print(f"{target}: queue wait p50 {r['queue_wait']['p50_ms']:.1f} ms, p99 {r['queue_wait']['p99_ms']:.1f} ms")
+    for db, r in report.get("db_pools", {}).items():
+        print(f"db {db}: peak {r['peak_connections']}/{r['max_connections']} connections, mean {r['mean_connections']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /chat/stream and MCP /search")
+    parser.add_argument("--backend", help="FastAPI backend base URL, e.g. http://localhost:8000")
+    parser.add_argument("--mcp", help="MCP server base URL, e.g. http://localhost:8001")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to generate load")
+    parser.add_argument("--concurrency", type=int, default=16, help="Workers (closed loop) or max in-flight (open loop)")
+    parser.add_argument("--rate", type=float, default=0, help="Open-loop arrivals per second (0 = closed loop)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--queries-file", help="One query per line (defaults to built-in service desk questions)")
+    parser.add_argument("--pg", action="append", default=[], help="Postgres URI to sample pg_stat_activity on (repeatable)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries_file:
+        queries = [l.strip() for l in Path(args.queries_file).read_text().splitlines() if l.strip()]
+
+    sampler = PoolSampler(args.pg) if args.pg else None
+    if sampler:
+        sampler.start()
+    start = time.perf_counter()
+    samples = asyncio.run(run_load(args, queries))
+    elapsed = time.perf_counter() - start
+    if sampler:
+        sampler.stop()
+
+    report = {
+        "duration_s": round(elapsed, 1),
+        "concurrency": args.concurrency,
+        "rate": args.rate or "closed-loop",
+        "targets": summarize(samples, elapsed),
+        "db_pools": sampler.report() if sampler else {},
+    }
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"✓ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,722 @@
+#!/usr/bin/env python3
+"""RAG-Search-LAB - Offline retrieval benchmark
+
+Load a synthetic (or fixture) corpus into a local Postgres with pgvector,
+compute exact ground truth with NumPy and sweep index / search parameters:
+
+* dense ANN: HNSW `ef_search`, IVFFlat `probes`, DiskANN (pgvectorscale)
+  `query_search_list_size`
+* sparse search: query term pruning (keep the N heaviest terms)
+* hybrid fusion: dense/sparse weights, as used by `adjust_weights`
+* the backend's in-process dense replica (`RAG_Scripts/dense_replica.py`):
+  IVF `nprobe`, with and without hydrating the hits from Postgres
+* quantized first passes (`RAG_Scripts/quantized_search.py`): halfvec and
+  binary HNSW indexes, shortlist size and fp32/fp16 rescoring, with the
+  index size and the per-row storage of each representation
+* reduced-dimension first passes (`RAG_Scripts/dense_projection.py`): PCA or
+  Matryoshka projection per target dimension, reranked at full dimension
+* facet-filtered search (`RAG_Scripts/facet_filters.py`): pre-filtered exact
+  scan vs iterative ANN scan for filters matching 50% down to 0.1% of rows
+
+For every configuration it reports recall@k, p50/p95/p99 latency and QPS,
+as a table on stdout and as JSON (`--output`).  Embeddings come from a
+deterministic hashing stub, so no network access or model download is
+needed and results are reproducible run to run.
+
+Usage
+-----
+```bash
+createdb ragbench && psql -d ragbench -c 'CREATE EXTENSION vector'
+python benchmarks/retrieval_bench.py --db postgresql://localhost/ragbench \
+       --docs 20000 --queries 200 --k 10 --ef-search 10,40,100,200 \
+       --output bench_retrieval.json
+```
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+from pgvector.psycopg2 import register_vector
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT / "RAG_Scripts"))
+from dense_replica import DenseReplica  # noqa: E402
+from quantized_search import first_pass_expression, rescoring_sql  # noqa: E402
+from dense_projection import build as build_projection  # noqa: E402
+from facet_filters import PLANS, choose_plan, count_sql, filter_clause, filtered_search_sql  # noqa: E402
+SPARSE_VOCAB = 30522  # BERT/SPLADE vocabulary size, matches create_emb_sparse
+BENCH_TABLE = "bench_kb_chunks"
+BENCH_DOCUMENTS = "bench_documents"
+# Facet value -> share of chunks carrying it (the rest get "other")
+FILTER_SHARES = {"s50": 0.5, "s10": 0.1, "s1": 0.01, "s0.1": 0.001}
+
+########################################
+# Deterministic embedding stubs
+########################################
+
+
+class StubEmbedder:
+    """Hash every token to a fixed pseudo-random vector and sum them.
+
+    Texts sharing words get similar dense vectors, which is enough structure
+    for ANN recall to be meaningful, and the sparse side is a log-scaled
+    term-frequency vector over a hashed vocabulary.
+    """
+
+    def __init__(self, dim: int = 1536, vocab: int = SPARSE_VOCAB):
+        self.dim = dim
+        self.vocab = vocab
+        self._token_vectors: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def _seed(token: str) -> int:
+        return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vec = self._token_vectors.get(token)
+        if vec is None:
+            vec = np.random.default_rng(self._seed(token)).standard_normal(self.dim).astype(np.float32)
+            self._token_vectors[token] = vec
+        return vec
+
+    def dense(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                out[i] += self._token_vector(token)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+    def sparse(self, text: str) -> Dict[int, float]:
+        weights: Dict[int, float] = {}
+        for token in text.lower().split():
+            idx = self._seed(token) % self.vocab
+            weights[idx] = weights.get(idx, 0.0) + 1.0
+        return {i: float(np.log1p(w)) for i, w in weights.items()}
+
+
+def prune_sparse(weights: Dict[int, float], top_n: int) -> Dict[int, float]:
+    if top_n <= 0 or len(weights) <= top_n:
+        return weights
+    return dict(sorted(weights.items(), key=lambda kv: -kv[1])[:top_n])
+
+
+def sparsevec_literal(weights: Dict[int, float], vocab: int = SPARSE_VOCAB) -> str:
+    # pgvector sparsevec indices are 1-based
+    pairs = ",".join(f"{i + 1}:{v:.6f}" for i, v in sorted(weights.items()))
+    return f"{{{pairs}}}/{vocab}"
+
+
+########################################
+# Corpus generation
+########################################
+
+
+def synthetic_corpus(n_docs: int, n_queries: int, seed: int = 42) -> Tuple[List[str], List[str]]:
+    """Topic-clustered documents and held-out queries drawn from the same topics."""
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(5000)]
+    n_topics = max(8, n_docs // 250)
+    topics = [rng.choice(len(vocab), size=60, replace=False) for _ in range(n_topics)]
+
+    def sample(length: int) -> str:
+        topic = topics[rng.integers(n_topics)]
+        words = rng.choice(topic, size=int(length * 0.8))
+        noise = rng.integers(len(vocab), size=length - len(words))
+        return " ".join(vocab[i] for i in np.concatenate([words, noise]))
+
+    docs = [sample(int(rng.integers(80, 200))) for _ in range(n_docs)]
+    queries = [sample(int(rng.integers(5, 15))) for _ in range(n_queries)]
+    return docs, queries
+
+
+def fixture_corpus(n_queries: int, seed: int = 42) -> Tuple[List[str], List[str]]:
+    """Chunk the markdown SOPs shipped in database_documents/ (1000 chars)."""
+    docs: List[str] = []
+    for path in sorted((REPO_ROOT / "database_documents").glob("*.md")):
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        docs.extend(text[i : i + 1000] for i in range(0, len(text), 1000))
+    rng = np.random.default_rng(seed)
+    queries = []
+    for idx in rng.integers(len(docs), size=n_queries):
+        words = docs[idx].split()
+        start = int(rng.integers(max(1, len(words) - 12)))
+        queries.append(" ".join(words[start : start + 12]))
+    return docs, queries
+
+
+########################################
+# Ground truth
+########################################
+
+
+def exact_dense_topk(doc_vecs: np.ndarray, query_vecs: np.ndarray, k: int) -> np.ndarray:
+    scores = query_vecs @ doc_vecs.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def exact_sparse_scores(doc_sparse: List[Dict[int, float]], query_sparse: List[Dict[int, float]]) -> np.ndarray:
+    """Inner product of every query with every document via an inverted index."""
+    postings: Dict[int, Tuple[List[int], List[float]]] = {}
+    for doc_id, weights in enumerate(doc_sparse):
+        for term, w in weights.items():
+            ids, ws = postings.setdefault(term, ([], []))
+            ids.append(doc_id)
+            ws.append(w)
+    arrays = {t: (np.asarray(ids), np.asarray(ws, dtype=np.float32)) for t, (ids, ws) in postings.items()}
+    scores = np.zeros((len(query_sparse), len(doc_sparse)), dtype=np.float32)
+    for qi, weights in enumerate(query_sparse):
+        for term, qw in weights.items():
+            if term in arrays:
+                ids, ws = arrays[term]
+                scores[qi, ids] += qw * ws
+    return scores
+
+
+def fused_scores(dense_sim, sparse_ip, dense_weight: float, sparse_scale: float):
+    """Weighted sum of cosine similarity and scaled sparse inner product.
+
+    `sparse_scale` is a corpus-wide constant so exact and approximate
+    fusion rank candidates with exactly the same scoring function.
+    """
+    return dense_weight * dense_sim + (1 - dense_weight) * sparse_ip / sparse_scale
+
+
+def exact_fused_topk(dense_scores, sparse_scores, dense_weight: float, sparse_scale: float, k: int) -> np.ndarray:
+    fused = fused_scores(dense_scores, sparse_scores, dense_weight, sparse_scale)
+    return np.argpartition(-fused, k, axis=1)[:, :k]
+
+
+def recall_at_k(retrieved: List[List[int]], truth: np.ndarray, k: int) -> float:
+    hits = [len(set(r[:k]) & set(t[:k].tolist())) / k for r, t in zip(retrieved, truth)]
+    return float(np.mean(hits))
+
+
+########################################
+# Database helpers
+########################################
+
+
+def load_corpus(conn, doc_vecs: np.ndarray, doc_sparse: List[Dict[int, float]], dim: int):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cur.execute(
+            f"""
+            CREATE TABLE {BENCH_TABLE} (
+                chunk_id         BIGINT PRIMARY KEY,
+                embedding        VECTOR({dim}) NOT NULL,
+                sparse_embedding SPARSEVEC({SPARSE_VOCAB}) NOT NULL,
+                inserted_at      TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """
+        )
+        batch = 500
+        for start in range(0, len(doc_vecs), batch):
+            rows = [
+                (i, doc_vecs[i], sparsevec_literal(doc_sparse[i]))
+                for i in range(start, min(start + batch, len(doc_vecs)))
+            ]
+            cur.executemany(
+                f"INSERT INTO {BENCH_TABLE} (chunk_id, embedding, sparse_embedding) "
+                f"VALUES (%s, %s, %s::sparsevec)",
+                rows,
+            )
+        cur.execute(f"ANALYZE {BENCH_TABLE}")
+    conn.commit()
+
+
+def build_index(conn, kind: str, params: Dict[str, int]) -> float:
+    """(Re)create the dense index and return the build time in seconds."""
+    with conn.cursor() as cur:
+        cur.execute(f"DROP INDEX IF EXISTS {BENCH_TABLE}_dense_idx")
+        start = time.perf_counter()
+        if kind == "hnsw":
+            cur.execute(
+                f"CREATE INDEX {BENCH_TABLE}_dense_idx ON {BENCH_TABLE} "
+                f"USING hnsw (embedding vector_cosine_ops) "
+                f"WITH (m = {params['m']}, ef_construction = {params['ef_construction']})"
+            )
+        elif kind == "ivfflat":
+            cur.execute(
+                f"CREATE INDEX {BENCH_TABLE}_dense_idx ON {BENCH_TABLE} "
+                f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {params['lists']})"
+            )
+        elif kind == "diskann":
+            cur.execute(
+                f"CREATE INDEX {BENCH_TABLE}_dense_idx ON {BENCH_TABLE} "
+                f"USING diskann (embedding vector_cosine_ops)"
+            )
+        elif kind != "exact":
+            raise ValueError(kind)
+        elapsed = time.perf_counter() - start
+    conn.commit()
+    return elapsed
+
+
+def build_sparse_index(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            f"CREATE INDEX IF NOT EXISTS {BENCH_TABLE}_sparse_idx ON {BENCH_TABLE} "
+            f"USING hnsw (sparse_embedding sparsevec_ip_ops)"
+        )
+    conn.commit()
+
+
+def build_quantized_index(conn, first_pass: str, dim: int, params: Dict[str, int]) -> Tuple[float, float]:
+    """Create the expression index used by a quantized first pass; (build s, size MB)."""
+    opclass = "bit_hamming_ops" if first_pass == "binary" else "halfvec_cosine_ops"
+    name = f"{BENCH_TABLE}_{first_pass}_idx"
+    with conn.cursor() as cur:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+        start = time.perf_counter()
+        cur.execute(
+            f"CREATE INDEX {name} ON {BENCH_TABLE} "
+            f"USING hnsw ({first_pass_expression(first_pass, 'vector', dim)} {opclass}) "
+            f"WITH (m = {params['m']}, ef_construction = {params['ef_construction']})"
+        )
+        elapsed = time.perf_counter() - start
+    conn.commit()
+    return elapsed, index_size_mb(conn, name)
+
+
+def load_projection_column(conn, projection, params: Dict[str, int]) -> Tuple[float, float]:
+    """Fill `embedding_reduced` with `projection` and index it; (build s, size MB)."""
+    name = f"{BENCH_TABLE}_reduced_idx"
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE {BENCH_TABLE} DROP COLUMN IF EXISTS embedding_reduced")
+        cur.execute(f"ALTER TABLE {BENCH_TABLE} ADD COLUMN embedding_reduced VECTOR({projection.dim})")
+        cur.execute(f"SELECT chunk_id, embedding FROM {BENCH_TABLE} ORDER BY chunk_id")
+        rows = cur.fetchall()
+        reduced = projection.project(np.stack([r[1] for r in rows]))
+        execute_values(
+            cur,
+            f"UPDATE {BENCH_TABLE} t SET embedding_reduced = v.e::vector({projection.dim}) "
+            f"FROM (VALUES %s) AS v(chunk_id, e) WHERE t.chunk_id = v.chunk_id",
+            [(r[0], vec) for r, vec in zip(rows, reduced)],
+            page_size=1000,
+        )
+        start = time.perf_counter()
+        cur.execute(
+            f"CREATE INDEX {name} ON {BENCH_TABLE} USING hnsw (embedding_reduced vector_cosine_ops) "
+            f"WITH (m = {params['m']}, ef_construction = {params['ef_construction']})"
+        )
+        elapsed = time.perf_counter() - start
+    conn.commit()
+    return elapsed, index_size_mb(conn, name)
+
+
+def load_facets(conn, n_docs: int, seed: int) -> np.ndarray:
+    """Give every chunk a document with a category and the same value as metadata `team`."""
+    rng = np.random.default_rng(seed)
+    names = list(FILTER_SHARES) + ["other"]
+    shares = list(FILTER_SHARES.values())
+    values = rng.choice(names, size=n_docs, p=shares + [1 - sum(shares)])
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {BENCH_DOCUMENTS}")
+        cur.execute(
+            f"CREATE TABLE {BENCH_DOCUMENTS} (document_id BIGINT PRIMARY KEY, title TEXT NOT NULL, category TEXT)"
+        )
+        execute_values(
+            cur,
+            f"INSERT INTO {BENCH_DOCUMENTS} (document_id, title, category) VALUES %s",
+            [(i, f"doc {i}", str(v)) for i, v in enumerate(values)],
+            page_size=1000,
+        )
+        cur.execute(f"CREATE INDEX ON {BENCH_DOCUMENTS} (category)")
+        cur.execute(f"ALTER TABLE {BENCH_TABLE} ADD COLUMN IF NOT EXISTS document_id BIGINT")
+        cur.execute(f"ALTER TABLE {BENCH_TABLE} ADD COLUMN IF NOT EXISTS chunk_text TEXT")
+        cur.execute(f"ALTER TABLE {BENCH_TABLE} ADD COLUMN IF NOT EXISTS metadata JSONB")
+        cur.execute(
+            f"UPDATE {BENCH_TABLE} SET document_id = chunk_id, chunk_text = '', "
+            f"metadata = jsonb_build_object('team', d.category) FROM {BENCH_DOCUMENTS} d "
+            f"WHERE d.document_id = {BENCH_TABLE}.chunk_id"
+        )
+        cur.execute(f"CREATE INDEX ON {BENCH_TABLE} USING gin (metadata)")
+        cur.execute(f"ANALYZE {BENCH_TABLE}")
+        cur.execute(f"ANALYZE {BENCH_DOCUMENTS}")
+    conn.commit()
+    return values
+
+
+def pyformat(sql: str) -> str:
+    """`:name` placeholders (SQLAlchemy) -> `%(name)s` (psycopg2)."""
+    return re.sub(r"(?<!:):(\w+)", r"%(\1)s", sql)
+
+
+def index_size_mb(conn, name: str) -> float:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_relation_size(%s::regclass)", (name,))
+        return round(cur.fetchone()[0] / 2**20, 2)
+
+
+def storage_bytes(conn, dim: int) -> Dict[str, float]:
+    """Average on-disk size of one embedding in each representation."""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT avg(pg_column_size(embedding)),
+                   avg(pg_column_size(embedding::halfvec({dim}))),
+                   avg(pg_column_size(binary_quantize(embedding)::bit({dim})))
+            FROM {BENCH_TABLE}
+            """
+        )
+        row = cur.fetchone()
+    return dict(zip(("vector", "halfvec", "binary"), (round(float(v), 1) for v in row)))
+
+
+def has_extension(conn, name: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = %s", (name,))
+        return cur.fetchone() is not None
+
+
+def timed_queries(conn, sql: str, params: List[tuple], settings: Dict[str, object]):
+    """Run one query per parameter tuple; return (ids per query, latencies)."""
+    ids, latencies = [], []
+    with conn.cursor() as cur:
+        for name, value in settings.items():
+            cur.execute(f"SET {name} = {value}")
+        for p in params:
+            start = time.perf_counter()
+            cur.execute(sql, p)
+            rows = cur.fetchall()
+            latencies.append(time.perf_counter() - start)
+            ids.append([r[0] for r in rows])
+        for name in settings:
+            cur.execute(f"RESET {name}")
+    return ids, latencies
+
+
+def summarize(name: str, params: dict, recall: float, latencies: List[float], k: int) -> dict:
+    ms = sorted(l * 1000 for l in latencies)
+    q = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {
+        "config": name,
+        "params": params,
+        f"recall@{k}": round(recall, 4),
+        "p50_ms": round(q[49], 3),
+        "p95_ms": round(q[94], 3),
+        "p99_ms": round(q[98], 3),
+        "qps": round(len(latencies) / sum(latencies), 1) if latencies else 0.0,
+    }
+
+
+def print_table(results: List[dict], k: int):
+    header = f"{'config':<10} {'params':<42} {'recall@' + str(k):>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'QPS':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        params = ",".join(f"{k_}={v}" for k_, v in r["params"].items())
+        print(
+            f"{r['config']:<10} {params:<42} {r[f'recall@{k}']:>9.4f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['qps']:>8.1f}"
+        )
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def float_list(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v]
+
+
+########################################
+# Main logic
+########################################
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline recall/latency benchmark for pgvector retrieval")
+    parser.add_argument("--db", default=os.getenv("BENCH_DATABASE_URL", "postgresql://localhost/ragbench"), help="Postgres URI (vector extension required)")
+    parser.add_argument("--corpus", choices=["synthetic", "fixture"], default="synthetic")
+    parser.add_argument("--docs", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--hnsw-ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=int_list, default=[10, 40, 100, 200])
+    parser.add_argument("--ivf-lists", type=int, default=0, help="0 = lists ≈ sqrt(docs)")
+    parser.add_argument("--ivf-probes", type=int_list, default=[1, 5, 10, 20])
+    parser.add_argument("--diskann-search-list", type=int_list, default=[50, 100, 200])
+    parser.add_argument("--sparse-prune", type=int_list, default=[0, 32, 16, 8], help="Query terms kept (0 = all)")
+    parser.add_argument("--fusion-weights", type=float_list, default=[1.0, 0.8, 0.7, 0.4], help="Dense weights to sweep")
+    parser.add_argument("--fusion-candidates", type=int, default=50)
+    parser.add_argument("--replica-nlist", type=int, default=0, help="0 = sqrt(docs); exact scan below 4096 docs")
+    parser.add_argument("--replica-nprobe", type=int_list, default=[4, 16, 64])
+    parser.add_argument("--rescore-candidates", type=int_list, default=[40, 100, 200], help="Quantized first-pass shortlist sizes")
+    parser.add_argument("--projection-dims", type=int_list, default=[64, 128, 256, 512], help="Reduced first-pass dimensions")
+    parser.add_argument("--projection-methods", default="pca,matryoshka")
+    parser.add_argument("--filter-exact-max-rows", type=int, default=5000, help="FILTER_EXACT_MAX_ROWS for the `auto` plan")
+    parser.add_argument("--skip", default="", help="Comma list of sections to skip: hnsw,ivfflat,diskann,sparse,fusion,replica,quantized,projection,filtered")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(",")))
+    k = args.k
+
+    if args.corpus == "synthetic":
+        docs, queries = synthetic_corpus(args.docs, args.queries, args.seed)
+    else:
+        docs, queries = fixture_corpus(args.queries, args.seed)
+    if len(docs) <= k:
+        sys.exit("✖ Corpus must contain more than k documents")
+    print(f"Corpus: {len(docs)} docs, {len(queries)} queries, dim {args.dim}")
+
+    embedder = StubEmbedder(dim=args.dim)
+    doc_vecs = embedder.dense(docs)
+    query_vecs = embedder.dense(queries)
+    doc_sparse = [embedder.sparse(d) for d in docs]
+    query_sparse = [embedder.sparse(q) for q in queries]
+
+    # Exact ground truth
+    truth_dense = exact_dense_topk(doc_vecs, query_vecs, k)
+    dense_scores = query_vecs @ doc_vecs.T
+    sparse_scores = exact_sparse_scores(doc_sparse, query_sparse)
+    truth_sparse = np.argpartition(-sparse_scores, k, axis=1)[:, :k]
+    sparse_scale = float(max(sparse_scores.max(), 1e-12))
+
+    results: List[dict] = []
+    storage = None
+    with psycopg2.connect(args.db) as conn:
+        register_vector(conn)
+        print("Loading corpus …")
+        load_corpus(conn, doc_vecs, doc_sparse, args.dim)
+
+        dense_sql = f"SELECT chunk_id FROM {BENCH_TABLE} ORDER BY embedding <=> %s LIMIT %s"
+        dense_params = [(v, k) for v in query_vecs]
+
+        build_index(conn, "exact", {})
+        ids, lat = timed_queries(conn, dense_sql, dense_params, {})
+        results.append(summarize("exact", {}, recall_at_k(ids, truth_dense, k), lat, k))
+
+        if "hnsw" not in skip:
+            hnsw = {"m": args.hnsw_m, "ef_construction": args.hnsw_ef_construction}
+            build_s = build_index(conn, "hnsw", hnsw)
+            size_mb = index_size_mb(conn, f"{BENCH_TABLE}_dense_idx")
+            for ef in args.ef_search:
+                ids, lat = timed_queries(conn, dense_sql, dense_params, {"hnsw.ef_search": ef})
+                params = dict(hnsw, ef_search=ef, build_s=round(build_s, 1), index_mb=size_mb)
+                results.append(summarize("hnsw", params, recall_at_k(ids, truth_dense, k), lat, k))
+
+        if "ivfflat" not in skip:
+            lists = args.ivf_lists or max(1, int(len(docs) ** 0.5))
+            build_s = build_index(conn, "ivfflat", {"lists": lists})
+            for probes in args.ivf_probes:
+                ids, lat = timed_queries(conn, dense_sql, dense_params, {"ivfflat.probes": probes})
+                params = {"lists": lists, "probes": probes, "build_s": round(build_s, 1)}
+                results.append(summarize("ivfflat", params, recall_at_k(ids, truth_dense, k), lat, k))
+
+        if "diskann" not in skip:
+            if has_extension(conn, "vectorscale"):
+                build_s = build_index(conn, "diskann", {})
+                for size in args.diskann_search_list:
+                    ids, lat = timed_queries(
+                        conn, dense_sql, dense_params, {"diskann.query_search_list_size": size}
+                    )
+                    params = {"search_list": size, "build_s": round(build_s, 1)}
+                    results.append(summarize("diskann", params, recall_at_k(ids, truth_dense, k), lat, k))
+            else:
+                print("ℹ vectorscale extension not installed – skipping DiskANN")
+
+        if "sparse" not in skip:
+            build_sparse_index(conn)
+            sparse_sql = (
+                f"SELECT chunk_id FROM {BENCH_TABLE} "
+                f"ORDER BY sparse_embedding <#> %s::sparsevec LIMIT %s"
+            )
+            for top_n in args.sparse_prune:
+                params_list = [(sparsevec_literal(prune_sparse(q, top_n)), k) for q in query_sparse]
+                ids, lat = timed_queries(conn, sparse_sql, params_list, {"hnsw.ef_search": max(40, k * 4)})
+                results.append(
+                    summarize("sparse", {"prune_terms": top_n or "all"}, recall_at_k(ids, truth_sparse, k), lat, k)
+                )
+
+        if "fusion" not in skip:
+            # Candidates: top-N from each side, as in the backend; both scores
+            # are then computed for the union and fused in Python.
+            build_index(conn, "hnsw", {"m": args.hnsw_m, "ef_construction": args.hnsw_ef_construction})
+            build_sparse_index(conn)
+            n_cand = args.fusion_candidates
+            fusion_sql = f"""
+                WITH cand AS (
+                    (SELECT chunk_id FROM {BENCH_TABLE} ORDER BY embedding <=> %(d)s LIMIT {n_cand})
+                    UNION
+                    (SELECT chunk_id FROM {BENCH_TABLE} ORDER BY sparse_embedding <#> %(s)s::sparsevec LIMIT {n_cand})
+                )
+                SELECT t.chunk_id, 1 - (t.embedding <=> %(d)s), -(t.sparse_embedding <#> %(s)s::sparsevec)
+                FROM {BENCH_TABLE} t JOIN cand USING (chunk_id)
+            """
+            fusion_params = [
+                {"d": dv, "s": sparsevec_literal(qs)} for dv, qs in zip(query_vecs, query_sparse)
+            ]
+            for weight in args.fusion_weights:
+                truth = exact_fused_topk(dense_scores, sparse_scores, weight, sparse_scale, k)
+                fused_ids, latencies = [], []
+                with conn.cursor() as cur:
+                    cur.execute(f"SET hnsw.ef_search = {max(n_cand, 40)}")
+                    for p in fusion_params:
+                        start = time.perf_counter()
+                        cur.execute(fusion_sql, p)
+                        rows = cur.fetchall()
+                        ranked = sorted(
+                            rows, key=lambda r: -fused_scores(r[1], r[2], weight, sparse_scale)
+                        )
+                        fused_ids.append([r[0] for r in ranked[:k]])
+                        latencies.append(time.perf_counter() - start)
+                    cur.execute("RESET hnsw.ef_search")
+                results.append(
+                    summarize("fusion", {"dense_weight": weight, "candidates": n_cand},
+                              recall_at_k(fused_ids, truth, k), latencies, k)
+                )
+
+        if "replica" not in skip:
+            # Hydration fetches the hits by primary key, as the backend does
+            # after an in-process search; "search only" is the replica alone.
+            hydrate_sql = f"SELECT chunk_id, embedding FROM {BENCH_TABLE} WHERE chunk_id = ANY(%s)"
+            with tempfile.TemporaryDirectory() as replica_dir:
+                replica = DenseReplica(replica_dir, dim=args.dim, nlist=args.replica_nlist, table=BENCH_TABLE)
+                info = replica.rebuild(args.db)
+                for nprobe in args.replica_nprobe:
+                    ids, search_lat, total_lat = [], [], []
+                    with conn.cursor() as cur:
+                        for v in query_vecs:
+                            start = time.perf_counter()
+                            hits = [chunk_id for chunk_id, _ in replica.search(v, k, nprobe=nprobe)]
+                            searched = time.perf_counter()
+                            cur.execute(hydrate_sql, (hits,))
+                            cur.fetchall()
+                            search_lat.append(searched - start)
+                            total_lat.append(time.perf_counter() - start)
+                            ids.append(hits)
+                    recall = recall_at_k(ids, truth_dense, k)
+                    params = {"nlist": info["nlist"], "nprobe": nprobe, "build_s": info["seconds"]}
+                    results.append(summarize("replica", dict(params, hydrate="no"), recall, search_lat, k))
+                    results.append(summarize("replica", dict(params, hydrate="yes"), recall, total_lat, k))
+
+        if "quantized" not in skip:
+            # The full-precision index is dropped so the first pass can only
+            # use its own expression index; the shortlist is rescored against
+            # the fp32 column or its fp16 cast (what halfvec storage keeps).
+            build_index(conn, "exact", {})
+            storage = storage_bytes(conn, args.dim)
+            hnsw = {"m": args.hnsw_m, "ef_construction": args.hnsw_ef_construction}
+            for first_pass in ("halfvec", "binary"):
+                build_s, size_mb = build_quantized_index(conn, first_pass, args.dim, hnsw)
+                for precision in ("vector", "halfvec"):
+                    sql = rescoring_sql(
+                        first_pass, "vector", precision, args.dim, table=BENCH_TABLE,
+                        q="%(q)s", candidates="%(candidates)s", k="%(k)s",
+                    )
+                    for cand in args.rescore_candidates:
+                        params_list = [{"q": v, "candidates": cand, "k": k} for v in query_vecs]
+                        ids, lat = timed_queries(conn, sql, params_list, {"hnsw.ef_search": max(cand, 40)})
+                        params = {
+                            "first_pass": first_pass, "rescore": precision, "candidates": cand,
+                            "build_s": round(build_s, 1), "index_mb": size_mb,
+                        }
+                        results.append(summarize("quantized", params, recall_at_k(ids, truth_dense, k), lat, k))
+                with conn.cursor() as cur:
+                    cur.execute(f"DROP INDEX {BENCH_TABLE}_{first_pass}_idx")
+                conn.commit()
+
+        if "projection" not in skip:
+            # Matryoshka truncation of the hashing stub is a lower bound: the
+            # stub, like ada-002, is not trained to front-load information.
+            build_index(conn, "exact", {})
+            hnsw = {"m": args.hnsw_m, "ef_construction": args.hnsw_ef_construction}
+            for method in filter(None, args.projection_methods.split(",")):
+                for dim in (d for d in args.projection_dims if d < args.dim):
+                    projection = build_projection(method, doc_vecs, dim)
+                    build_s, size_mb = load_projection_column(conn, projection, hnsw)
+                    reduced_q = projection.project(query_vecs)
+                    sql = rescoring_sql(
+                        "reduced", "vector", dim=args.dim, table=BENCH_TABLE, q="%(q)s",
+                        candidates="%(candidates)s", k="%(k)s", reduced_dim=dim, q_reduced="%(q_reduced)s",
+                    )
+                    for cand in args.rescore_candidates:
+                        params_list = [
+                            {"q": v, "q_reduced": r, "candidates": cand, "k": k} for v, r in zip(query_vecs, reduced_q)
+                        ]
+                        ids, lat = timed_queries(conn, sql, params_list, {"hnsw.ef_search": max(cand, 40)})
+                        params = {
+                            "method": method, "dim": dim, "candidates": cand,
+                            "explained": projection.explained_variance, "build_s": round(build_s, 1),
+                            "index_mb": size_mb,
+                        }
+                        results.append(summarize("projection", params, recall_at_k(ids, truth_dense, k), lat, k))
+            with conn.cursor() as cur:
+                cur.execute(f"ALTER TABLE {BENCH_TABLE} DROP COLUMN IF EXISTS embedding_reduced")
+            conn.commit()
+
+        if "filtered" not in skip:
+            # Both plans for every selectivity, on the category (documents
+            # join) and the metadata (GIN) facet; `chosen` marks the plan the
+            # backend would pick with --filter-exact-max-rows.
+            build_index(conn, "hnsw", {"m": args.hnsw_m, "ef_construction": args.hnsw_ef_construction})
+            facet_values = load_facets(conn, len(docs), args.seed)
+            cap = args.filter_exact_max_rows
+            distance = "c.embedding <=> :q"
+            for value in FILTER_SHARES:
+                mask = facet_values == value
+                if mask.sum() < k:
+                    continue
+                masked = np.where(mask, dense_scores, -np.inf)
+                truth = np.argsort(-masked, axis=1)[:, :k]
+                for facet in ("category", "team"):
+                    clause, fparams = filter_clause({facet: [value]})
+                    with conn.cursor() as cur:
+                        cur.execute(pyformat(count_sql(clause, BENCH_TABLE, BENCH_DOCUMENTS)), dict(fparams, cap=cap))
+                        chosen = choose_plan(cur.fetchone()[0], cap)
+                    for plan in PLANS:
+                        sql = pyformat(filtered_search_sql(plan, clause, distance, BENCH_TABLE, BENCH_DOCUMENTS))
+                        settings = {"hnsw.ef_search": 40}
+                        if plan == "iterative_ann":
+                            settings.update({"hnsw.iterative_scan": "relaxed_order", "hnsw.max_scan_tuples": 20000})
+                        params_list = [dict(fparams, q=v, k=k) for v in query_vecs]
+                        ids, lat = timed_queries(conn, sql, params_list, settings)
+                        params = {
+                            "facet": facet, "matches": int(mask.sum()), "plan": plan,
+                            "chosen": "yes" if plan == chosen else "no",
+                        }
+                        results.append(summarize("filtered", params, recall_at_k(ids, truth, k), lat, k))
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {BENCH_DOCUMENTS}")
+            conn.commit()
+
+    print()
+    print_table(results, k)
+    if storage:
+        print("\nBytes per embedding: " + ", ".join(f"{name}={size}" for name, size in storage.items()))
+    if args.output:
+        payload = {
+            "corpus": args.corpus,
+            "docs": len(docs),
+            "queries": len(queries),
+            "dim": args.dim,
+            "k": k,
+            "embedding_bytes": storage,
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(payload, indent=2))
+        print(f"\n✓ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
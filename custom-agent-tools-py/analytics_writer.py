@@ -0,0 +1,189 @@
+"""
+Background writer for analytics rows (`llm_chain_runs`, `feedback`).
+
+Request handlers enqueue rows and return immediately.  A single daemon
+thread drains the bounded queue, coalesces rows per table and writes each
+group with one multi-row INSERT, committed per table.  A group that fails is
+retried row by row, so one bad row only loses itself.  When the queue is
+full new rows are dropped and counted rather than blocking the request path.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+# INSERT statements per table; rows are enqueued as plain tuples in this order
+TABLE_INSERTS = {
+    "llm_chain_runs": (
+        "INSERT INTO llm_chain_runs "
+        "(run_id, chain_type, input_data, output_text, created_at, prompt_version, input_hash) "
+        "VALUES %s"
+    ),
+    "feedback": (
+        "INSERT INTO feedback (log_id, rating, comments, created_at) VALUES %s"
+    ),
+}
+
+
+class BatchedWriter:
+    def __init__(
+        self,
+        connect: Callable,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        on_flush: Optional[Callable[[float, bool], None]] = None,
+    ):
+        self._connect = connect
+        self._on_flush = on_flush
+        self._queue: "queue.Queue[Tuple[str, tuple]]" = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the worker after flushing everything still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, table: str, row: tuple) -> bool:
+        if table not in TABLE_INSERTS:
+            raise ValueError(f"unknown analytics table {table}")
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.queued += 1
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "pending": self._queue.qsize(),
+            }
+
+    def _drain(self, first_timeout: float) -> List[Tuple[str, tuple]]:
+        items = []
+        try:
+            items.append(self._queue.get(timeout=first_timeout))
+        except queue.Empty:
+            return items
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _connection(self):
+        # The worker thread owns one long-lived connection
+        if self._conn is None or self._conn.closed:
+            self._conn = self._connect()
+        return self._conn
+
+    def _discard_transaction(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.rollback()
+        except Exception:
+            self._conn.close()
+            self._conn = None
+
+    def _insert(self, table: str, rows: List[tuple]):
+        """INSERT `rows` into `table` in a transaction of their own."""
+        conn = self._connection()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, TABLE_INSERTS[table], rows, page_size=len(rows))
+            conn.commit()
+        except Exception:
+            self._discard_transaction()
+            raise
+
+    def _write(self, items: List[Tuple[str, tuple]]):
+        """Write each table on its own; a failed batch is retried row by row."""
+        grouped: Dict[str, List[tuple]] = {}
+        for table, row in items:
+            grouped.setdefault(table, []).append(row)
+        start = time.perf_counter()
+        flushed = failed = 0
+        for table, rows in grouped.items():
+            try:
+                self._insert(table, rows)
+                flushed += len(rows)
+                continue
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as exc:
+                # no usable connection: retrying row by row would fail the same way
+                print(f"Analytics writer failed to flush {len(rows)} {table} rows: {exc}")
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                failed += len(rows)
+                continue
+            except Exception as exc:
+                print(f"Analytics writer failed to flush {len(rows)} {table} rows, retrying one by one: {exc}")
+            rejected, error = 0, None
+            for row in rows:
+                try:
+                    self._insert(table, [row])
+                    flushed += 1
+                except Exception as exc:
+                    rejected, error = rejected + 1, exc
+            if rejected:
+                print(f"Analytics writer rejected {rejected} of {len(rows)} {table} rows: {error}")
+            failed += rejected
+        with self._lock:
+            self.flushed += flushed
+            self.failed += failed
+        if self._on_flush:
+            self._on_flush(time.perf_counter() - start, failed == 0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            items = self._drain(first_timeout=self.flush_interval)
+            if items:
+                self._write(items)
+        # Final flush on shutdown
+        while True:
+            items = []
+            try:
+                while len(items) < self.batch_size:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not items:
+                break
+            self._write(items)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,87 @@
+"""
+Result cache for the ticket LLM chains.
+
+Entries are keyed by (chain type, prompt template version, ticket-summary
+hash), so editing a ticket or bumping a prompt version naturally misses the
+cache.  The in-memory LRU sits in front of the `llm_chain_runs` table, which
+acts as the durable second tier shared by every worker.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+CacheKey = Tuple[str, str, str]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text with OpenAI tokenizers
+    return max(1, len(text) // 4)
+
+
+class ChainResultCache:
+    """Thread-safe LRU of chain outputs with hit-rate and cost accounting."""
+
+    def __init__(self, max_entries: int = 1024, cost_per_1k_tokens: float = 0.002):
+        self.max_entries = max_entries
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+        self._entries: "OrderedDict[CacheKey, Tuple[int, str]]" = OrderedDict()
+        # Latest key seen per (chain_type, ticket_id), used to evict stale text
+        self._ticket_keys: Dict[Tuple[str, int], CacheKey] = {}
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: CacheKey, ticket_id: int, value: str) -> None:
+        with self._lock:
+            previous = self._ticket_keys.get((key[0], ticket_id))
+            if previous is not None and previous != key:
+                self._entries.pop(previous, None)
+            self._ticket_keys[(key[0], ticket_id)] = key
+            self._entries[key] = (ticket_id, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, (evicted_ticket, _) = self._entries.popitem(last=False)
+                if self._ticket_keys.get((evicted[0], evicted_ticket)) == evicted:
+                    del self._ticket_keys[(evicted[0], evicted_ticket)]
+
+    def record_hit(self, source: str, prompt_text: str, output_text: str) -> None:
+        with self._lock:
+            if source == "memory":
+                self.memory_hits += 1
+            else:
+                self.db_hits += 1
+            self.tokens_saved += estimate_tokens(prompt_text) + estimate_tokens(output_text)
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "tokens_saved": self.tokens_saved,
+                "estimated_cost_saved": self.tokens_saved / 1000 * self.cost_per_1k_tokens,
+            }
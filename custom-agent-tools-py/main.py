@@ -13,19 +13,45 @@ import uuid
 from datetime import datetime
 import os
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from langchain_community.vectorstores.pgvector import PGVector
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.chains import RetrievalQA, LLMChain
 from langchain.llms import OpenAI
 from langchain.prompts import PromptTemplate
+from langchain.schema import Document
 import smtplib
 from email.message import EmailMessage
-import requests
 import csv
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from io import StringIO
+import itertools
 import json
+import pathlib
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from analytics_writer import BatchedWriter
+from chain_cache import ChainResultCache, text_hash
+from notifier import NotificationDispatcher
+
+# Shared request-path instrumentation lives in ../monitoring
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent / "monitoring"))
+from raglab_metrics import stage, observe_stage, install_request_metrics, metrics_payload
+from raglab_profiling import install_profiling
+from raglab_tracing import install_tracing
+
+# The dense kb_chunks replica is built and refreshed by the FastAPI backend
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent / "RAG_Scripts"))
+from dense_replica import from_env as dense_replica_from_env, libpq_dsn
+from quantized_search import rescoring_sql, vector_literal
+from dense_projection import load_projection
+from kb_shards import from_env as kb_shards_from_env, ScatterGather, merge_top_k
+from read_replicas import ReplicaRouter, LAG_SQL, lag_seconds, replica_urls, url_label
+from adaptive_depth import AdaptiveDepth
 
 
 app = FastMCP(
@@ -34,6 +60,10 @@ app = FastMCP(
     description="Python/Langchain MCP server for Service Desk Agent with advanced RAG, LLM, analytics, UI, and feedback loops"
 )
 
+install_request_metrics(app)
+install_profiling(app)
+install_tracing(app, "raglab-mcp")
+
 # Database connection (AI agent database)
 PG_CONN_STR = os.getenv("AI_AGENT_DB_URL", "dbname=agentdb user=user password=pass host=localhost")
 PGVECTOR_CONN_STR = os.getenv(
@@ -48,6 +78,67 @@ PAGERDUTY_ROUTING_KEY = os.getenv("PAGERDUTY_ROUTING_KEY")
 def get_pg_conn():
     return psycopg2.connect(PG_CONN_STR, cursor_factory=RealDictCursor)
 
+# Optional read replicas of the AI agent database (see RAG_Scripts/read_replicas.py):
+# /search, /analytics/* and the stats endpoints read from a replica whose lag
+# is at most REPLICA_MAX_LAG_SECONDS, the primary otherwise
+AI_AGENT_DB_REPLICA_URLS = replica_urls(os.getenv("AI_AGENT_DB_REPLICA_URLS"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "5"))
+agent_read_router = ReplicaRouter(
+    "agentdb",
+    [url_label(dsn) for dsn in AI_AGENT_DB_REPLICA_URLS],
+    max_lag=REPLICA_MAX_LAG_SECONDS,
+    stale_after=3 * REPLICA_LAG_CHECK_INTERVAL,
+)
+
+
+class RoutedConnection(psycopg2.extensions.connection):
+    """Remembers the route and target it was opened for."""
+    route = None
+    target = "primary"
+
+
+class RoutedCursor(RealDictCursor):
+    """Counts statements per route and target."""
+
+    def execute(self, query, vars=None):
+        if self.connection.route is not None:
+            agent_read_router.count_query(self.connection.route, self.connection.target)
+        return super().execute(query, vars)
+
+
+def get_pg_read_conn(route: str):
+    """Connection for read-only work on `route`: a healthy replica, else the primary."""
+    replica = agent_read_router.route(route)
+    dsn = PG_CONN_STR if replica is None else AI_AGENT_DB_REPLICA_URLS[replica]
+    conn = psycopg2.connect(dsn, connection_factory=RoutedConnection, cursor_factory=RoutedCursor)
+    conn.route, conn.target = route, agent_read_router.target(replica)
+    return conn
+
+
+def check_replica_lag():
+    for replica, dsn in enumerate(AI_AGENT_DB_REPLICA_URLS):
+        entry = agent_read_router.replicas[replica]
+        try:
+            conn = psycopg2.connect(dsn, connect_timeout=max(2, int(REPLICA_LAG_CHECK_INTERVAL)))
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(LAG_SQL)
+                    lag = lag_seconds(*cur.fetchone())
+            finally:
+                conn.close()
+            agent_read_router.record_lag(replica, lag)
+        except Exception as exc:
+            if entry["error"] is None:
+                print(f"Replica {entry['replica']} unavailable, reading from the primary: {exc}")
+            agent_read_router.record_lag(replica, None, exc)
+
+
+def _watch_replica_lag():
+    while True:
+        time.sleep(REPLICA_LAG_CHECK_INTERVAL)
+        check_replica_lag()
+
 # Hybrid RAG setup
 embeddings = OpenAIEmbeddings()
 vectorstore = PGVector.from_existing_table(
@@ -57,43 +148,250 @@ vectorstore = PGVector.from_existing_table(
     column_name="embedding",
     dimension=1536
 )
-dense_retriever = vectorstore.as_retriever(search_kwargs={"k": 10})
 
-# Feedback storage (PostgreSQL-backed)
-def store_feedback(query, dense_results, sparse_results, reranked, user_feedback, llm_output):
-    with get_pg_conn() as conn:
+
+def pgvector_dense_docs(dense_q: List[float], k: int = 10) -> List[Document]:
+    """Dense top-k through PGVector, with the similarity adaptive depth needs."""
+    docs = []
+    for doc, distance in vectorstore.similarity_search_with_score_by_vector(dense_q, k=k):
+        doc.metadata["similarity"] = 1 - distance
+        docs.append(doc)
+    return docs
+
+# Optional in-process replica of kb_chunks.embedding (see RAG_Scripts/dense_replica.py)
+dense_replica = dense_replica_from_env()
+DENSE_REPLICA_MAX_LAG = float(os.getenv("DENSE_REPLICA_MAX_LAG", "300"))
+
+# Reduced-precision first pass with exact rescoring (see RAG_Scripts/quantized_search.py)
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector")
+DENSE_FIRST_PASS = os.getenv("DENSE_FIRST_PASS", "vector")
+DENSE_RESCORE_CANDIDATES = int(os.getenv("DENSE_RESCORE_CANDIDATES", "100"))
+# DENSE_FIRST_PASS=reduced: the active projection (RAG_Scripts/dense_projection.py)
+# is re-read at most every DENSE_PROJECTION_CHECK_INTERVAL seconds
+DENSE_PROJECTION_CHECK_INTERVAL = float(os.getenv("DENSE_PROJECTION_CHECK_INTERVAL", "60"))
+dense_projection = None
+dense_projection_checked_at = 0.0
+
+
+def quantized_dense_sql(reduced_dim: Optional[int] = None) -> str:
+    return rescoring_sql(
+        DENSE_FIRST_PASS,
+        storage=EMBEDDING_STORAGE,
+        columns="c.chunk_id, c.chunk_text, c.document_id",
+        q="%(q)s",
+        candidates="%(candidates)s",
+        k="%(k)s",
+        reduced_dim=reduced_dim,
+        q_reduced="%(q_reduced)s",
+        where="embedding_reduced_version = %(projection_version)s" if reduced_dim else None,
+    )
+
+
+QUANTIZED_DENSE_SQL = None if DENSE_FIRST_PASS == "reduced" else quantized_dense_sql()
+
+
+def active_projection(cur):
+    global dense_projection, dense_projection_checked_at, QUANTIZED_DENSE_SQL
+    if time.monotonic() - dense_projection_checked_at >= DENSE_PROJECTION_CHECK_INTERVAL:
+        dense_projection_checked_at = time.monotonic()
+        projection = load_projection(cur)
+        if projection is not None and (dense_projection is None or projection.version != dense_projection.version):
+            QUANTIZED_DENSE_SQL = quantized_dense_sql(projection.dim)
+        dense_projection = projection
+    return dense_projection
+
+
+def quantized_dense_docs(dense_q: List[float], k: int = 10, ef_search: Optional[int] = None) -> Optional[List[Document]]:
+    """Dense top-k via a halfvec/binary/reduced index and exact rescoring; None when not configured."""
+    if DENSE_FIRST_PASS == "vector" and EMBEDDING_STORAGE == "vector":
+        return None
+    candidates = max(DENSE_RESCORE_CANDIDATES, k)
+    params = {"q": vector_literal(dense_q), "candidates": candidates, "k": k}
+    with get_pg_read_conn("/search") as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO feedback (feedback_id, log_id, rating, comments, created_at) VALUES (%s, %s, %s, %s, %s)",
-                (str(uuid.uuid4()), query, user_feedback.get("rating", 0), user_feedback.get("comments", ""), datetime.utcnow())
-            )
-            conn.commit()
+            if DENSE_FIRST_PASS == "reduced":
+                projection = active_projection(cur)
+                if projection is None:
+                    return None
+                params.update(q_reduced=vector_literal(projection.project(dense_q)), projection_version=projection.version)
+            cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(max(candidates, ef_search or 40)),))
+            cur.execute(QUANTIZED_DENSE_SQL, params)
+            rows = cur.fetchall()
+    return [
+        Document(
+            page_content=r["chunk_text"],
+            metadata={"chunk_id": r["chunk_id"], "document_id": r["document_id"], "similarity": 1 - r["distance"]},
+        )
+        for r in rows
+    ]
 
-# Store outputs from LLM chains for analytics
-def store_chain_output(chain_type: str, input_data: dict, output_text: str):
-    with get_pg_conn() as conn:
+
+def replica_dense_docs(dense_q: List[float], k: int = 10, ef_search: Optional[int] = None) -> Optional[List[Document]]:
+    """Dense top-k from the replica, hydrated from kb_chunks; None if it is not usable.
+
+    A widened search (`ef_search`) probes as many times more lists as
+    `ef_search` exceeds pgvector's default of 40.
+    """
+    if dense_replica is None or not dense_replica.ready(DENSE_REPLICA_MAX_LAG):
+        return None
+    hits = dense_replica.search(dense_q, k, dense_replica.nprobe * ef_search // 40 if ef_search else None)
+    if not hits:
+        return []
+    with get_pg_read_conn("/search") as conn:
         with conn.cursor() as cur:
             cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS llm_chain_runs (
-                    run_id UUID PRIMARY KEY,
-                    chain_type TEXT NOT NULL,
-                    input_data JSONB NOT NULL,
-                    output_text TEXT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                )
-                """
+                "SELECT chunk_id, chunk_text, document_id FROM kb_chunks WHERE chunk_id = ANY(%s)",
+                ([chunk_id for chunk_id, _ in hits],),
             )
-            cur.execute(
-                "INSERT INTO llm_chain_runs (run_id, chain_type, input_data, output_text, created_at) VALUES (%s, %s, %s, %s, %s)",
-                (str(uuid.uuid4()), chain_type, json.dumps(input_data), output_text, datetime.utcnow())
+            by_id = {r["chunk_id"]: r for r in cur.fetchall()}
+    return [
+        Document(
+            page_content=by_id[chunk_id]["chunk_text"],
+            metadata={"chunk_id": chunk_id, "document_id": by_id[chunk_id]["document_id"], "similarity": score},
+        )
+        for chunk_id, score in hits
+        if chunk_id in by_id
+    ]
+
+# Optional kb_chunks shards (see RAG_Scripts/kb_shards.py): /search queries
+# every shard from a thread pool and merges what answers within the deadline
+kb_shard_map = kb_shards_from_env()
+KB_SHARD_DEADLINE_MS = float(os.getenv("KB_SHARD_DEADLINE_MS", "250"))
+kb_scatter = ScatterGather(kb_shard_map.labels, KB_SHARD_DEADLINE_MS / 1000) if kb_shard_map else None
+# twice the shard count: calls abandoned at the deadline may still hold a worker
+kb_shard_pool = ThreadPoolExecutor(max_workers=2 * len(kb_shard_map)) if kb_shard_map else None
+SHARD_DENSE_SQL = (
+    "SELECT chunk_id, chunk_text, document_id, "
+    f"embedding <=> %(q)s::{EMBEDDING_STORAGE}(1536) AS distance "
+    "FROM kb_chunks ORDER BY distance LIMIT %(k)s"
+)
+
+
+def sharded_search(query: str, dense_q: List[float], k: int = 10, sparse_limit: int = 10, ef_search: Optional[int] = None):
+    """(dense docs, full-text rows) merged over the kb_chunks shards; None when not sharded."""
+    if kb_shard_map is None:
+        return None
+    dense_q = vector_literal(dense_q)
+
+    def on_shard(url):
+        def call():
+            # bounded so calls abandoned at the deadline free their worker soon after
+            conn = psycopg2.connect(
+                libpq_dsn(url),
+                cursor_factory=RealDictCursor,
+                connect_timeout=2,
+                options=f"-c statement_timeout={int(4 * KB_SHARD_DEADLINE_MS)}",
             )
-            conn.commit()
+            try:
+                with conn.cursor() as cur:
+                    if ef_search:
+                        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(ef_search),))
+                    cur.execute(SHARD_DENSE_SQL, {"q": dense_q, "k": k})
+                    dense = cur.fetchall()
+                    cur.execute(
+                        "SELECT chunk_id, chunk_text FROM kb_chunks WHERE to_tsvector('english', chunk_text) @@ plainto_tsquery(%s) LIMIT %s",
+                        (query, sparse_limit),
+                    )
+                    sparse = cur.fetchall()
+            finally:
+                conn.close()
+            return dense, sparse
+        return call
+
+    answered = kb_scatter.gather_threads(kb_shard_pool, [on_shard(url) for url in kb_shard_map.urls])
+    dense_rows = merge_top_k([dense for dense, _ in answered], k, key=lambda r: r["distance"])
+    dense_docs = [
+        Document(
+            page_content=r["chunk_text"],
+            metadata={"chunk_id": r["chunk_id"], "document_id": r["document_id"], "similarity": 1 - r["distance"]},
+        )
+        for r in dense_rows
+    ]
+    # full-text matches are unranked: take them round-robin across shards
+    sparse_docs = [
+        row for group in itertools.zip_longest(*(sparse for _, sparse in answered)) for row in group if row is not None
+    ][:sparse_limit]
+    return dense_docs, sparse_docs
+
+# Optional adaptive retrieval depth (see RAG_Scripts/adaptive_depth.py): /search
+# trims confident results to ADAPTIVE_MIN_K chunks and retrieves unsure ones
+# again ADAPTIVE_WIDEN_FACTOR times deeper with hnsw.ef_search = ADAPTIVE_WIDE_EF_SEARCH
+ADAPTIVE_DEPTH_ENABLED = os.getenv("ADAPTIVE_DEPTH_ENABLED", "false").lower() in ("1", "true", "yes")
+adaptive_depth = AdaptiveDepth(
+    min_k=int(os.getenv("ADAPTIVE_MIN_K", "2")),
+    max_k=int(os.getenv("ADAPTIVE_MAX_K", "8")),
+    agreement=float(os.getenv("ADAPTIVE_AGREEMENT", "0.6")),
+    min_confidence=float(os.getenv("ADAPTIVE_MIN_CONFIDENCE", "0.55")),
+    drop_off=float(os.getenv("ADAPTIVE_DROP_OFF", "0.1")),
+    widen_factor=int(os.getenv("ADAPTIVE_WIDEN_FACTOR", "2")),
+    wide_ef_search=int(os.getenv("ADAPTIVE_WIDE_EF_SEARCH", "200")),
+) if ADAPTIVE_DEPTH_ENABLED else None
+
+# Schema owned by this server, applied once at startup rather than per call
+LLM_CHAIN_RUNS_DDL = """
+    CREATE TABLE IF NOT EXISTS llm_chain_runs (
+        run_id UUID PRIMARY KEY,
+        chain_type TEXT NOT NULL,
+        input_data JSONB NOT NULL,
+        output_text TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT NOW()
+    );
+    ALTER TABLE llm_chain_runs ADD COLUMN IF NOT EXISTS prompt_version TEXT;
+    ALTER TABLE llm_chain_runs ADD COLUMN IF NOT EXISTS input_hash TEXT;
+    CREATE INDEX IF NOT EXISTS llm_chain_runs_cache_idx
+        ON llm_chain_runs (chain_type, prompt_version, input_hash, created_at DESC);
+"""
+
+SCHEMA_MIGRATIONS = [LLM_CHAIN_RUNS_DDL]
+
+
+def run_schema_migrations():
+    with get_pg_conn() as conn:
+        with conn.cursor() as cur:
+            for ddl in SCHEMA_MIGRATIONS:
+                cur.execute(ddl)
+        conn.commit()
+
+
+# Analytics rows are written off the request path in coalesced batches
+analytics_writer = BatchedWriter(
+    get_pg_conn,
+    max_queue=int(os.getenv("ANALYTICS_WRITER_MAX_QUEUE", "10000")),
+    batch_size=int(os.getenv("ANALYTICS_WRITER_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("ANALYTICS_WRITER_FLUSH_INTERVAL", "1.0")),
+    on_flush=lambda seconds, ok: observe_stage(
+        "log_write", "analytics_writer", seconds, "ok" if ok else "error"
+    ),
+)
+
+
+# Feedback storage (PostgreSQL-backed)
+def store_feedback(log_id: int, user_feedback: dict):
+    analytics_writer.submit(
+        "feedback",
+        (log_id, user_feedback["rating"], user_feedback.get("comments", ""), datetime.utcnow()),
+    )
+
+# Store outputs from LLM chains for analytics
+def store_chain_output(
+    chain_type: str,
+    input_data: dict,
+    output_text: str,
+    prompt_version: Optional[str] = None,
+    input_hash: Optional[str] = None,
+):
+    analytics_writer.submit(
+        "llm_chain_runs",
+        (str(uuid.uuid4()), chain_type, json.dumps(input_data), output_text, datetime.utcnow(), prompt_version, input_hash),
+    )
 
 # Hybrid reranking
+HYBRID_WEIGHTS = {"dense": 0.6, "sparse": 0.4}
+
+
 def hybrid_rerank(dense_results, sparse_results, weights=None, feedback=None):
     # Simple weighted sum, can be replaced with LLM-based reranking
-    weights = weights or {"dense": 0.6, "sparse": 0.4}
+    weights = weights or HYBRID_WEIGHTS
     combined = {}
     for doc in dense_results:
         combined[doc.page_content] = {"dense": 1.0, "sparse": 0.0}
@@ -135,14 +433,44 @@ def feedback_loop(llm_output, user_feedback):
     # Store feedback and optionally adjust system parameters
     print(f"Feedback received: {user_feedback} for output: {llm_output}")
 
+# Teams/PagerDuty are delivered by background workers over pooled connections
+PAGERDUTY_EVENTS_URL = "https://events.pagerduty.com/v2/enqueue"
+
+notifier = NotificationDispatcher(
+    workers=int(os.getenv("NOTIFY_WORKERS", "2")),
+    max_queue=int(os.getenv("NOTIFY_MAX_QUEUE", "1000")),
+    connect_timeout=float(os.getenv("NOTIFY_CONNECT_TIMEOUT", "3")),
+    read_timeout=float(os.getenv("NOTIFY_READ_TIMEOUT", "10")),
+    max_retries=int(os.getenv("NOTIFY_MAX_RETRIES", "4")),
+    dedup_window=float(os.getenv("NOTIFY_DEDUP_WINDOW", "60")),
+)
+
+
+@app.on_event("startup")
+def startup():
+    run_schema_migrations()
+    analytics_writer.start()
+    notifier.start()
+    if AI_AGENT_DB_REPLICA_URLS:
+        # route to replicas from the first request on
+        check_replica_lag()
+        threading.Thread(target=_watch_replica_lag, name="replica-lag", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    notifier.stop()
+    analytics_writer.stop()
+
+
 # Microsoft Teams integration
 def post_to_teams(message: str):
     if not TEAMS_WEBHOOK_URL:
         raise HTTPException(status_code=500, detail="TEAMS_WEBHOOK_URL not configured")
-    resp = requests.post(TEAMS_WEBHOOK_URL, json={"text": message})
-    if resp.status_code >= 400:
-        raise HTTPException(status_code=resp.status_code, detail="Teams notification failed")
-    return {"status": "sent"}
+    status = notifier.enqueue("teams", TEAMS_WEBHOOK_URL, {"text": message})
+    if status == "dropped":
+        raise HTTPException(status_code=503, detail="Notification queue full")
+    return {"status": status}
 
 
 # PagerDuty integration
@@ -158,10 +486,10 @@ def trigger_pagerduty(summary: str, severity: str = "info", source: str = "custo
             "severity": severity,
         },
     }
-    resp = requests.post("https://events.pagerduty.com/v2/enqueue", json=payload)
-    if resp.status_code >= 400:
-        raise HTTPException(status_code=resp.status_code, detail="PagerDuty notification failed")
-    return {"status": "triggered"}
+    status = notifier.enqueue("pagerduty", PAGERDUTY_EVENTS_URL, payload)
+    if status == "dropped":
+        raise HTTPException(status_code=503, detail="Notification queue full")
+    return {"status": status}
 
 # Hybrid RAG search endpoint with advanced features
 @tool
@@ -184,27 +512,68 @@ def search(
 
     **Returns** the answer string with the context chunks used.
     """
-    dense_docs = dense_retriever.get_relevant_documents(query)
-    with get_pg_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT chunk_id, chunk_text FROM kb_chunks WHERE to_tsvector('english', chunk_text) @@ plainto_tsquery(%s) LIMIT %s",
-                (query, limit * 2)
-            )
-            sparse_docs = cur.fetchall()
+    endpoint = "/search"
+    with stage("embed_dense", endpoint):
+        dense_q = embeddings.embed_query(query)
+
+    def retrieve(k, sparse_limit, ef_search=None):
+        if kb_shard_map is not None:
+            # dense + full-text on every shard
+            with stage("sharded_retrieval", endpoint):
+                return sharded_search(query, dense_q, k, sparse_limit, ef_search)
+        # Dense retrieval
+        with stage("dense_retrieval", endpoint):
+            dense_docs = replica_dense_docs(dense_q, k, ef_search)
+            if dense_docs is None:
+                dense_docs = quantized_dense_docs(dense_q, k, ef_search)
+            if dense_docs is None:
+                # PGVector opens its own connection, so only k grows here
+                dense_docs = pgvector_dense_docs(dense_q, k)
+        with stage("sparse_retrieval", endpoint):
+            with get_pg_read_conn(endpoint) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT chunk_id, chunk_text FROM kb_chunks WHERE to_tsvector('english', chunk_text) @@ plainto_tsquery(%s) LIMIT %s",
+                        (query, sparse_limit)
+                    )
+                    sparse_docs = cur.fetchall()
+        return dense_docs, sparse_docs
+
+    dense_docs, sparse_docs = retrieve(10, limit * 2)
+    keep = None
+    if adaptive_depth is not None:
+        # full-text matches are unranked: they only count for agreement
+        depth = adaptive_depth.decide(
+            [(doc.metadata.get("chunk_id"), doc.metadata.get("similarity")) for doc in dense_docs],
+            [(row["chunk_id"], None) for row in sparse_docs],
+            (HYBRID_WEIGHTS["dense"], HYBRID_WEIGHTS["sparse"]),
+            limit,
+        )
+        if depth.action == "widen":
+            widen_start = time.perf_counter()
+            with stage("adaptive_widen", endpoint):
+                factor = adaptive_depth.widen_factor
+                dense_docs, sparse_docs = retrieve(10 * factor, limit * 2 * factor, adaptive_depth.wide_ef_search)
+            adaptive_depth.record_widen(time.perf_counter() - widen_start)
+        elif depth.action != "default":
+            keep = depth.keep
     # Hybrid reranking
-    if rerank:
-        reranked = hybrid_rerank(dense_docs, sparse_docs)
-    else:
-        reranked = [doc.page_content for doc in dense_docs] + [doc["chunk_text"] for doc in sparse_docs]
-    # Context window optimization
-    context_chunks = optimize_context_window(reranked, max_tokens=max_tokens)
-    # Dynamic prompt engineering
-    base_prompt = "Answer the user's question using the following context:\n{context}\nQuestion: " + query
-    prompt = dynamic_prompt_engineering(base_prompt, "\n".join(context_chunks), user=user)
+    with stage("fusion", endpoint):
+        if rerank:
+            reranked = hybrid_rerank(dense_docs, sparse_docs)
+        else:
+            reranked = [doc.page_content for doc in dense_docs] + [doc["chunk_text"] for doc in sparse_docs]
+        reranked = reranked[:keep]
+    with stage("context_assembly", endpoint):
+        # Context window optimization
+        context_chunks = optimize_context_window(reranked, max_tokens=max_tokens)
+        # Dynamic prompt engineering
+        base_prompt = "Answer the user's question using the following context:\n{context}\nQuestion: " + query
+        prompt = dynamic_prompt_engineering(base_prompt, "\n".join(context_chunks), user=user)
     # LLM answer
-    llm = OpenAI(temperature=0.2)
-    answer = llm(prompt)
+    with stage("llm_generation", endpoint):
+        llm = OpenAI(temperature=0.2)
+        answer = llm(prompt)
     return {
         "query": query,
         "context_chunks": context_chunks,
@@ -214,132 +583,283 @@ def search(
 # Feedback loop endpoint
 @tool
 @app.post("/feedback-loop")
-def feedback_loop_endpoint(query: str, llm_output: str, rating: int, comments: Optional[str] = None):
-    """Record user feedback for an LLM answer."""
+def feedback_loop_endpoint(
+    query: str, llm_output: str, log_id: int, rating: int, comments: Optional[str] = None
+):
+    """Record user feedback for the LLM answer logged as `log_id` in chat_logs."""
+    if rating < 1 or rating > 5:
+        raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
+    # the row is written in the background, so check the reference up front
+    with get_pg_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM chat_logs WHERE log_id = %s", (log_id,))
+            if cur.fetchone() is None:
+                raise HTTPException(status_code=404, detail="Chat log not found")
     user_feedback = {"rating": rating, "comments": comments or ""}
     feedback_loop(llm_output, user_feedback)
-    store_feedback(query, [], [], [], user_feedback, llm_output)
-    return {"status": "feedback received"}
+    store_feedback(log_id, user_feedback)
+    return {"status": "feedback received", "log_id": log_id}
 
 
 """Analytics Endpoints"""
 
+# Rows fetched per round-trip by the server-side export cursor
+ANALYTICS_EXPORT_CHUNK_SIZE = int(os.getenv("ANALYTICS_EXPORT_CHUNK_SIZE", "1000"))
+
+
+def _date_range_clause(column: str, start: Optional[str], end: Optional[str], params: list) -> str:
+    clauses = []
+    if start:
+        clauses.append(f"{column} >= %s")
+        params.append(start)
+    if end:
+        clauses.append(f"{column} <= %s")
+        params.append(end)
+    return " AND ".join(clauses)
+
+
+# Row limit applied when the caller gives none, per analytics type
+ANALYTICS_DEFAULT_LIMITS = {"agent_leaderboard": 10}
+
+
+def _analytics_query(
+    type: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    hours: int = 48,
+):
+    """Build the SQL and parameters for one analytics type.
+
+    Every type accepts the same date range (`start`/`end`) and paging
+    (`limit`/`offset`) arguments so the JSON endpoints and the streaming
+    export share a single definition of each report, including its
+    default `limit` (`ANALYTICS_DEFAULT_LIMITS`).
+    """
+    params: list = []
+    if type == "ticket_volume":
+        where = _date_range_clause("created_at", start, end, params)
+        sql = (
+            "SELECT date_trunc('day', created_at)::date AS day, COUNT(*) AS count "
+            "FROM external_tickets "
+            + (f"WHERE {where} " if where else "")
+            + "GROUP BY day ORDER BY day"
+        )
+    elif type == "resolution_times":
+        where = _date_range_clause("created_at", start, end, params)
+        sql = (
+            "SELECT COALESCE(AVG(EXTRACT(EPOCH FROM (resolved_at - created_at))), 0) / 3600 "
+            "AS average_resolution_hours "
+            "FROM external_tickets WHERE resolved_at IS NOT NULL"
+            + (f" AND {where}" if where else "")
+        )
+    elif type == "sla_compliance":
+        params.append(hours)
+        where = _date_range_clause("created_at", start, end, params)
+        sql = (
+            "SELECT COALESCE(100.0 * COUNT(*) FILTER ("
+            "WHERE resolved_at - created_at <= make_interval(hours => %s)"
+            ") / NULLIF(COUNT(*), 0), 0) AS sla_compliance_percent "
+            "FROM external_tickets WHERE resolved_at IS NOT NULL"
+            + (f" AND {where}" if where else "")
+        )
+    elif type == "agent_leaderboard":
+        where = _date_range_clause("measured_at", start, end, params)
+        sql = (
+            "SELECT metric_name, metric_value FROM agent_metrics "
+            "WHERE metric_name LIKE 'agent_%%'"
+            + (f" AND {where}" if where else "")
+            + " ORDER BY metric_value DESC"
+        )
+    elif type == "document_usage":
+        where = _date_range_clause("r.retrieved_at", start, end, params)
+        sql = (
+            "SELECT d.document_id, d.title, COUNT(r.retrieval_id) AS count "
+            "FROM retrieval_history r "
+            "JOIN kb_chunks k ON r.chunk_id = k.chunk_id "
+            "JOIN documents d ON k.document_id = d.document_id "
+            + (f"WHERE {where} " if where else "")
+            + "GROUP BY d.document_id, d.title ORDER BY count DESC"
+        )
+    else:
+        raise HTTPException(status_code=400, detail="invalid analytics type")
+
+    if limit is None:
+        limit = ANALYTICS_DEFAULT_LIMITS.get(type)
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    if offset:
+        sql += " OFFSET %s"
+        params.append(offset)
+    return sql, tuple(params)
+
+
+def _fetch_analytics(type: str, **kwargs):
+    sql, params = _analytics_query(type, **kwargs)
+    with get_pg_read_conn("/analytics/" + type.replace("_", "-")) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+
 @app.get("/analytics/ticket-volume")
-def ticket_volume(start: str = Query(...), end: str = Query(...)):
+def ticket_volume(
+    start: str = Query(...),
+    end: str = Query(...),
+    limit: Optional[int] = None,
+    offset: int = 0,
+):
     """Return ticket counts per day between start and end dates."""
-    sql = (
-        "SELECT date_trunc('day', created_at) AS day, COUNT(*) AS count "
-        "FROM external_tickets WHERE created_at BETWEEN %s AND %s "
-        "GROUP BY day ORDER BY day"
-    )
-    with get_pg_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, (start, end))
-            rows = cur.fetchall()
-    # Format datetime to date string
-    data = [{"day": r["day"].date().isoformat(), "count": r["count"]} for r in rows]
+    rows = _fetch_analytics("ticket_volume", start=start, end=end, limit=limit, offset=offset)
+    data = [{"day": r["day"].isoformat(), "count": r["count"]} for r in rows]
     return {"ticket_volume": data}
 
 
 @app.get("/analytics/resolution-times")
-def resolution_times():
+def resolution_times(start: Optional[str] = None, end: Optional[str] = None):
     """Return average ticket resolution time in hours."""
-    sql = (
-        "SELECT AVG(EXTRACT(EPOCH FROM (resolved_at - created_at))) AS avg_sec "
-        "FROM external_tickets WHERE resolved_at IS NOT NULL"
-    )
-    with get_pg_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql)
-            row = cur.fetchone()
-    avg_hours = (row["avg_sec"] or 0) / 3600
-    return {"average_resolution_hours": avg_hours}
+    row = _fetch_analytics("resolution_times", start=start, end=end)[0]
+    return {"average_resolution_hours": float(row["average_resolution_hours"] or 0)}
 
 
 @app.get("/analytics/sla-compliance")
-def sla_compliance(hours: int = Query(48)):
+def sla_compliance(
+    hours: int = Query(48),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
     """Return percentage of tickets resolved within the given SLA hours."""
-    sql = (
-        "SELECT COUNT(*) FILTER (WHERE resolved_at IS NOT NULL) AS resolved, "
-        "COUNT(*) FILTER (WHERE resolved_at IS NOT NULL AND resolved_at - created_at <= interval '%s hour') AS within_sla "
-        "FROM external_tickets" % hours
-    )
-    with get_pg_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql)
-            row = cur.fetchone()
-    resolved = row["resolved"] or 0
-    within = row["within_sla"] or 0
-    compliance = (within / resolved) * 100 if resolved > 0 else 0
-    return {"sla_compliance_percent": compliance}
+    row = _fetch_analytics("sla_compliance", hours=hours, start=start, end=end)[0]
+    return {"sla_compliance_percent": float(row["sla_compliance_percent"] or 0)}
 
 
 @app.get("/analytics/agent-leaderboard")
-def agent_leaderboard(limit: int = 10):
+def agent_leaderboard(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
     """Return top agents by metric value from agent_metrics."""
-    sql = (
-        "SELECT metric_name, metric_value FROM agent_metrics "
-        "WHERE metric_name LIKE 'agent_%' ORDER BY metric_value DESC LIMIT %s"
+    rows = _fetch_analytics(
+        "agent_leaderboard", start=start, end=end, limit=limit, offset=offset
     )
-    with get_pg_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, (limit,))
-            rows = cur.fetchall()
     leaderboard = [dict(row) for row in rows]
     return {"leaderboard": leaderboard}
 
 
 @app.get("/analytics/document-usage")
-def document_usage():
+def document_usage(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+):
     """Return document retrieval counts from retrieval history."""
-    sql = (
-        "SELECT d.document_id, d.title, COUNT(r.retrieval_id) AS count "
-        "FROM retrieval_history r "
-        "JOIN kb_chunks k ON r.chunk_id = k.chunk_id "
-        "JOIN documents d ON k.document_id = d.document_id "
-        "GROUP BY d.document_id, d.title ORDER BY count DESC"
+    rows = _fetch_analytics(
+        "document_usage", start=start, end=end, limit=limit, offset=offset
     )
-    with get_pg_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
     usage = [dict(row) for row in rows]
     return {"document_usage": usage}
 
 
-def _to_csv(data):
-    output = StringIO()
-    if isinstance(data, list):
-        if not data:
-            return output
-        writer = csv.DictWriter(output, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-    else:
-        writer = csv.writer(output)
-        for k, v in data.items():
-            writer.writerow([k, v])
-    output.seek(0)
-    return output
+def _iter_analytics_batches(sql: str, params: tuple, chunk_size: int):
+    """Yield lists of rows from a named (server-side) cursor.
+
+    Only `chunk_size` rows are held in memory at any time; the connection
+    is closed when the generator is exhausted or the client disconnects.
+    """
+    conn = get_pg_read_conn("/analytics/export")
+    try:
+        with conn.cursor(name=f"analytics_export_{uuid.uuid4().hex}") as cur:
+            cur.itersize = chunk_size
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    finally:
+        conn.close()
+
+
+def _csv_lines(batches):
+    buffer = StringIO()
+    writer = None
+    for rows in batches:
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def _ndjson_lines(batches):
+    for rows in batches:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in rows).encode("utf-8")
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
 
 @app.get("/analytics/export")
-def export_analytics(type: str = Query(...), format: str = Query("json")):
-    """Export analytics data as JSON or CSV."""
+def export_analytics(
+    type: str = Query(...),
+    format: str = Query("json"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    hours: int = 48,
+    gzip: bool = False,
+):
+    """Export analytics data as JSON, CSV or NDJSON.
+
+    CSV and NDJSON exports are streamed from a server-side cursor in
+    `ANALYTICS_EXPORT_CHUNK_SIZE` batches, optionally gzip-compressed, so
+    the response size is not bounded by server memory.
+    """
     mapping = {
-        "ticket_volume": ticket_volume,
-        "resolution_times": resolution_times,
-        "sla_compliance": sla_compliance,
-        "agent_leaderboard": agent_leaderboard,
-        "document_usage": document_usage,
+        "ticket_volume": lambda: ticket_volume(start=start, end=end, limit=limit, offset=offset),
+        "resolution_times": lambda: resolution_times(start=start, end=end),
+        "sla_compliance": lambda: sla_compliance(hours=hours, start=start, end=end),
+        "agent_leaderboard": lambda: agent_leaderboard(limit=limit, offset=offset, start=start, end=end),
+        "document_usage": lambda: document_usage(start=start, end=end, limit=limit, offset=offset),
     }
     if type not in mapping:
         raise HTTPException(status_code=400, detail="invalid analytics type")
-    data = mapping[type]()
+    if format == "json":
+        return mapping[type]()
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="invalid export format")
+
+    sql, params = _analytics_query(
+        type, start=start, end=end, limit=limit, offset=offset, hours=hours
+    )
+    batches = _iter_analytics_batches(sql, params, ANALYTICS_EXPORT_CHUNK_SIZE)
     if format == "csv":
-        csv_data = _to_csv(data.get(next(iter(data)))) if isinstance(data, dict) else _to_csv(data)
-        return StreamingResponse(csv_data, media_type="text/csv")
-    return data
+        body, media_type = _csv_lines(batches), "text/csv"
+    else:
+        body, media_type = _ndjson_lines(batches), "application/x-ndjson"
+    filename = f"{type}.{format}"
+    if gzip:
+        body, media_type, filename = _gzip_chunks(body), "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 # --- LLMChain-powered endpoints ---
@@ -357,56 +877,312 @@ def _get_ticket_summary(ticket_id: int) -> str:
             return row["ticket_summary"]
 
 
+# Prompt templates per chain type. Bump the version whenever a template
+# changes so cached outputs produced by the old wording are not reused.
+TICKET_CHAIN_PROMPTS = {
+    "triage_ticket": (
+        "v1",
+        "You are a helpdesk triage assistant. Given the ticket description below, assign a priority label (low, medium, high).\n{ticket}",
+    ),
+    "root_cause": (
+        "v1",
+        "Analyze the following ticket and provide the most likely root cause in one sentence:\n{ticket}",
+    ),
+    "summarize_ticket": (
+        "v1",
+        "Provide a concise summary of the following ticket:\n{ticket}",
+    ),
+    "followup_actions": (
+        "v1",
+        "Based on this ticket, suggest next best follow-up actions in bullet form:\n{ticket}",
+    ),
+}
+
+chain_cache = ChainResultCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    cost_per_1k_tokens=float(os.getenv("LLM_COST_PER_1K_TOKENS", "0.002")),
+)
+_ticket_chains = {}
+
+
+def _get_ticket_chain(chain_type: str) -> LLMChain:
+    chain = _ticket_chains.get(chain_type)
+    if chain is None:
+        _, template = TICKET_CHAIN_PROMPTS[chain_type]
+        chain = LLMChain(llm=OpenAI(temperature=0.2), prompt=PromptTemplate.from_template(template))
+        _ticket_chains[chain_type] = chain
+    return chain
+
+
+def _lookup_chain_run(chain_type: str, prompt_version: str, input_hash: str) -> Optional[str]:
+    with get_pg_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT output_text FROM llm_chain_runs "
+                "WHERE chain_type = %s AND prompt_version = %s AND input_hash = %s "
+                "ORDER BY created_at DESC LIMIT 1",
+                (chain_type, prompt_version, input_hash),
+            )
+            row = cur.fetchone()
+    return row["output_text"] if row else None
+
+
+def _run_ticket_chain(chain_type: str, ticket_id: int):
+    """Run a ticket chain, reusing a cached output for identical input.
+
+    Returns `(output_text, cached)`.
+    """
+    ticket = _get_ticket_summary(ticket_id)
+    prompt_version, template = TICKET_CHAIN_PROMPTS[chain_type]
+    input_hash = text_hash(ticket)
+    key = (chain_type, prompt_version, input_hash)
+    prompt_text = template.format(ticket=ticket)
+
+    result = chain_cache.get(key)
+    if result is not None:
+        chain_cache.record_hit("memory", prompt_text, result)
+        return result, True
+    result = _lookup_chain_run(chain_type, prompt_version, input_hash)
+    if result is not None:
+        chain_cache.record_hit("db", prompt_text, result)
+        chain_cache.put(key, ticket_id, result)
+        return result, True
+
+    chain_cache.record_miss()
+    result = _get_ticket_chain(chain_type).run(ticket=ticket)
+    store_chain_output(
+        chain_type, {"ticket_id": ticket_id}, result,
+        prompt_version=prompt_version, input_hash=input_hash,
+    )
+    chain_cache.put(key, ticket_id, result)
+    return result, False
+
+
 @app.post("/llm/triage_ticket")
 def triage_ticket(ticket_id: int):
     """Classify ticket priority using an LLM chain"""
-    ticket = _get_ticket_summary(ticket_id)
-    prompt = PromptTemplate.from_template(
-        "You are a helpdesk triage assistant. Given the ticket description below, assign a priority label (low, medium, high).\n{ticket}"
-    )
-    chain = LLMChain(llm=OpenAI(temperature=0.2), prompt=prompt)
-    result = chain.run(ticket=ticket)
-    store_chain_output("triage_ticket", {"ticket_id": ticket_id}, result)
-    return {"ticket_id": ticket_id, "triage": result}
+    result, cached = _run_ticket_chain("triage_ticket", ticket_id)
+    return {"ticket_id": ticket_id, "triage": result, "cached": cached}
 
 
 @app.post("/llm/root_cause")
 def root_cause(ticket_id: int):
     """Return a likely root cause for the ticket"""
-    ticket = _get_ticket_summary(ticket_id)
-    prompt = PromptTemplate.from_template(
-        "Analyze the following ticket and provide the most likely root cause in one sentence:\n{ticket}"
-    )
-    chain = LLMChain(llm=OpenAI(temperature=0.2), prompt=prompt)
-    result = chain.run(ticket=ticket)
-    store_chain_output("root_cause", {"ticket_id": ticket_id}, result)
-    return {"ticket_id": ticket_id, "root_cause": result}
+    result, cached = _run_ticket_chain("root_cause", ticket_id)
+    return {"ticket_id": ticket_id, "root_cause": result, "cached": cached}
 
 
 @app.post("/llm/summarize_ticket")
 def summarize_ticket(ticket_id: int):
     """Summarize the ticket into a short paragraph"""
-    ticket = _get_ticket_summary(ticket_id)
-    prompt = PromptTemplate.from_template(
-        "Provide a concise summary of the following ticket:\n{ticket}"
-    )
-    chain = LLMChain(llm=OpenAI(temperature=0.2), prompt=prompt)
-    result = chain.run(ticket=ticket)
-    store_chain_output("summarize_ticket", {"ticket_id": ticket_id}, result)
-    return {"ticket_id": ticket_id, "summary": result}
+    result, cached = _run_ticket_chain("summarize_ticket", ticket_id)
+    return {"ticket_id": ticket_id, "summary": result, "cached": cached}
 
 
 @app.post("/llm/followup_actions")
 def followup_actions(ticket_id: int):
     """Suggest follow-up actions for the ticket"""
-    ticket = _get_ticket_summary(ticket_id)
-    prompt = PromptTemplate.from_template(
-        "Based on this ticket, suggest next best follow-up actions in bullet form:\n{ticket}"
+    result, cached = _run_ticket_chain("followup_actions", ticket_id)
+    return {"ticket_id": ticket_id, "actions": result, "cached": cached}
+
+
+@app.get("/llm/cache/stats")
+def llm_cache_stats():
+    """Return hit rate and estimated LLM cost saved by the chain cache."""
+    return chain_cache.stats()
+
+
+@app.get("/analytics/writer-stats")
+def analytics_writer_stats():
+    """Return queued, flushed and dropped counts for the analytics writer."""
+    return analytics_writer.stats()
+
+
+# --- Batch ticket chains ---
+
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "4"))
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv("LLM_BATCH_MAX_CONCURRENCY", "16"))
+LLM_BATCH_RATE_PER_SEC = float(os.getenv("LLM_BATCH_RATE_PER_SEC", "5"))
+LLM_BATCH_MAX_TICKETS = int(os.getenv("LLM_BATCH_MAX_TICKETS", "5000"))
+
+
+class RateLimiter:
+    """Token bucket shared by the batch worker threads."""
+
+    def __init__(self, rate_per_sec: float, burst: int = 1):
+        self.rate = rate_per_sec
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class TicketBatchRequest(BaseModel):
+    chain_type: str = Field(
+        "triage_ticket",
+        description="One of triage_ticket, root_cause, summarize_ticket, followup_actions",
+        example="triage_ticket",
+    )
+    ticket_ids: Optional[List[int]] = Field(None, description="Explicit ticket IDs", example=[1, 2, 3])
+    status: Optional[str] = Field(None, description="Filter on current_status", example="open")
+    created_after: Optional[str] = Field(None, description="Filter on created_at", example="2024-01-01")
+    limit: int = Field(1000, ge=1, description="Maximum tickets selected by the filter", example=500)
+    concurrency: int = Field(LLM_BATCH_CONCURRENCY, description="Parallel LLM calls", example=4)
+    rate_per_sec: float = Field(
+        LLM_BATCH_RATE_PER_SEC,
+        gt=0,
+        description="Maximum LLM calls per second (capped at LLM_BATCH_RATE_PER_SEC)",
+        example=5,
+    )
+
+
+def _get_ticket_summaries(req: TicketBatchRequest):
+    """Fetch (ticket_id, ticket_summary) for the whole batch in one query.
+
+    `limit` only bounds filter-based selection; an explicit `ticket_ids`
+    list is taken whole (up to LLM_BATCH_MAX_TICKETS). Returns the rows and
+    the requested ids that matched none.
+    """
+    clauses, params = [], []
+    ticket_ids = list(dict.fromkeys(req.ticket_ids or []))
+    if len(ticket_ids) > LLM_BATCH_MAX_TICKETS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {LLM_BATCH_MAX_TICKETS} ticket_ids per batch"
+        )
+    if ticket_ids:
+        clauses.append("ticket_id = ANY(%s)")
+        params.append(ticket_ids)
+    if req.status:
+        clauses.append("current_status = %s")
+        params.append(req.status)
+    if req.created_after:
+        clauses.append("created_at >= %s")
+        params.append(req.created_after)
+    if not clauses:
+        raise HTTPException(status_code=400, detail="Provide ticket_ids or a filter")
+    sql = (
+        "SELECT ticket_id, ticket_summary FROM external_tickets "
+        f"WHERE {' AND '.join(clauses)} ORDER BY ticket_id"
     )
-    chain = LLMChain(llm=OpenAI(temperature=0.2), prompt=prompt)
-    result = chain.run(ticket=ticket)
-    store_chain_output("followup_actions", {"ticket_id": ticket_id}, result)
-    return {"ticket_id": ticket_id, "actions": result}
+    if not ticket_ids:
+        sql += " LIMIT %s"
+        params.append(min(req.limit, LLM_BATCH_MAX_TICKETS))
+    with get_pg_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, tuple(params))
+            rows = cur.fetchall()
+    found = {r["ticket_id"] for r in rows}
+    return rows, [ticket_id for ticket_id in ticket_ids if ticket_id not in found]
+
+
+def _lookup_chain_runs(chain_type: str, prompt_version: str, input_hashes: List[str]) -> dict:
+    with get_pg_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT DISTINCT ON (input_hash) input_hash, output_text FROM llm_chain_runs "
+                "WHERE chain_type = %s AND prompt_version = %s AND input_hash = ANY(%s) "
+                "ORDER BY input_hash, created_at DESC",
+                (chain_type, prompt_version, input_hashes),
+            )
+            return {r["input_hash"]: r["output_text"] for r in cur.fetchall()}
+
+
+def _store_chain_outputs(rows: List[tuple]):
+    """Persist a batch of chain runs with a single multi-row INSERT."""
+    if not rows:
+        return
+    with get_pg_conn() as conn:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                "INSERT INTO llm_chain_runs (run_id, chain_type, input_data, output_text, created_at, prompt_version, input_hash) VALUES %s",
+                rows,
+                page_size=len(rows),
+            )
+            conn.commit()
+
+
+@app.post("/llm/batch")
+def batch_ticket_chain(req: TicketBatchRequest):
+    """Run one ticket chain over many tickets and stream results as NDJSON.
+
+    Summaries are fetched in one query, cached outputs are reused, and the
+    remaining LLM calls run on at most `concurrency` threads throttled to
+    `rate_per_sec`; both are capped by the server settings. Requested ids
+    with no ticket get a "not found" line. New outputs are written to
+    `llm_chain_runs` in a single insert once the batch finishes; if the
+    client disconnects, calls already running finish and are stored too.
+    """
+    if req.chain_type not in TICKET_CHAIN_PROMPTS:
+        raise HTTPException(status_code=400, detail="invalid chain type")
+    tickets, missing = _get_ticket_summaries(req)
+    prompt_version, template = TICKET_CHAIN_PROMPTS[req.chain_type]
+    hashes = {t["ticket_id"]: text_hash(t["ticket_summary"]) for t in tickets}
+    stored = _lookup_chain_runs(req.chain_type, prompt_version, list(set(hashes.values())))
+    chain = _get_ticket_chain(req.chain_type)
+    workers = max(1, min(req.concurrency, LLM_BATCH_MAX_CONCURRENCY))
+    limiter = RateLimiter(min(req.rate_per_sec, LLM_BATCH_RATE_PER_SEC), burst=workers)
+    pending_rows = []  # appended by the worker threads
+
+    def run_one(ticket_id: int, ticket: str):
+        key = (req.chain_type, prompt_version, hashes[ticket_id])
+        prompt_text = template.format(ticket=ticket)
+        result = chain_cache.get(key)
+        if result is not None:
+            chain_cache.record_hit("memory", prompt_text, result)
+            return ticket_id, result, True
+        result = stored.get(hashes[ticket_id])
+        if result is not None:
+            chain_cache.record_hit("db", prompt_text, result)
+            chain_cache.put(key, ticket_id, result)
+            return ticket_id, result, True
+        chain_cache.record_miss()
+        limiter.acquire()
+        result = chain.run(ticket=ticket)
+        chain_cache.put(key, ticket_id, result)
+        pending_rows.append((
+            str(uuid.uuid4()), req.chain_type, json.dumps({"ticket_id": ticket_id}),
+            result, datetime.utcnow(), prompt_version, hashes[ticket_id],
+        ))
+        return ticket_id, result, False
+
+    def results():
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for ticket_id in missing:
+                yield json.dumps({"ticket_id": ticket_id, "error": "not found"}) + "\n"
+            futures = {
+                executor.submit(run_one, t["ticket_id"], t["ticket_summary"]): t["ticket_id"]
+                for t in tickets
+            }
+            for future in as_completed(futures):
+                ticket_id = futures[future]
+                try:
+                    _, result, cached = future.result()
+                except Exception as exc:
+                    yield json.dumps({"ticket_id": ticket_id, "error": str(exc)}) + "\n"
+                    continue
+                yield json.dumps({"ticket_id": ticket_id, "result": result, "cached": cached}) + "\n"
+        finally:
+            # queued calls are dropped, running ones are paid for: wait and keep them
+            executor.shutdown(wait=True, cancel_futures=True)
+            _store_chain_outputs(pending_rows)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 
 class TeamsPayload(BaseModel):
@@ -414,7 +1190,7 @@ class TeamsPayload(BaseModel):
 
 
 @tool
-@app.post("/notify/teams")
+@app.post("/notify/teams", status_code=202)
 def notify_teams(payload: TeamsPayload):
     """Send a Microsoft Teams message."""
     return post_to_teams(payload.message)
@@ -431,12 +1207,73 @@ class PagerDutyPayload(BaseModel):
 
 
 @tool
-@app.post("/notify/pagerduty")
+@app.post("/notify/pagerduty", status_code=202)
 def notify_pagerduty(payload: PagerDutyPayload):
     """Trigger a PagerDuty incident."""
     return trigger_pagerduty(payload.summary, payload.severity, payload.source)
 
 
+@app.get("/dense-replica/stats")
+def dense_replica_stats():
+    if dense_replica is None:
+        return {"ready": False, "enabled": False}
+    return dict(dense_replica.stats(), enabled=True, max_lag_seconds=DENSE_REPLICA_MAX_LAG)
+
+
+@app.get("/dense-projection/stats")
+def dense_projection_stats():
+    """Active reduced-dimension projection and how many chunks carry it."""
+    if DENSE_FIRST_PASS != "reduced":
+        return {"enabled": False}
+    with get_pg_read_conn("/dense-projection/stats") as conn:
+        with conn.cursor() as cur:
+            projection = active_projection(cur)
+            if projection is None:
+                return {"enabled": True, "active": False}
+            cur.execute(
+                "SELECT count(*) AS rows, count(*) FILTER (WHERE embedding_reduced_version = %s) AS projected "
+                "FROM kb_chunks",
+                (projection.version,),
+            )
+            counts = cur.fetchone()
+    return dict(projection.stats(), enabled=True, active=True, rows=counts["rows"], projected=counts["projected"])
+
+
+@app.get("/db-routing/stats")
+def db_routing_stats():
+    """Replica lag and state, and per route the connections and queries sent to each target."""
+    return {"agentdb": agent_read_router.stats()}
+
+
+@app.get("/adaptive-depth/stats")
+def adaptive_depth_stats():
+    """Adaptive retrieval depth decisions, chunks kept and confidence per action on /search."""
+    if adaptive_depth is None:
+        return {"enabled": False}
+    return dict(adaptive_depth.stats(), enabled=True)
+
+
+@app.get("/kb-shards/stats")
+def kb_shards_stats():
+    """Shard map and per-shard calls, timeouts, errors and latency of /search."""
+    if kb_shard_map is None:
+        return {"enabled": False}
+    return dict(kb_shard_map.stats(), enabled=True, **kb_scatter.stats())
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint for the request-path histograms."""
+    body, content_type = metrics_payload()
+    return Response(body, media_type=content_type)
+
+
+@app.get("/notify/stats")
+def notify_stats():
+    """Return notification queue depth, outcomes and delivery latency."""
+    return notifier.stats()
+
+
 @app.get("/.well-known/ai-plugin.json", include_in_schema=False)
 def plugin_manifest(request: Request):
     """Return FastMCP tool metadata."""
@@ -0,0 +1,151 @@
+"""
+Background delivery of Teams and PagerDuty notifications.
+
+Endpoints enqueue a notification and return immediately.  Worker threads
+deliver over a pooled keep-alive `requests.Session` with explicit timeouts
+and retry transient failures with exponential backoff plus jitter.
+Identical notifications enqueued within `dedup_window` seconds are
+coalesced into the first one; if that one finally fails, its key is
+released so the next duplicate is queued rather than coalesced.
+"""
+
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queue: int = 1000,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        dedup_window: float = 60.0,
+    ):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(workers, 4))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.dedup_window = dedup_window
+        self.workers = workers
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._recent: Dict[str, float] = {}
+        self._latencies = deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self.enqueued = 0
+        self.delivered = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"notifier-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self.session.close()
+
+    def enqueue(self, channel: str, url: str, payload: dict, dedup_key: Optional[str] = None) -> str:
+        """Queue a POST of `payload` to `url`; returns queued, coalesced or dropped."""
+        key = dedup_key or hashlib.sha256(
+            (channel + json.dumps(payload, sort_keys=True)).encode("utf-8")
+        ).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            seen = self._recent.get(key)
+            if seen is not None and now - seen < self.dedup_window:
+                self.coalesced += 1
+                return "coalesced"
+            if len(self._recent) > 10000:
+                self._recent = {
+                    k: t for k, t in self._recent.items() if now - t < self.dedup_window
+                }
+            self._recent[key] = now
+        try:
+            self._queue.put_nowait((channel, url, payload, now, key))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._recent.pop(key, None)
+            return "dropped"
+        with self._lock:
+            self.enqueued += 1
+        return "queued"
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "queue_depth": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "delivery_latency_p50_ms": _percentile(latencies, 0.50),
+                "delivery_latency_p95_ms": _percentile(latencies, 0.95),
+            }
+
+    def _deliver(self, channel: str, url: str, payload: dict) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = self.session.post(url, json=payload, timeout=self.timeout)
+                if resp.status_code < 400:
+                    return True
+                # Client errors other than throttling will not succeed on retry
+                if resp.status_code < 500 and resp.status_code != 429:
+                    print(f"{channel} notification rejected: HTTP {resp.status_code}")
+                    return False
+            except requests.RequestException as exc:
+                print(f"{channel} notification attempt {attempt + 1} failed: {exc}")
+            if attempt < self.max_retries:
+                delay = self.backoff_base * (2 ** attempt)
+                time.sleep(random.uniform(0, delay))
+        return False
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                channel, url, payload, enqueued_at, key = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            ok = self._deliver(channel, url, payload)
+            with self._lock:
+                if ok:
+                    self.delivered += 1
+                    self._latencies.append((time.monotonic() - enqueued_at) * 1000)
+                else:
+                    self.failed += 1
+                    # nothing was delivered: let the next duplicate through
+                    if self._recent.get(key) == enqueued_at:
+                        del self._recent[key]
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
@@ -6,9 +6,11 @@ CREATE TABLE documents (
   document_id   BIGSERIAL PRIMARY KEY,
   title         TEXT NOT NULL,
   source_path   TEXT NOT NULL,       -- URL or filesystem path
+  category      TEXT,                -- categories.name in documents_db; chat facet filter
   created_at    TIMESTAMPTZ DEFAULT now(),
   updated_at    TIMESTAMPTZ DEFAULT now()
 );
+CREATE INDEX documents_category_idx ON documents (category);
 
 -- 1.3 Knowledge base chunks with embeddings
 CREATE TABLE kb_chunks (
@@ -38,6 +40,35 @@ CREATE INDEX kb_chunks_metadata_gin_idx
 CREATE INDEX kb_chunks_embedding_diskann_idx
   ON kb_chunks
   USING diskann (embedding vector_l2_ops);
+-- Smaller first-pass indexes (halfvec / binary-quantized) and storing the
+-- embeddings as halfvec: see migrations/quantized_embedding_indexes.sql and
+-- migrations/store_embeddings_halfvec.sql.
+-- A PCA/Matryoshka projection to fewer dimensions for the first pass:
+-- migrations/reduced_embedding_projection.sql.
+-- Splitting kb_chunks across several databases (RAG_Scripts/kb_shards.py):
+-- migrations/kb_shard_schema.sql creates each shard.
+
+-- Change counter for kb_chunks, bumped once per modifying statement. The
+-- FastAPI backend polls it and drops its semantic answer cache on change.
+-- Existing databases: migrations/kb_chunks_version.sql.
+CREATE TABLE kb_chunks_version (
+  singleton   BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+  version     BIGINT NOT NULL DEFAULT 0,
+  changed_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO kb_chunks_version DEFAULT VALUES;
+
+CREATE FUNCTION bump_kb_chunks_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE kb_chunks_version SET version = version + 1, changed_at = now();
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER kb_chunks_version_bump
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON kb_chunks
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_kb_chunks_version();
 
 -- Create a combined DiskANN index that also filters by labels
 CREATE INDEX documents_diskann_labels_idx
@@ -124,6 +155,20 @@ CREATE TABLE agent_metrics (
   measured_at   TIMESTAMPTZ DEFAULT now()
 );
 
+-- Outputs of the MCP server's LLM chains (also created by its startup migration)
+CREATE TABLE llm_chain_runs (
+  run_id          UUID PRIMARY KEY,
+  chain_type      TEXT NOT NULL,
+  input_data      JSONB NOT NULL,
+  output_text     TEXT NOT NULL,
+  prompt_version  TEXT,
+  input_hash      TEXT,                      -- sha256 of the chain input text
+  created_at      TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX llm_chain_runs_cache_idx
+  ON llm_chain_runs (chain_type, prompt_version, input_hash, created_at DESC);
+
 
 -- Connection to external ticketing system
 CREATE TABLE external_tickets (
@@ -182,6 +227,14 @@ CREATE TABLE ticket_problem_links (
   created_at      TIMESTAMPTZ DEFAULT now()
 );
 
+-- Related-solutions lookups: links by ticket (also the ON CONFLICT target of
+-- /api/link-problem) and the top validated solutions per problem
+CREATE UNIQUE INDEX ticket_problem_links_ticket_problem_idx
+  ON ticket_problem_links (ticket_id, problem_id);
+CREATE INDEX solutions_validated_problem_idx
+  ON solutions (problem_id, effectiveness DESC)
+  WHERE is_validated;
+
 
 -- Link documents/KB chunks to problems and solutions
 CREATE TABLE knowledge_links (
@@ -0,0 +1,19 @@
+-- Document category for facet-filtered chat retrieval
+--
+-- POST /chat/stream filters such as {"categories": ["PostgreSQL DBA"]} match
+-- documents.category (see RAG_Scripts/facet_filters.py); every other facet
+-- matches kb_chunks.metadata through its GIN index.
+--
+--   psql -d agentdb -v ON_ERROR_STOP=1 -f database_AI_agent/migrations/document_category_filter.sql
+--
+-- category is the document's categories.name in documents_db, the values
+-- GET /metadata offers. Rows stay NULL (never matched by a category filter)
+-- until they are filled in, after this migration and after ingesting new
+-- documents:
+--
+--   python RAG_Scripts/facet_filters.py backfill-categories
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS category TEXT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_category_idx
+  ON documents (category);
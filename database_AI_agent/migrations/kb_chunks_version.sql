@@ -0,0 +1,30 @@
+-- Change counter for kb_chunks (semantic answer cache invalidation)
+--
+-- The FastAPI backend polls kb_chunks_version every
+-- SEMANTIC_CACHE_VERSION_CHECK seconds and drops its semantic answer cache
+-- when the version changes (see RAG_Scripts/semantic_cache.py). Until this
+-- table exists the cache stores no answers.
+--
+--   psql -d agentdb -v ON_ERROR_STOP=1 -f database_AI_agent/migrations/kb_chunks_version.sql
+--
+-- Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS kb_chunks_version (
+  singleton   BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+  version     BIGINT NOT NULL DEFAULT 0,
+  changed_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO kb_chunks_version DEFAULT VALUES ON CONFLICT (singleton) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_kb_chunks_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE kb_chunks_version SET version = version + 1, changed_at = now();
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS kb_chunks_version_bump ON kb_chunks;
+CREATE TRIGGER kb_chunks_version_bump
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON kb_chunks
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_kb_chunks_version();
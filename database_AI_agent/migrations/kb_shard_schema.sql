@@ -0,0 +1,47 @@
+-- Schema of one kb_chunks shard (see RAG_Scripts/kb_shards.py)
+--
+-- Run on every database listed in KB_SHARD_URLS, then fill them from the
+-- agent database with `python RAG_Scripts/kb_shards.py sync`:
+--
+--   psql -d kbshard0 -v ON_ERROR_STOP=1 -f database_AI_agent/migrations/kb_shard_schema.sql
+--
+-- Shards hold copies: ids come from the agent database (no sequences here)
+-- and there is no foreign key, so sync can write chunks and documents in any
+-- order. Match the agent database's EMBEDDING_STORAGE (use HALFVEC(1536) and
+-- halfvec_cosine_ops after store_embeddings_halfvec.sql) and add the
+-- quantized_embedding_indexes.sql indexes when DENSE_FIRST_PASS uses them.
+-- kb_shard_sync records the last agent-database chunk_id sync has passed;
+-- re-running this file on an existing shard adds it (the next sync then
+-- starts from the beginning once).
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS documents (
+  document_id   BIGINT PRIMARY KEY,
+  title         TEXT NOT NULL,
+  source_path   TEXT NOT NULL,
+  category      TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_category_idx ON documents (category);
+
+CREATE TABLE IF NOT EXISTS kb_chunks (
+  chunk_id          BIGINT PRIMARY KEY,
+  document_id       BIGINT NOT NULL,
+  chunk_text        TEXT NOT NULL,
+  embedding         VECTOR(1536) NOT NULL,
+  sparse_embedding  SPARSEVEC(30522),
+  metadata          JSONB,
+  inserted_at       TIMESTAMPTZ DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS kb_chunks_document_id_idx ON kb_chunks (document_id);
+CREATE INDEX IF NOT EXISTS kb_chunks_metadata_gin_idx ON kb_chunks USING GIN (metadata);
+CREATE INDEX IF NOT EXISTS kb_chunks_embedding_hnsw_idx
+  ON kb_chunks
+  USING hnsw (embedding vector_cosine_ops);
+
+CREATE TABLE IF NOT EXISTS kb_shard_sync (
+  singleton      BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+  last_chunk_id  BIGINT NOT NULL DEFAULT 0,
+  synced_at      TIMESTAMPTZ
+);
+INSERT INTO kb_shard_sync DEFAULT VALUES ON CONFLICT (singleton) DO NOTHING;
@@ -0,0 +1,24 @@
+-- Reduced-precision HNSW indexes over kb_chunks.embedding (pgvector >= 0.7)
+--
+-- Expression indexes: no new column and no table rewrite, and ingestion keeps
+-- writing `embedding` only. The first pass of dense retrieval walks one of
+-- them for DENSE_RESCORE_CANDIDATES rows, which are then rescored exactly
+-- against `embedding` (see RAG_Scripts/quantized_search.py; the expressions
+-- must match it). Build both or only the one selected by DENSE_FIRST_PASS.
+--
+--   psql -d agentdb -f database_AI_agent/migrations/quantized_embedding_indexes.sql
+--
+-- CONCURRENTLY keeps kb_chunks writable during the build; run with
+-- maintenance_work_mem large enough to hold the index for a fast build.
+-- If embedding was converted to halfvec (store_embeddings_halfvec.sql), the
+-- halfvec first pass uses that column's own index instead of the first one.
+
+-- fp16: half the size of an fp32 HNSW index, near-identical recall
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kb_chunks_embedding_halfvec_hnsw_idx
+  ON kb_chunks
+  USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops);
+
+-- 1 bit per dimension: 1/32 of fp32; needs a generous candidate count
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kb_chunks_embedding_bit_hnsw_idx
+  ON kb_chunks
+  USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops);
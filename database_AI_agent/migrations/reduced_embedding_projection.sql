@@ -0,0 +1,29 @@
+-- Reduced-dimension copy of kb_chunks.embedding for the first pass of dense
+-- retrieval (DENSE_FIRST_PASS=reduced, see RAG_Scripts/dense_projection.py).
+--
+-- Adds nullable columns only (no table rewrite). The column has no fixed
+-- dimension yet: `dense_projection.py activate` sets it to the projection's
+-- dimension, fills it and builds the HNSW index.
+--
+--   psql -d agentdb -v ON_ERROR_STOP=1 -f database_AI_agent/migrations/reduced_embedding_projection.sql
+
+-- Fitted projections; exactly one is active. mean/components are float32
+-- arrays (source_dim and dim x source_dim), NULL for Matryoshka truncation.
+CREATE TABLE IF NOT EXISTS kb_embedding_projections (
+  version             SERIAL PRIMARY KEY,
+  method              TEXT NOT NULL CHECK (method IN ('pca', 'matryoshka')),
+  source_dim          INT NOT NULL,
+  dim                 INT NOT NULL,
+  mean                BYTEA,
+  components          BYTEA,
+  explained_variance  REAL,
+  sample_rows         INT NOT NULL DEFAULT 0,
+  active              BOOLEAN NOT NULL DEFAULT FALSE,
+  created_at          TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE UNIQUE INDEX IF NOT EXISTS kb_embedding_projections_active_idx
+  ON kb_embedding_projections (active) WHERE active;
+
+ALTER TABLE kb_chunks
+  ADD COLUMN IF NOT EXISTS embedding_reduced          VECTOR,
+  ADD COLUMN IF NOT EXISTS embedding_reduced_version  INT;
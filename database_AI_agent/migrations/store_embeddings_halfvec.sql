@@ -0,0 +1,33 @@
+-- Store kb_chunks.embedding as halfvec(1536) instead of vector(1536)
+--
+-- Halves the heap/TOAST size of the embeddings (6 KB -> 3 KB per chunk);
+-- rescoring then runs against fp16 values. Rewrites the table under an
+-- ACCESS EXCLUSIVE lock, so run it in a maintenance window, then set
+-- EMBEDDING_STORAGE=halfvec for the backend, MCP server and ingestion.
+--
+--   psql -d agentdb -v ON_ERROR_STOP=1 -f database_AI_agent/migrations/store_embeddings_halfvec.sql
+--
+-- To go back: ALTER COLUMN embedding TYPE vector(1536) USING embedding::vector(1536)
+-- (the fp32 precision lost by the conversion does not come back).
+
+BEGIN;
+
+-- fp32-specific indexes; rebuilt below for halfvec
+DROP INDEX IF EXISTS kb_chunks_embedding_diskann_idx;
+DROP INDEX IF EXISTS kb_chunks_embedding_halfvec_hnsw_idx;
+DROP INDEX IF EXISTS kb_chunks_embedding_bit_hnsw_idx;
+
+ALTER TABLE kb_chunks
+  ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536);
+
+COMMIT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kb_chunks_embedding_hnsw_idx
+  ON kb_chunks
+  USING hnsw (embedding halfvec_cosine_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kb_chunks_embedding_bit_hnsw_idx
+  ON kb_chunks
+  USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops);
+
+ANALYZE kb_chunks;
@@ -11,4 +11,14 @@ if [[ -n "$METRICS_EXPORTER_VENV_PATH" && -d "$METRICS_EXPORTER_VENV_PATH" ]]; t
     source "$METRICS_EXPORTER_VENV_PATH/bin/activate"
 fi
 
+# Per-worker metric files aggregated by the metrics exporter
+export PROMETHEUS_MULTIPROC_DIR
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Databases and credentials for the Postgres-side metrics
+export PG_HOST PG_PORT PG_APP_USER PG_APP_PASSWORD
+export PG_AI_AGENT_DB PG_DOCUMENTS_DB PG_SD_DB
+export PG_METRICS_INTERVAL PG_METRICS_TABLES PG_METRICS_TOP_STATEMENTS
+export PG_METRICS_USER PG_METRICS_PASSWORD
+
 exec python "$REPO_ROOT/monitoring/metrics_exporter.py"
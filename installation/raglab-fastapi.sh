@@ -25,8 +25,65 @@ export PG_APP_PASSWORD
 export DATABASE_URL="postgresql+asyncpg://${PG_APP_USER}:${PG_APP_PASSWORD}@${PG_HOST}:${PG_PORT}/${PG_AI_AGENT_DB}"
 export DOCUMENT_DB_URL="postgresql+asyncpg://${PG_APP_USER}:${PG_APP_PASSWORD}@${PG_HOST}:${PG_PORT}/${PG_DOCUMENTS_DB}"
 export SD_DB_URL="postgresql+asyncpg://${PG_APP_USER}:${PG_APP_PASSWORD}@${PG_HOST}:${PG_PORT}/${PG_SD_DB}"
+
+# Read replicas: the same database on every host[:port] of PG_REPLICA_HOSTS
+replica_urls() {
+    local urls="" host
+    for host in ${PG_REPLICA_HOSTS//,/ }; do
+        urls="${urls:+$urls,}postgresql+asyncpg://${PG_APP_USER}:${PG_APP_PASSWORD}@${host}/$1"
+    done
+    echo "$urls"
+}
+export DATABASE_REPLICA_URLS="$(replica_urls "$PG_AI_AGENT_DB")"
+export DOCUMENT_DB_REPLICA_URLS="$(replica_urls "$PG_DOCUMENTS_DB")"
+export SD_DB_REPLICA_URLS="$(replica_urls "$PG_SD_DB")"
+export REPLICA_MAX_LAG_SECONDS REPLICA_LAG_CHECK_INTERVAL
 export MCP_SERVERS="http://${MCP_HOST}:${MCP_PORT}"
 
+# Per-worker metric files aggregated by the metrics exporter
+export PROMETHEUS_MULTIPROC_DIR
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# On-demand request profiles (downloadable from /debug/profiles)
+export RAGLAB_PROFILE_TOKEN RAGLAB_PROFILE_SAMPLE_RATE RAGLAB_PROFILE_DIR
+mkdir -p "$RAGLAB_PROFILE_DIR"
+
+# SQL accounting and slow-query logging
+export DB_SLOW_QUERY_MS DB_SLOW_QUERY_SAMPLE_RATE DB_QUERY_LOG_SAMPLE_RATE DB_N_PLUS_ONE_THRESHOLD
+
+# Sparse encoder loading
+export SPARSE_WARMUP
+
+# Semantic answer cache
+export SEMANTIC_CACHE_SIZE SEMANTIC_CACHE_TTL SEMANTIC_CACHE_THRESHOLD SEMANTIC_CACHE_VERSION_CHECK
+
+# In-process dense replica (disabled when DENSE_REPLICA_DIR is empty)
+export DENSE_REPLICA_DIR DENSE_REPLICA_NPROBE DENSE_REPLICA_REFRESH_INTERVAL DENSE_REPLICA_MAX_LAG
+if [ -n "$DENSE_REPLICA_DIR" ]; then mkdir -p "$DENSE_REPLICA_DIR"; fi
+
+# Reduced-precision dense first pass with exact rescoring
+export EMBEDDING_STORAGE DENSE_FIRST_PASS DENSE_RESCORE_CANDIDATES DENSE_PROJECTION_CHECK_INTERVAL
+
+# Facet-filtered retrieval planning
+export FILTER_EXACT_MAX_ROWS FILTER_MAX_SCAN_TUPLES FILTER_PLAN_CACHE_TTL
+
+# Cross-encoder rerank
+export RERANK_ENABLED RERANK_MODEL RERANK_CANDIDATES RERANK_TOP_K RERANK_BUDGET_MS RERANK_BATCH_SIZE RERANK_THREADS
+
+# Adaptive retrieval depth
+export ADAPTIVE_DEPTH_ENABLED ADAPTIVE_MIN_K ADAPTIVE_MAX_K ADAPTIVE_AGREEMENT ADAPTIVE_MIN_CONFIDENCE
+export ADAPTIVE_DROP_OFF ADAPTIVE_WIDEN_FACTOR ADAPTIVE_WIDE_EF_SEARCH
+
+# Sentence-level context compression
+export CONTEXT_COMPRESSION_ENABLED CONTEXT_TOKEN_BUDGET CONTEXT_COMPRESSION_BUDGET_MS CONTEXT_MIN_SENTENCE_CHARS
+export CONTEXT_EMBED_CACHE_SIZE CONTEXT_EMBED_CACHE_TTL
+
+# Sharded kb_chunks (disabled when KB_SHARD_URLS is empty)
+export KB_SHARD_URLS KB_SHARD_STRATEGY KB_SHARD_CATEGORIES KB_SHARD_DEADLINE_MS
+
+# Distributed tracing (no-op unless RAGLAB_TRACE_EXPORTER is set)
+export RAGLAB_TRACE_EXPORTER RAGLAB_TRACE_FILE RAGLAB_TRACE_SAMPLE_RATIO OTEL_EXPORTER_OTLP_ENDPOINT
+
 # Run FastAPI app
 cd "$REPO_ROOT/RAG_Scripts"
 exec uvicorn main:app --host "$FASTAPI_HOST" --port "$FASTAPI_PORT"
@@ -25,6 +25,39 @@ export PG_APP_PASSWORD
 export AI_AGENT_DB_URL="dbname=${PG_AI_AGENT_DB} user=${PG_APP_USER} password=${PG_APP_PASSWORD} host=${PG_HOST} port=${PG_PORT}"
 export PGVECTOR_CONN_STR="postgresql+psycopg2://${PG_APP_USER}:${PG_APP_PASSWORD}@${PG_HOST}:${PG_PORT}/${PG_AI_AGENT_DB}"
 
+# Read replicas of the AI agent database (libpq DSNs, comma-separated)
+AI_AGENT_DB_REPLICA_URLS=""
+for host in ${PG_REPLICA_HOSTS//,/ }; do
+    port="$PG_PORT"
+    if [[ "$host" == *:* ]]; then port="${host#*:}"; host="${host%%:*}"; fi
+    AI_AGENT_DB_REPLICA_URLS="${AI_AGENT_DB_REPLICA_URLS:+$AI_AGENT_DB_REPLICA_URLS,}dbname=${PG_AI_AGENT_DB} user=${PG_APP_USER} password=${PG_APP_PASSWORD} host=${host} port=${port}"
+done
+export AI_AGENT_DB_REPLICA_URLS REPLICA_MAX_LAG_SECONDS REPLICA_LAG_CHECK_INTERVAL
+
+# Per-worker metric files aggregated by the metrics exporter
+export PROMETHEUS_MULTIPROC_DIR
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# On-demand request profiles (downloadable from /debug/profiles)
+export RAGLAB_PROFILE_TOKEN RAGLAB_PROFILE_SAMPLE_RATE RAGLAB_PROFILE_DIR
+mkdir -p "$RAGLAB_PROFILE_DIR"
+
+# Distributed tracing (no-op unless RAGLAB_TRACE_EXPORTER is set)
+export RAGLAB_TRACE_EXPORTER RAGLAB_TRACE_FILE RAGLAB_TRACE_SAMPLE_RATIO OTEL_EXPORTER_OTLP_ENDPOINT
+
+# In-process dense replica, refreshed by the FastAPI backend
+export DENSE_REPLICA_DIR DENSE_REPLICA_NPROBE DENSE_REPLICA_MAX_LAG
+
+# Reduced-precision dense first pass with exact rescoring
+export EMBEDDING_STORAGE DENSE_FIRST_PASS DENSE_RESCORE_CANDIDATES DENSE_PROJECTION_CHECK_INTERVAL
+
+# Adaptive retrieval depth
+export ADAPTIVE_DEPTH_ENABLED ADAPTIVE_MIN_K ADAPTIVE_MAX_K ADAPTIVE_AGREEMENT ADAPTIVE_MIN_CONFIDENCE
+export ADAPTIVE_DROP_OFF ADAPTIVE_WIDEN_FACTOR ADAPTIVE_WIDE_EF_SEARCH
+
+# Sharded kb_chunks (disabled when KB_SHARD_URLS is empty)
+export KB_SHARD_URLS KB_SHARD_STRATEGY KB_SHARD_CATEGORIES KB_SHARD_DEADLINE_MS
+
 # Run MCP server (FastAPI app)
 cd "$REPO_ROOT/custom-agent-tools-py"
 exec uvicorn main:app --host "$MCP_HOST" --port "$MCP_PORT"
@@ -1,11 +1,18 @@
 import os
 import time
 import psutil
-from prometheus_client import start_http_server, Gauge, Counter
+from prometheus_client import start_http_server, Gauge, CollectorRegistry, REGISTRY
+from prometheus_client import multiprocess
 
-REQUEST_COUNT = Counter('raglab_requests_total', 'Total requests processed')
-CPU_GAUGE = Gauge('raglab_cpu_percent', 'CPU usage percent')
-MEMORY_GAUGE = Gauge('raglab_memory_percent', 'Memory usage percent')
+import pg_metrics
+
+# Host gauges; in multiprocess mode they are written to PROMETHEUS_MULTIPROC_DIR
+# like the app metrics and reported once (latest live value).
+CPU_GAUGE = Gauge('raglab_cpu_percent', 'CPU usage percent', multiprocess_mode='livemax')
+MEMORY_GAUGE = Gauge('raglab_memory_percent', 'Memory usage percent', multiprocess_mode='livemax')
+
+# Catalog queries are cheap but not free; pg_stat_statements moves slowly
+PG_METRICS_INTERVAL = float(os.getenv('PG_METRICS_INTERVAL', '30'))
 
 
 def collect_metrics():
@@ -13,12 +20,32 @@ def collect_metrics():
     MEMORY_GAUGE.set(psutil.virtual_memory().percent)
 
 
+def build_registry():
+    """Aggregate the per-worker files written by the FastAPI and MCP apps.
+
+    Without PROMETHEUS_MULTIPROC_DIR only the host gauges are exported.
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
 def main():
     host = os.getenv('METRICS_EXPORTER_HOST', '0.0.0.0')
     port = int(os.getenv('METRICS_EXPORTER_PORT', '9100'))
-    start_http_server(port, addr=host)
+    registry = build_registry()
+    pg_collector = pg_metrics.from_env()
+    if pg_collector is not None:
+        registry.register(pg_collector)
+    start_http_server(port, addr=host, registry=registry)
+    next_pg_refresh = 0.0
     while True:
         collect_metrics()
+        if pg_collector is not None and time.monotonic() >= next_pg_refresh:
+            pg_collector.refresh()
+            next_pg_refresh = time.monotonic() + PG_METRICS_INTERVAL
         time.sleep(5)
 
 
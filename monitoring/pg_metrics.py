@@ -0,0 +1,245 @@
+"""Postgres-side retrieval metrics for the metrics exporter.
+
+`PostgresCollector.refresh()` runs a handful of catalog queries against each
+configured database and caches the result; `collect()` serves the cache so a
+Prometheus scrape never waits on the database.
+
+Collected per refresh:
+
+* `pg_stat_statements` (cluster-wide, if the extension is installed): the
+  `PG_METRICS_TOP_STATEMENTS` slowest statements by mean time and the same
+  number of most frequently called ones.
+* Per vector index (hnsw / ivfflat / diskann access methods, plus every
+  index on the tables in `PG_METRICS_TABLES`): size, buffer hits/reads and
+  scans.  `rate(raglab_pg_index_blocks_read_total)` rising is the early sign
+  of an index falling out of shared_buffers.
+* Per table in `PG_METRICS_TABLES` (default `kb_chunks`): live and dead
+  tuple estimates, size and time since the last vacuum.
+* Connections per database and state, and `max_connections`.
+"""
+
+import os
+import re
+import time
+
+import psycopg2
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+VECTOR_INDEX_METHODS = ("hnsw", "ivfflat", "diskann")
+
+STATEMENTS_SQL = """
+SELECT d.datname, s.queryid::text, s.query, s.calls,
+       s.{total} / 1000.0 AS total_seconds,
+       s.{mean} / 1000.0  AS mean_seconds,
+       s.rows, s.shared_blks_hit, s.shared_blks_read
+  FROM pg_stat_statements s
+  JOIN pg_database d ON d.oid = s.dbid
+ WHERE d.datname = ANY(%s)
+ ORDER BY {order} DESC
+ LIMIT %s
+"""
+
+INDEX_SQL = """
+SELECT s.relname, s.indexrelname, am.amname,
+       pg_relation_size(s.indexrelid) AS bytes,
+       io.idx_blks_hit, io.idx_blks_read, s.idx_scan
+  FROM pg_stat_user_indexes s
+  JOIN pg_statio_user_indexes io ON io.indexrelid = s.indexrelid
+  JOIN pg_class c ON c.oid = s.indexrelid
+  JOIN pg_am am ON am.oid = c.relam
+ WHERE am.amname = ANY(%s) OR s.relname = ANY(%s)
+"""
+
+TABLE_SQL = """
+SELECT relname, n_live_tup, n_dead_tup,
+       pg_total_relation_size(relid) AS bytes,
+       EXTRACT(EPOCH FROM now() - GREATEST(last_vacuum, last_autovacuum)) AS since_vacuum
+  FROM pg_stat_user_tables
+ WHERE relname = ANY(%s)
+"""
+
+CONNECTIONS_SQL = """
+SELECT datname, COALESCE(state, 'unknown'), count(*)
+  FROM pg_stat_activity
+ WHERE datname = ANY(%s)
+ GROUP BY 1, 2
+"""
+
+
+def _short_query(text: str, limit: int = 160) -> str:
+    text = re.sub(r"\s+", " ", text or "").strip()
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+class PostgresCollector:
+    """Cache of Postgres metrics, refreshed by the exporter's main loop."""
+
+    def __init__(self, dsns, tables=("kb_chunks",), top_statements=10, statement_timeout_ms=5000):
+        # dsns: {database label: libpq connection string}
+        self.dsns = dict(dsns)
+        self.tables = list(tables)
+        self.top_statements = top_statements
+        self.statement_timeout_ms = statement_timeout_ms
+        self._conns = {}
+        self._families = []
+        self._statements_columns = None
+        self._warned = set()
+
+    def _conn(self, name):
+        conn = self._conns.get(name)
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(
+                self.dsns[name],
+                application_name="raglab-metrics",
+                options=f"-c statement_timeout={self.statement_timeout_ms}",
+                connect_timeout=5,
+            )
+            conn.autocommit = True
+            self._conns[name] = conn
+        return conn
+
+    def _warn_once(self, key, message):
+        if key not in self._warned:
+            self._warned.add(key)
+            print(message)
+
+    def refresh(self):
+        start = time.perf_counter()
+        up = GaugeMetricFamily("raglab_pg_up", "Whether the exporter could query the database", labels=["database"])
+        families = [up]
+        cluster_done = False
+        index_size = GaugeMetricFamily("raglab_pg_index_size_bytes", "On-disk size of the index", labels=["database", "table", "index", "method"])
+        index_hit = CounterMetricFamily("raglab_pg_index_blocks_hit", "Index blocks found in shared_buffers", labels=["database", "table", "index", "method"])
+        index_read = CounterMetricFamily("raglab_pg_index_blocks_read", "Index blocks read from disk / OS cache", labels=["database", "table", "index", "method"])
+        index_ratio = GaugeMetricFamily("raglab_pg_index_hit_ratio", "Cumulative shared_buffers hit ratio of the index", labels=["database", "table", "index", "method"])
+        index_scans = CounterMetricFamily("raglab_pg_index_scans", "Index scans started", labels=["database", "table", "index", "method"])
+        live = GaugeMetricFamily("raglab_pg_table_live_tuples", "Estimated live tuples", labels=["database", "table"])
+        dead = GaugeMetricFamily("raglab_pg_table_dead_tuples", "Estimated dead tuples", labels=["database", "table"])
+        dead_ratio = GaugeMetricFamily("raglab_pg_table_dead_tuple_ratio", "Dead / (live + dead) tuples", labels=["database", "table"])
+        table_size = GaugeMetricFamily("raglab_pg_table_size_bytes", "Table size including indexes and TOAST", labels=["database", "table"])
+        since_vacuum = GaugeMetricFamily("raglab_pg_table_seconds_since_vacuum", "Seconds since the last (auto)vacuum", labels=["database", "table"])
+        families += [index_size, index_hit, index_read, index_ratio, index_scans, live, dead, dead_ratio, table_size, since_vacuum]
+
+        for name in self.dsns:
+            try:
+                conn = self._conn(name)
+                with conn.cursor() as cur:
+                    cur.execute(INDEX_SQL, (list(VECTOR_INDEX_METHODS), self.tables))
+                    for table, index, method, size, hit, read, scans in cur.fetchall():
+                        labels = [name, table, index, method]
+                        hit, read = hit or 0, read or 0
+                        index_size.add_metric(labels, size)
+                        index_hit.add_metric(labels, hit)
+                        index_read.add_metric(labels, read)
+                        index_ratio.add_metric(labels, hit / (hit + read) if hit + read else 1.0)
+                        index_scans.add_metric(labels, scans or 0)
+                    cur.execute(TABLE_SQL, (self.tables,))
+                    for table, n_live, n_dead, size, vacuum_age in cur.fetchall():
+                        labels = [name, table]
+                        live.add_metric(labels, n_live)
+                        dead.add_metric(labels, n_dead)
+                        dead_ratio.add_metric(labels, n_dead / (n_live + n_dead) if n_live + n_dead else 0.0)
+                        table_size.add_metric(labels, size)
+                        if vacuum_age is not None:
+                            since_vacuum.add_metric(labels, float(vacuum_age))
+                up.add_metric([name], 1)
+                if not cluster_done:
+                    try:
+                        with conn.cursor() as cur:
+                            families += self._cluster_metrics(cur)
+                        cluster_done = True
+                    except psycopg2.Error as exc:
+                        # e.g. missing pg_read_all_stats; keep the per-database metrics
+                        self._warn_once(("cluster", name, type(exc).__name__), f"Cluster-wide Postgres metrics via {name} failed: {exc}")
+            except psycopg2.Error as exc:
+                self._warn_once(("db", name, type(exc).__name__), f"Postgres metrics for {name} failed: {exc}")
+                conn = self._conns.pop(name, None)
+                if conn is not None and not conn.closed:
+                    conn.close()
+                up.add_metric([name], 0)
+
+        duration = GaugeMetricFamily("raglab_pg_collect_seconds", "Time spent collecting Postgres metrics")
+        duration.add_metric([], time.perf_counter() - start)
+        families.append(duration)
+        self._families = families
+
+    def _cluster_metrics(self, cur):
+        """pg_stat_activity / pg_stat_statements are cluster-wide: query them once."""
+        databases = list(self.dsns)
+        conns = GaugeMetricFamily("raglab_pg_connections", "Backends per database and state", labels=["database", "state"])
+        cur.execute(CONNECTIONS_SQL, (databases,))
+        for datname, state, count in cur.fetchall():
+            conns.add_metric([datname, state], count)
+        max_conns = GaugeMetricFamily("raglab_pg_max_connections", "Server max_connections setting")
+        cur.execute("SHOW max_connections")
+        max_conns.add_metric([], int(cur.fetchone()[0]))
+        return [conns, max_conns] + self._statement_metrics(cur, databases)
+
+    def _statement_metrics(self, cur, databases):
+        labels = ["database", "queryid", "query", "rank_by"]
+        calls = CounterMetricFamily("raglab_pg_statement_calls", "Calls of a top statement", labels=labels)
+        total = CounterMetricFamily("raglab_pg_statement_seconds", "Total execution time of a top statement", labels=labels)
+        mean = GaugeMetricFamily("raglab_pg_statement_mean_seconds", "Mean execution time of a top statement", labels=labels)
+        rows = CounterMetricFamily("raglab_pg_statement_rows", "Rows returned or affected by a top statement", labels=labels)
+        hit_ratio = GaugeMetricFamily("raglab_pg_statement_hit_ratio", "shared_buffers hit ratio of a top statement", labels=labels)
+
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+        if cur.fetchone() is None:
+            self._warn_once("pgss", "pg_stat_statements is not installed – statement metrics disabled")
+            return []
+        if self._statements_columns is None:
+            # total_exec_time/mean_exec_time since PG 13, total_time/mean_time before
+            cur.execute(
+                "SELECT 1 FROM pg_attribute WHERE attrelid = 'pg_stat_statements'::regclass "
+                "AND attname = 'mean_exec_time'"
+            )
+            self._statements_columns = (
+                ("total_exec_time", "mean_exec_time") if cur.fetchone() else ("total_time", "mean_time")
+            )
+        total_col, mean_col = self._statements_columns
+        for rank_by, order in (("mean_time", f"s.{mean_col}"), ("calls", "s.calls")):
+            cur.execute(
+                STATEMENTS_SQL.format(total=total_col, mean=mean_col, order=order),
+                (databases, self.top_statements),
+            )
+            for datname, queryid, query, n_calls, total_s, mean_s, n_rows, blk_hit, blk_read in cur.fetchall():
+                labels_ = [datname, queryid or "", _short_query(query), rank_by]
+                calls.add_metric(labels_, n_calls)
+                total.add_metric(labels_, total_s)
+                mean.add_metric(labels_, mean_s)
+                rows.add_metric(labels_, n_rows)
+                blocks = blk_hit + blk_read
+                hit_ratio.add_metric(labels_, blk_hit / blocks if blocks else 1.0)
+        return [calls, total, mean, rows, hit_ratio]
+
+    def collect(self):
+        return list(self._families)
+
+
+def from_env():
+    """Build a collector for the app databases, or None when not configured.
+
+    `PG_METRICS_DATABASES` defaults to the three app databases from
+    config.env; credentials come from `PG_METRICS_USER`/`PG_METRICS_PASSWORD`
+    or fall back to the app user.
+    """
+    databases = os.getenv("PG_METRICS_DATABASES") or ",".join(
+        filter(None, (os.getenv("PG_AI_AGENT_DB"), os.getenv("PG_DOCUMENTS_DB"), os.getenv("PG_SD_DB")))
+    )
+    if not databases:
+        return None
+    host = os.getenv("PG_HOST", "localhost")
+    port = os.getenv("PG_PORT", "5432")
+    user = os.getenv("PG_METRICS_USER") or os.getenv("PG_APP_USER", "postgres")
+    password = os.getenv("PG_METRICS_PASSWORD") or os.getenv("PG_APP_PASSWORD", "")
+    dsns = {
+        db.strip(): f"host={host} port={port} dbname={db.strip()} user={user} password={password}"
+        for db in databases.split(",")
+        if db.strip()
+    }
+    tables = [t.strip() for t in os.getenv("PG_METRICS_TABLES", "kb_chunks").split(",") if t.strip()]
+    return PostgresCollector(
+        dsns,
+        tables=tables,
+        top_statements=int(os.getenv("PG_METRICS_TOP_STATEMENTS", "10")),
+    )
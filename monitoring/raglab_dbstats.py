@@ -0,0 +1,170 @@
+"""Per-request database round-trip accounting for the SQLAlchemy engines.
+
+`instrument_engine()` hooks an engine's cursor events; `install_db_accounting()`
+adds middleware that gives every HTTP request its own tally.  At the end of a
+request the statement count and DB time are recorded per endpoint, and any
+statement *shape* (SQL with literals stripped) executed at least
+`DB_N_PLUS_ONE_THRESHOLD` times is reported as a likely N+1 pattern, both as
+a metric and as one structured log line.
+
+Instead of `echo=True`, statements slower than `DB_SLOW_QUERY_MS` are logged
+as JSON on the `raglab.sql` logger, sampled by `DB_SLOW_QUERY_SAMPLE_RATE`;
+`DB_QUERY_LOG_SAMPLE_RATE` additionally samples ordinary statements when
+debugging.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter as TallyCounter
+
+from prometheus_client import Counter, Histogram
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("DB_SLOW_QUERY_SAMPLE_RATE", "1.0"))
+QUERY_LOG_SAMPLE_RATE = float(os.getenv("DB_QUERY_LOG_SAMPLE_RATE", "0"))
+
+logger = logging.getLogger("raglab.sql")
+
+STATEMENTS_PER_REQUEST = Histogram(
+    "raglab_db_statements_per_request",
+    "SQL statements executed while serving one request",
+    ["endpoint", "database"],
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "raglab_db_seconds_per_request",
+    "Time spent in SQL statements while serving one request",
+    ["endpoint", "database"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+N_PLUS_ONE = Counter(
+    "raglab_db_n_plus_one",
+    "Requests that repeated one statement shape at least DB_N_PLUS_ONE_THRESHOLD times",
+    ["endpoint", "database"],
+)
+SLOW_QUERIES = Counter(
+    "raglab_db_slow_queries",
+    "Statements slower than DB_SLOW_QUERY_MS",
+    ["database"],
+)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+_request = contextvars.ContextVar("raglab_db_request", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Collapse whitespace and replace literals so repeats compare equal."""
+    return _WHITESPACE.sub(" ", _LITERALS.sub("?", statement)).strip()
+
+
+class RequestDBStats:
+    def __init__(self):
+        # database -> [statements, seconds]
+        self.totals = {}
+        # (database, shape) -> executions
+        self.shapes = TallyCounter()
+
+    def add(self, database: str, statement: str, seconds: float):
+        totals = self.totals.setdefault(database, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+        self.shapes[(database, statement_shape(statement))] += 1
+
+
+def current():
+    return _request.get()
+
+
+def _log(event: str, **fields):
+    logger.warning(json.dumps({"event": event, **fields}, default=str))
+
+
+def instrument_engine(engine, database: str):
+    """Count, time and (sampled) log every statement run through `engine`."""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("raglab_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["raglab_query_start"].pop()
+        stats = _request.get()
+        if stats is not None:
+            stats.add(database, statement, seconds)
+        slow = seconds * 1000 >= SLOW_QUERY_MS
+        if slow:
+            SLOW_QUERIES.labels(database).inc()
+        rate = SLOW_QUERY_SAMPLE_RATE if slow else QUERY_LOG_SAMPLE_RATE
+        if rate and random.random() < rate:
+            _log(
+                "slow_query" if slow else "query",
+                database=database,
+                ms=round(seconds * 1000, 2),
+                rows=cursor.rowcount,
+                executemany=executemany,
+                statement=statement_shape(statement)[:1000],
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        # keep the start-time stack balanced when a statement fails
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("raglab_query_start"):
+            conn.info["raglab_query_start"].pop()
+
+
+def _report(stats: RequestDBStats, endpoint: str):
+    for database, (count, seconds) in stats.totals.items():
+        STATEMENTS_PER_REQUEST.labels(endpoint, database).observe(count)
+        DB_TIME_PER_REQUEST.labels(endpoint, database).observe(seconds)
+    flagged = set()
+    for (database, shape), count in stats.shapes.items():
+        if count < N_PLUS_ONE_THRESHOLD:
+            continue
+        if database not in flagged:
+            N_PLUS_ONE.labels(endpoint, database).inc()
+            flagged.add(database)
+        _log(
+            "n_plus_one",
+            endpoint=endpoint,
+            database=database,
+            executions=count,
+            shape_id=hashlib.blake2b(shape.encode(), digest_size=6).hexdigest(),
+            statement=shape[:1000],
+        )
+
+
+class DBAccountingMiddleware:
+    """Pure ASGI middleware so statements run while streaming are counted."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestDBStats()
+        token = _request.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request.reset(token)
+            route = scope.get("route")
+            _report(stats, getattr(route, "path", "unmatched"))
+
+
+def install_db_accounting(app):
+    app.add_middleware(DBAccountingMiddleware)
@@ -0,0 +1,121 @@
+"""Request-path instrumentation shared by the FastAPI backend and MCP server.
+
+Both apps add this directory to `sys.path` and record per-stage latencies
+with `stage()`.  When `PROMETHEUS_MULTIPROC_DIR` is set (it must be set
+before this module is imported) every uvicorn worker writes its samples
+there and `metrics_exporter.py` serves the aggregate; otherwise each app
+exposes its own registry on `/metrics`.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+import raglab_profiling
+import raglab_tracing
+
+# Sub-millisecond cache hits up to multi-second LLM calls
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+STAGE_LATENCY = Histogram(
+    "raglab_stage_seconds",
+    "Latency of one stage of the RAG request path",
+    ["stage", "endpoint", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_LATENCY = Histogram(
+    "raglab_request_seconds",
+    "Time until the response starts, per endpoint",
+    ["endpoint", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_COUNT = Counter(
+    "raglab_requests_total",
+    "Total requests processed",
+    ["endpoint", "outcome"],
+)
+CACHE_LOOKUPS = Counter(
+    "raglab_cache_lookups",
+    "Application cache lookups by outcome (hit, miss, bypass)",
+    ["cache", "outcome"],
+)
+CACHE_SECONDS_SAVED = Counter(
+    "raglab_cache_seconds_saved",
+    "Work avoided by cache hits, in seconds of the original computation",
+    ["cache"],
+)
+
+
+@contextmanager
+def stage(name: str, endpoint: str):
+    """Time the enclosed block as `name`; outcome is `error` if it raises.
+
+    The block is also recorded as a span when the request is being profiled
+    and as a trace span when the request is traced.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    span = raglab_tracing.start_stage_span(name, endpoint)
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        end = time.perf_counter()
+        STAGE_LATENCY.labels(name, endpoint, outcome).observe(end - start)
+        raglab_profiling.record_span(name, start, end)
+        raglab_tracing.end_stage_span(span, error=outcome == "error")
+
+
+def observe_stage(name: str, endpoint: str, seconds: float, outcome: str = "ok"):
+    STAGE_LATENCY.labels(name, endpoint, outcome).observe(seconds)
+    end = time.perf_counter()
+    raglab_profiling.record_span(name, end - seconds, end)
+    raglab_tracing.record_stage_span(name, endpoint, seconds, error=outcome == "error")
+
+
+def observe_cache(cache: str, outcome: str, seconds_saved: float = 0.0):
+    CACHE_LOOKUPS.labels(cache, outcome).inc()
+    if seconds_saved:
+        CACHE_SECONDS_SAVED.labels(cache).inc(seconds_saved)
+
+
+def install_request_metrics(app):
+    """Add an HTTP middleware recording request count and latency per route."""
+
+    @app.middleware("http")
+    async def _request_metrics(request, call_next):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await call_next(request)
+            outcome = "ok" if response.status_code < 500 else "error"
+            return response
+        finally:
+            route = request.scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.labels(endpoint, outcome).observe(time.perf_counter() - start)
+            REQUEST_COUNT.labels(endpoint, outcome).inc()
+
+
+def metrics_payload():
+    """Return `(body, content_type)` for a Prometheus scrape."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
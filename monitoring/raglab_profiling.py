@@ -0,0 +1,311 @@
+"""On-demand request profiling for the FastAPI backend and MCP server.
+
+A request is profiled when it carries `X-Raglab-Profile: <token>` matching
+`RAGLAB_PROFILE_TOKEN`, or when it is picked by `RAGLAB_PROFILE_SAMPLE_RATE`
+(0.0-1.0, default 0).  While at least one profile is active a background
+thread samples the Python stacks of the threads that work on the profiled
+request (the event loop thread plus any worker thread that enters a
+`raglab_metrics.stage()`), and every stage is recorded as a wall-clock span.
+
+The result is written to `RAGLAB_PROFILE_DIR` as a speedscope file
+(https://www.speedscope.app) holding one sampled profile per thread and the
+stage spans as evented profiles.  The response carries `X-Raglab-Profile-Id`
+and the file can be fetched from `/debug/profiles/{id}` with the same token.
+
+When profiling is off the per-request cost is one header lookup and, with a
+sample rate set, one `random.random()` call.  Samples of the event loop
+thread also include other requests that share the loop at the same time.
+"""
+
+import contextvars
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+PROFILE_HEADER = "x-raglab-profile"
+PROFILE_ID_HEADER = "X-Raglab-Profile-Id"
+
+PROFILE_TOKEN = os.getenv("RAGLAB_PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("RAGLAB_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = Path(os.getenv("RAGLAB_PROFILE_DIR", "/tmp/raglab-profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("RAGLAB_PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("RAGLAB_PROFILE_KEEP", "200"))
+PROFILE_MAX_SECONDS = float(os.getenv("RAGLAB_PROFILE_MAX_SECONDS", "120"))
+
+_current = contextvars.ContextVar("raglab_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, reason: str):
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        slug = path.strip("/").replace("/", "_") or "root"
+        self.id = f"{stamp}-{slug}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread_ids = {threading.get_ident()}
+        self.thread_names = {}
+        # thread id -> list of (stack tuple, weight seconds)
+        self.samples = {}
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add_thread(self, tid: int):
+        if tid not in self.thread_ids:
+            with self._lock:
+                self.thread_ids.add(tid)
+
+    def add_span(self, name: str, start: float, end: float):
+        with self._lock:
+            self.spans.append((name, start, end))
+
+
+def current():
+    """Return the profile of the request being handled, if any."""
+    return _current.get()
+
+
+def record_span(name: str, start: float, end: float):
+    profile = _current.get()
+    if profile is not None:
+        profile.add_thread(threading.get_ident())
+        profile.add_span(name, start, end)
+
+
+class _Sampler:
+    """One daemon thread sampling stacks for every active profile."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self.active.add(profile)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="raglab-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, profile: RequestProfile):
+        with self._lock:
+            self.active.discard(profile)
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while True:
+            with self._lock:
+                profiles = list(self.active)
+            if not profiles:
+                self._wake.clear()
+                self._wake.wait()
+                last = time.perf_counter()
+                continue
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for profile in profiles:
+                if profile.end is not None:
+                    continue
+                for tid in list(profile.thread_ids):
+                    frame = frames.get(tid)
+                    if frame is None or tid == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                        frame = frame.f_back
+                    stack.reverse()
+                    profile.samples.setdefault(tid, []).append((tuple(stack), weight))
+                    profile.thread_names.setdefault(tid, names.get(tid, str(tid)))
+            del frames
+
+
+_sampler = _Sampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def _span_lanes(spans):
+    """Split spans into lanes in which they nest properly (speedscope evented)."""
+    lanes = []
+    for span in sorted(spans, key=lambda s: (s[1], -s[2])):
+        for lane in lanes:
+            stack = lane["open"]
+            while stack and stack[-1] <= span[1]:
+                stack.pop()
+            if not stack or span[2] <= stack[-1]:
+                stack.append(span[2])
+                lane["spans"].append(span)
+                break
+        else:
+            lanes.append({"open": [span[2]], "spans": [span]})
+    return [lane["spans"] for lane in lanes]
+
+
+def to_speedscope(profile: RequestProfile) -> dict:
+    frames, index = [], {}
+
+    def frame_id(key):
+        if key not in index:
+            index[key] = len(frames)
+            name, file, line = key
+            frames.append({"name": name, "file": file, "line": line})
+        return index[key]
+
+    end = (profile.end or time.perf_counter()) - profile.start
+    profiles = []
+    for tid, samples in list(profile.samples.items()):
+        samples = list(samples)
+        profiles.append({
+            "type": "sampled",
+            "name": f"CPU samples – thread {profile.thread_names.get(tid, tid)}",
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": round(sum(w for _, w in samples), 6),
+            "samples": [[frame_id(f) for f in stack] for stack, _ in samples],
+            "weights": [round(w, 6) for _, w in samples],
+        })
+    for n, lane in enumerate(_span_lanes(profile.spans)):
+        events, stack = [], []
+        for name, start, stop in lane:
+            while stack and stack[-1][1] <= start:
+                fid, at = stack.pop()
+                events.append(("C", fid, at))
+            fid = frame_id((name, "stage", 0))
+            events.append(("O", fid, start))
+            stack.append((fid, stop))
+        while stack:
+            fid, at = stack.pop()
+            events.append(("C", fid, at))
+        profiles.append({
+            "type": "evented",
+            "name": "Wall-clock stages" + (f" #{n + 1}" if n else ""),
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": round(end, 6),
+            "events": [
+                {"type": kind, "frame": fid, "at": round(max(at - profile.start, 0.0), 6)}
+                for kind, fid, at in events
+            ],
+        })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{profile.method} {profile.path} ({profile.reason})",
+        "exporter": "raglab_profiling",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+def _save(profile: RequestProfile):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{profile.id}.speedscope.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(to_speedscope(profile)))
+    tmp.replace(path)
+    existing = sorted(PROFILE_DIR.glob("*.speedscope.json"), key=lambda p: p.stat().st_mtime)
+    for old in existing[:-PROFILE_KEEP]:
+        old.unlink(missing_ok=True)
+
+
+def _authorized(value) -> bool:
+    return bool(PROFILE_TOKEN) and value is not None and hmac.compare_digest(value, PROFILE_TOKEN)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware so streaming bodies are included in the profile."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path", "").startswith("/debug/profiles"):
+            return await self.app(scope, receive, send)
+        reason = None
+        if PROFILE_TOKEN:
+            for key, value in scope["headers"]:
+                if key == b"x-raglab-profile":
+                    if _authorized(value.decode("latin-1")):
+                        reason = "header"
+                    break
+        if reason is None and PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            reason = "sampled"
+        if reason is None:
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope.get("method", ""), scope.get("path", ""), reason)
+        token = _current.set(profile)
+        _sampler.add(profile)
+        deadline = profile.start + PROFILE_MAX_SECONDS
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.lower().encode(), profile.id.encode()))
+                message = {**message, "headers": headers}
+            elif time.perf_counter() > deadline:
+                _sampler.remove(profile)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.end = time.perf_counter()
+            _sampler.remove(profile)
+            _current.reset(token)
+            try:
+                _save(profile)
+            except OSError as exc:
+                print(f"Failed to write profile {profile.id}: {exc}")
+
+
+def install_profiling(app):
+    """Add the profiling middleware and the download routes to `app`."""
+    from fastapi import HTTPException, Request
+    from fastapi.responses import FileResponse
+
+    app.add_middleware(ProfilingMiddleware)
+
+    def _check(request: Request):
+        if not _authorized(request.headers.get(PROFILE_HEADER)):
+            raise HTTPException(status_code=403, detail="Profiling token required")
+
+    @app.get("/debug/profiles", include_in_schema=False)
+    def list_profiles(request: Request):
+        """List stored request profiles, newest first."""
+        _check(request)
+        if not PROFILE_DIR.exists():
+            return []
+        files = sorted(PROFILE_DIR.glob("*.speedscope.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        return [
+            {
+                "id": p.name[: -len(".speedscope.json")],
+                "bytes": p.stat().st_size,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(p.stat().st_mtime)),
+            }
+            for p in files
+        ]
+
+    @app.get("/debug/profiles/{profile_id}", include_in_schema=False)
+    def download_profile(profile_id: str, request: Request):
+        """Download one profile; open it at https://www.speedscope.app."""
+        _check(request)
+        path = PROFILE_DIR / f"{profile_id}.speedscope.json"
+        if "/" in profile_id or ".." in profile_id or not path.exists():
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(str(path), media_type="application/json", filename=path.name)
@@ -0,0 +1,243 @@
+"""Distributed tracing shared by the FastAPI backend and MCP server.
+
+Built on the OpenTelemetry API.  `RAGLAB_TRACE_EXPORTER` selects where spans
+go:
+
+* `none` (default) - no SDK is installed, every span is a non-recording
+  no-op and `raglab_metrics.stage()` skips span creation entirely.
+* `otlp` - OTLP/HTTP to a local collector (`OTEL_EXPORTER_OTLP_ENDPOINT`,
+  default http://localhost:4318).
+* `file` - one JSON span per line appended to `RAGLAB_TRACE_FILE`.
+* `console` - pretty-printed spans on stdout, for development.
+
+`RAGLAB_TRACE_SAMPLE_RATIO` (default 1.0) samples new traces; incoming
+sampled traces are always continued.
+
+Each HTTP request becomes a SERVER span whose parent is taken from the W3C
+`traceparent` header or, for MCP tool calls, from the `_meta` object of the
+JSON arguments (see `inject_meta`).  Stages recorded with
+`raglab_metrics.stage()` become child spans.
+"""
+
+import json
+import os
+import time
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # tracing is optional
+    trace = None
+
+TRACE_EXPORTER = os.getenv("RAGLAB_TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("RAGLAB_TRACE_FILE", "/tmp/raglab-traces.jsonl")
+TRACE_SAMPLE_RATIO = float(os.getenv("RAGLAB_TRACE_SAMPLE_RATIO", "1.0"))
+META_KEY = "_meta"
+MAX_META_BODY = 1024 * 1024
+
+_enabled = False
+_tracer = None
+
+
+def setup_tracing(service_name: str) -> bool:
+    """Install the SDK tracer provider for `service_name` unless disabled."""
+    global _enabled, _tracer
+    if trace is None or TRACE_EXPORTER in ("", "none"):
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        print("opentelemetry-sdk is not installed – tracing disabled")
+        return False
+
+    if TRACE_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("opentelemetry-exporter-otlp-proto-http is not installed – tracing disabled")
+            return False
+        exporter = OTLPSpanExporter()
+    elif TRACE_EXPORTER == "file":
+        exporter = ConsoleSpanExporter(
+            out=open(TRACE_FILE, "a", buffering=1),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+    elif TRACE_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        print(f"Unknown RAGLAB_TRACE_EXPORTER={TRACE_EXPORTER!r} – tracing disabled")
+        return False
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("raglab")
+    _enabled = True
+    return True
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def start_stage_span(name: str, endpoint: str):
+    """Start a current child span for a stage; None outside a traced request."""
+    if not _enabled or not trace.get_current_span().is_recording():
+        return None
+    span = _tracer.start_span(name, attributes={"raglab.stage": name, "raglab.endpoint": endpoint})
+    return span, otel_context.attach(trace.set_span_in_context(span))
+
+
+def end_stage_span(handle, error: bool = False):
+    if handle is None:
+        return
+    span, token = handle
+    if error:
+        span.set_status(Status(StatusCode.ERROR))
+    span.end()
+    otel_context.detach(token)
+
+
+def record_stage_span(name: str, endpoint: str, seconds: float, error: bool = False):
+    """Record a stage measured after the fact (`observe_stage`) as a span."""
+    if not _enabled or not trace.get_current_span().is_recording():
+        return
+    end = time.time_ns()
+    span = _tracer.start_span(
+        name,
+        start_time=end - int(seconds * 1e9),
+        attributes={"raglab.stage": name, "raglab.endpoint": endpoint},
+    )
+    if error:
+        span.set_status(Status(StatusCode.ERROR))
+    span.end(end_time=end)
+
+
+def inject_meta(params: dict) -> dict:
+    """Return `params` with the current trace context under `_meta`.
+
+    MCP reserves `_meta` for request metadata; the MCP server's tracing
+    middleware reads it back when no `traceparent` header arrives.
+    """
+    if not _enabled:
+        return params
+    carrier = {}
+    propagate.inject(carrier)
+    if not carrier:
+        return params
+    return {**params, META_KEY: {**params.get(META_KEY, {}), **carrier}}
+
+
+def mcp_client_span(server: str, tool: str):
+    """Context manager for a CLIENT span around one MCP tool call."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _tracer.start_as_current_span(
+        f"mcp {tool}",
+        kind=SpanKind.CLIENT,
+        attributes={"rpc.system": "mcp", "rpc.service": server, "rpc.method": tool},
+    )
+
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware opening a SERVER span per HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not _enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        if "traceparent" not in headers and scope.get("method") == "POST":
+            receive, meta = await _peek_meta(receive, headers)
+            headers.update(meta)
+        parent = propagate.extract(headers)
+
+        method = scope.get("method", "")
+        span = _tracer.start_span(
+            f"{method} {scope.get('path', '')}",
+            context=parent,
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": method, "url.path": scope.get("path", "")},
+        )
+        token = otel_context.attach(trace.set_span_in_context(span, parent))
+        status = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException:
+            span.set_status(Status(StatusCode.ERROR))
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                span.update_name(f"{method} {route.path}")
+                span.set_attribute("http.route", route.path)
+            code = status.get("code")
+            if code is not None:
+                span.set_attribute("http.response.status_code", code)
+                if code >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
+            span.end()
+            otel_context.detach(token)
+
+
+async def _peek_meta(receive, headers):
+    """Read a small JSON body for `_meta` trace context, then replay it."""
+    if "json" not in headers.get("content-type", ""):
+        return receive, {}
+    length = headers.get("content-length")
+    if length is None or not length.isdigit() or int(length) > MAX_META_BODY:
+        return receive, {}
+    messages, body = [], b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        body += message.get("body", b"")
+        if message["type"] != "http.request" or not message.get("more_body"):
+            break
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    meta = {}
+    try:
+        payload = json.loads(body)
+        if isinstance(payload, dict) and isinstance(payload.get(META_KEY), dict):
+            meta = {k: v for k, v in payload[META_KEY].items() if k in ("traceparent", "tracestate")}
+    except ValueError:
+        pass
+    return replay, meta
+
+
+def install_tracing(app, service_name: str):
+    """Set up the tracer provider and the request middleware on `app`."""
+    if setup_tracing(service_name):
+        app.add_middleware(TracingMiddleware)